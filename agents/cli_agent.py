@@ -2,32 +2,123 @@ import chainlit as cl
 from swarm import Agent
 from typing import Dict, List, Any, Optional
 import subprocess
-import threading
-import queue
-import asyncio
 import time
 import re
 import os
+import asyncio
+import concurrent.futures
+from chainlit.utils import utc_now
+from core.process_reactor import ManagedProcess, process_reactor
+from core.process_resources import resource_monitor
+from core.process_stream import stream_process_output
+from core.shell_session import ShellSession
+from core.tool_runtime import read_only, run_tool
+
+# Longest wait_for_output call, and lines of context shown around a match
+MAX_WAIT_SECONDS = 600
+WAIT_CONTEXT_LINES = 5
+
+# Seconds between output updates of a running shell command
+SHELL_STREAM_INTERVAL = 0.5
 
 
 class CLIAgent:
-    def __init__(self):
-        """Initialize CLI Agent"""
-        self.processes: Dict[str, subprocess.Popen] = {}
-        self.output_queues: Dict[str, queue.Queue] = {}
-        self.output_threads: Dict[str, threading.Thread] = {}
-        self.latest_output: Dict[str, List[str]] = {}
-        self.current_dir = os.getcwd()  # Track current directory
+    def __init__(
+        self,
+        live_output: Optional[bool] = None,
+        persistent_shell: Optional[bool] = None,
+    ):
+        """Initialize CLI Agent
 
-    def _read_output(self, process_id: str, process: subprocess.Popen):
-        """Read output from process and store in queue"""
-        queue = self.output_queues[process_id]
-        while True:
-            if process.poll() is not None:  # Process finished
+        Args:
+            live_output: Show the output of started processes in a live step,
+                without the model polling for it. Defaults to
+                PROCESS_LIVE_OUTPUT, or false.
+            persistent_shell: Run commands in one long-lived shell per chat
+                session, keeping cwd, env and venvs. Defaults to
+                CLI_PERSISTENT_SHELL, or false.
+        """
+        self.processes: Dict[str, ManagedProcess] = {}
+        # Number of output lines of each process already returned
+        self.read_cursors: Dict[str, int] = {}
+        self.current_dir = os.getcwd()  # Track current directory
+        if live_output is None:
+            live_output = os.environ.get("PROCESS_LIVE_OUTPUT", "false").lower() == "true"
+        self.live_output = live_output
+        # Tasks streaming process output to their step, on the session loop
+        self.live_streams: Dict[str, concurrent.futures.Future] = {}
+        if persistent_shell is None:
+            persistent_shell = (
+                os.environ.get("CLI_PERSISTENT_SHELL", "false").lower() == "true"
+            )
+        self.persistent_shell = persistent_shell
+        # Persistent shells by chat session
+        self.shells: Dict[str, ShellSession] = {}
+
+    def _get_shell(self) -> ShellSession:
+        """Get the calling session's shell, started on first use"""
+        session_id = cl.context.session.id if cl.context.session else "default"
+        shell = self.shells.get(session_id)
+        if shell is None or not shell.alive:
+            shell = ShellSession(cwd=self.current_dir)
+            self.shells[session_id] = shell
+        return shell
+
+    async def _run_in_shell(self, command: str, timeout: int) -> str:
+        """Run a command in the session's shell, streaming its output to the step"""
+        shell = self._get_shell()
+        step = cl.context.current_step
+        loop = asyncio.get_running_loop()
+        cursor = shell.submit(command)
+        streamed = cursor
+        deadline = time.monotonic() + timeout
+        result = None
+        while result is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 break
-            output = process.stdout.readline()
-            if output:
-                queue.put(output.strip())
+            result = await loop.run_in_executor(
+                None, shell.wait_result, cursor, min(remaining, SHELL_STREAM_INTERVAL)
+            )
+            if result is None and step is not None:
+                lines, _ = shell.output_since(streamed)
+                streamed += len(lines)
+                if lines:
+                    await step.stream_token("".join(line + "\n" for line in lines))
+
+        if result is None:
+            # Interrupt the command, and restart the shell if that fails
+            shell.interrupt()
+            result = await loop.run_in_executor(None, shell.wait_result, cursor, 2)
+            notice = f"Command timed out after {timeout} seconds"
+            if result is None or result.exit_code is None:
+                shell.close()
+                notice += " (shell restarted: cwd and environment were reset)"
+            lines = result.lines if result else shell.output_since(cursor)[0]
+            return "\n".join([notice] + lines)
+        if result.exit_code is None:
+            return "\n".join(["Shell exited, a new one will be started"] + result.lines)
+
+        self.current_dir = result.cwd
+        output = "\n".join(result.lines)
+        if result.missed:
+            output = f"[{result.missed} earlier lines dropped]\n" + output
+        if result.exit_code != 0:
+            return f"Command failed with exit code {result.exit_code}:\n{output}"
+        return output if output else "Command executed successfully (no output)"
+
+    async def _attach_live_step(self, process_id: str):
+        """Stream a process's output into its own step until it exits"""
+        step = cl.Step(
+            name=f"📺 {process_id}: {self.processes[process_id].command}", type="run"
+        )
+        step.start = utc_now()
+        await step.send()
+        # Runs on the session's loop so it outlives this tool call
+        self.live_streams[process_id] = asyncio.run_coroutine_threadsafe(
+            stream_process_output(self.processes[process_id], step),
+            cl.context.loop,
+        )
 
     @cl.step(type="tool")
     async def start_process(self, command: str) -> str:
@@ -40,37 +131,33 @@ class CLIAgent:
         cl.Step(name=display_name, type="tool")
 
         try:
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1,
-                cwd=self.current_dir,
-            )
-
             process_id = f"process_{len(self.processes)}"
-            self.processes[process_id] = process
-            self.output_queues[process_id] = queue.Queue()
-            self.latest_output[process_id] = []
-
-            thread = threading.Thread(
-                target=self._read_output, args=(process_id, process), daemon=True
-            )
-            self.output_threads[process_id] = thread
-            thread.start()
+            with resource_monitor.spawn_limits() as preexec_fn:
+                self.processes[process_id] = process_reactor.start(
+                    process_id, command, cwd=self.current_dir, preexec_fn=preexec_fn
+                )
+            resource_monitor.watch(self.processes[process_id])
+            self.read_cursors[process_id] = 0
+            if self.live_output:
+                await self._attach_live_step(process_id)
 
             return f"Process started with ID: {process_id} in directory: {self.current_dir}"
         except Exception as e:
             return f"Error starting process: {str(e)}"
 
     @cl.step(type="tool")
-    async def get_latest_output(self, process_id: str) -> str:
-        """Get the latest output from a running process
+    async def get_latest_output(
+        self, process_id: str, since: int = -1, last: int = 0, pattern: str = ""
+    ) -> str:
+        """Get output from a running process
+
+        By default returns the lines printed since the previous call.
 
         Args:
             process_id: ID of the process to get output from
+            since: Return the lines from this cursor (line number) on
+            last: Return only the last N lines
+            pattern: Return only the last lines matching this regex
         """
         display_name = f"📋 Get Output: {process_id}"
         cl.Step(name=display_name, type="tool")
@@ -78,19 +165,162 @@ class CLIAgent:
         if process_id not in self.processes:
             return f"No process found with ID: {process_id}"
 
-        # Get all available output from queue
-        output = []
+        process = self.processes[process_id]
+        notes = []
+        with process.changed:
+            output = process.output
+            if pattern:
+                try:
+                    lines = output.grep(pattern)
+                except re.error as e:
+                    return f"Error: invalid pattern: {e}"
+            elif last > 0:
+                lines = output.last(last)
+            else:
+                cursor = since if since >= 0 else self.read_cursors[process_id]
+                lines, missed = output.since(cursor)
+                self.read_cursors[process_id] = output.next_seq
+                if missed:
+                    notes.append(f"[{missed} lines were dropped before they were read]")
+            next_cursor = output.next_seq
+            dropped = output.dropped
+            exit_code = process.exit_code
+
+        if pattern:
+            result = [f"{seq}: {line}" for seq, line in lines]
+        else:
+            result = [line for _, line in lines]
+        if not result and exit_code is None:
+            return f"No new output (next cursor {next_cursor})"
+
+        header = f"[{len(lines)} lines, next cursor {next_cursor}"
+        if dropped:
+            header += f", {dropped} oldest lines dropped from the buffer"
+        result = [header + "]"] + notes + result
+        if exit_code is not None:
+            result.append(f"[{process.exit_status()}]")
+        return "\n".join(result)
+
+    @cl.step(type="tool")
+    async def wait_for_output(
+        self, process_id: str, pattern: str, timeout: int = 60
+    ) -> str:
+        """Wait until a process prints a line matching a regex, or exits
+
+        Searches the output not read yet, then new output as it arrives.
+
+        Args:
+            process_id: ID of the process to watch
+            pattern: Regex to wait for; combine alternatives with | (e.g.
+                'compiled successfully|Failed to compile')
+            timeout: Seconds to wait at most
+        """
+        display_name = f"⏳ Wait for Output: {process_id} /{pattern}/"
+        cl.Step(name=display_name, type="tool")
+
+        if process_id not in self.processes:
+            return f"No process found with ID: {process_id}"
         try:
-            while True:
-                line = self.output_queues[process_id].get_nowait()
-                output.append(line)
-        except queue.Empty:
-            pass
+            regex = re.compile(pattern)
+        except re.error as e:
+            return f"Error: invalid pattern: {e}"
+        timeout = min(max(timeout, 0), MAX_WAIT_SECONDS)
+
+        process = self.processes[process_id]
+        started = time.monotonic()
+        # Block on a worker, not on the loop running this tool
+        match = await asyncio.get_running_loop().run_in_executor(
+            None, process.wait_for, regex, self.read_cursors[process_id], timeout
+        )
+        waited = time.monotonic() - started
+
+        with process.changed:
+            output = process.output
+            if match is not None:
+                seq = match[0]
+                lines, _ = output.since(max(seq - WAIT_CONTEXT_LINES, 0))
+                lines = lines[: 2 * WAIT_CONTEXT_LINES + 1]
+            else:
+                lines = output.last(WAIT_CONTEXT_LINES)
+            if lines:
+                # Lines after the returned context are left for the next read
+                self.read_cursors[process_id] = max(
+                    self.read_cursors[process_id], lines[-1][0] + 1
+                )
+            exit_code = process.exit_code
+
+        if match is not None:
+            result = [f"Matched line {match[0]} after {waited:.1f}s: {match[1]}"]
+        elif exit_code is not None:
+            result = [f"{process.exit_status()} without matching"]
+        else:
+            result = [f"No match after {timeout}s, process still running"]
+        if lines:
+            result.append("Context:")
+            result.extend(f"{seq}: {line}" for seq, line in lines)
+        return "\n".join(result)
 
-        if not output and process_id in self.latest_output:
-            output = self.latest_output[process_id]
+    @cl.step(type="tool")
+    async def detach_output(self, process_id: str) -> str:
+        """Stop showing a process's output live; the process keeps running
 
-        return "\n".join(output) if output else "No new output"
+        Args:
+            process_id: ID of the process to detach from
+        """
+        display_name = f"⏏️ Detach Output: {process_id}"
+        cl.Step(name=display_name, type="tool")
+
+        stream = self.live_streams.pop(process_id, None)
+        if stream is None or stream.done():
+            return f"No live output attached to: {process_id}"
+        stream.cancel()
+        return f"Detached live output of {process_id}"
+
+    @cl.step(type="tool")
+    async def get_process_resources(self, process_id: str = "") -> str:
+        """Show CPU, memory and open files of running processes
+
+        Args:
+            process_id: ID of one process, all processes by default
+        """
+        display_name = f"📊 Process Resources: {process_id or 'all'}"
+        cl.Step(name=display_name, type="tool")
+
+        if process_id and process_id not in self.processes:
+            return f"No process found with ID: {process_id}"
+        ids = [process_id] if process_id else list(self.processes)
+        rows = []
+        for pid in ids:
+            process = self.processes[pid]
+            usage = resource_monitor.usage(process)
+            if usage is None:
+                rows.append(f"| {pid} | {process.exit_status()} | | | | |")
+                continue
+            rows.append(
+                f"| {pid} | running | {usage['pids']} | {usage['cpu_percent']:.0f}% "
+                f"| {usage['rss_bytes'] / 1024**2:.1f} MB | {usage['fds']} |"
+            )
+        if not rows:
+            return "No processes started"
+        limits = []
+        if resource_monitor.max_rss_mb:
+            limits.append(f"RSS {resource_monitor.max_rss_mb:.0f} MB")
+        if resource_monitor.max_cpu_percent:
+            limits.append(f"CPU {resource_monitor.max_cpu_percent:.0f}%")
+        header = [
+            "| process | status | pids | CPU | RSS | open files |",
+            "|---|---|---:|---:|---:|---:|",
+        ]
+        footer = [f"Limits per process tree: {', '.join(limits)}"] if limits else []
+        # Totals over the processes of every session in this worker
+        totals = resource_monitor.gauges()
+        footer.append(
+            f"All watched processes: {totals['watched_processes']} "
+            f"({totals['pids']} pids), CPU {totals['cpu_percent']:.0f}%, "
+            f"RSS {totals['rss_bytes'] / 1024**2:.1f} MB, {totals['fds']} open files, "
+            f"{totals['kills']} killed over limits"
+        )
+        return "\n".join(header + rows + footer)
 
     @cl.step(type="tool")
     async def stop_process(self, process_id: str) -> str:
@@ -106,25 +336,33 @@ class CLIAgent:
             return f"No process found with ID: {process_id}"
 
         try:
-            self.processes[process_id].terminate()
-            self.processes[process_id].wait(timeout=5)
-            return f"Process {process_id} stopped"
+            exit_code = self.processes[process_id].stop()
+            return f"Process {process_id} stopped (exit code {exit_code})"
         except Exception as e:
             return f"Error stopping process: {str(e)}"
 
     @cl.step(type="tool")
-    async def run_command(self, command: str) -> str:
+    async def run_command(self, command: str, timeout: int = 30) -> str:
         """Execute a one-off command and return its output
 
         Args:
             command: Command to execute (e.g., 'ls -la', 'git status', 'cd /path/to/dir')
+            timeout: Seconds after which the command is interrupted
         """
         display_name = f"🔧 Run Command: {command}"
         cl.Step(name=display_name, type="tool")
 
         command = command.encode("utf-8").decode("unicode_escape")
+        timeout = min(max(timeout, 1), MAX_WAIT_SECONDS)
 
         try:
+            if self.persistent_shell:
+                output = await self._run_in_shell(command, timeout)
+                if cl.context.current_step is not None:
+                    # Replace the streamed output with the final result
+                    cl.context.current_step.output = output
+                return output
+
             # Handle cd commands specially
             if command.strip().startswith("cd "):
                 new_dir = command.strip()[3:].strip()
@@ -140,26 +378,39 @@ class CLIAgent:
                     return f"Directory not found: {new_dir}"
 
             # For all other commands, run them in the current directory
-            process = subprocess.run(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=30,
-                cwd=self.current_dir,  # Use current directory
-            )
-
-            output = process.stdout
-            error = process.stderr
-
-            if process.returncode != 0:
+            with resource_monitor.spawn_limits() as preexec_fn:
+                popen = subprocess.Popen(
+                    command,
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    cwd=self.current_dir,  # Use current directory
+                    # Own process group, so a timeout stops everything it started
+                    start_new_session=True,
+                    preexec_fn=preexec_fn,
+                )
+            # Sampled, and stopped over the limits, like started processes
+            process = ManagedProcess("command", command, popen)
+            resource_monitor.watch(process)
+            try:
+                output, error = popen.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.stop()
+                popen.communicate()
+                return f"Command timed out after {timeout} seconds"
+            finally:
+                # Records the exit code, which ends the sampling
+                process.stop()
+
+            if process.killed_reason:
+                return f"Command killed: {process.killed_reason}\n{error}"
+
+            if popen.returncode != 0:
                 return f"Command failed with error:\n{error}"
 
             return output if output else "Command executed successfully (no output)"
 
-        except subprocess.TimeoutExpired:
-            return "Command timed out after 30 seconds"
         except Exception as e:
             return f"Error executing command: {str(e)}"
 
@@ -172,19 +423,34 @@ class CLIAgent:
 
     # Create wrapper functions for non-async calls
     def _start_process(self, command: str) -> str:
-        return asyncio.run(self.start_process(command))
+        return run_tool(self.start_process(command))
+
+    def _get_latest_output(
+        self, process_id: str, since: int = -1, last: int = 0, pattern: str = ""
+    ) -> str:
+        return run_tool(self.get_latest_output(process_id, since, last, pattern))
+
+    def _wait_for_output(
+        self, process_id: str, pattern: str, timeout: int = 60
+    ) -> str:
+        return run_tool(self.wait_for_output(process_id, pattern, timeout))
+
+    def _detach_output(self, process_id: str) -> str:
+        return run_tool(self.detach_output(process_id))
 
-    def _get_latest_output(self, process_id: str) -> str:
-        return asyncio.run(self.get_latest_output(process_id))
+    @read_only
+    def _get_process_resources(self, process_id: str = "") -> str:
+        return run_tool(self.get_process_resources(process_id))
 
     def _stop_process(self, process_id: str) -> str:
-        return asyncio.run(self.stop_process(process_id))
+        return run_tool(self.stop_process(process_id))
 
-    def _run_command(self, command: str) -> str:
-        return asyncio.run(self.run_command(command))
+    def _run_command(self, command: str, timeout: int = 30) -> str:
+        return run_tool(self.run_command(command, timeout))
 
+    @read_only
     def _get_current_dir(self, unused_param: str = None) -> str:
-        return asyncio.run(self.get_current_dir(unused_param))
+        return run_tool(self.get_current_dir(unused_param))
 
     def create_agent(self) -> Agent:
         """Create and return a Swarm Agent with CLI capabilities"""
@@ -194,6 +460,8 @@ class CLIAgent:
             instructions="""You are a helpful AI assistant for managing CLI processes and executing commands.
             You can:
             1. Start long-running processes (like servers) and monitor their output
+               (use wait_for_output to wait for a ready or error message instead of
+               polling get_latest_output)
             2. Execute one-off commands and get their results
             3. Stop running processes when needed
             4. Change and track the current working directory
@@ -216,6 +484,9 @@ class CLIAgent:
             functions=[
                 self._start_process,
                 self._get_latest_output,
+                self._wait_for_output,
+                self._detach_output,
+                self._get_process_resources,
                 self._stop_process,
                 self._run_command,
                 self._get_current_dir,
@@ -224,8 +495,20 @@ class CLIAgent:
 
     def close(self):
         """Stop all running processes"""
-        for process_id in list(self.processes.keys()):
-            self._stop_process(process_id)
+        # Terminate directly rather than through the stop_process step: close
+        # runs at chat end, outside of (or blocking) the session's loop
+        for stream in getattr(self, "live_streams", {}).values():
+            stream.cancel()
+        for process in getattr(self, "processes", {}).values():
+            process.stop()
+        for shell in getattr(self, "shells", {}).values():
+            shell.close()
+
+    def close_session(self, session_id: str):
+        """Stop the persistent shell of a finished chat session"""
+        shell = self.shells.pop(session_id, None)
+        if shell is not None:
+            shell.close()
 
     def __del__(self):
         """Cleanup processes"""
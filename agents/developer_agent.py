@@ -2,6 +2,8 @@ from swarm import Agent
 from typing import List, Dict
 import os
 import chainlit as cl
+from core.tool_runtime import read_only, run_tool
+from core.tool_cache import cached, file_tag, invalidates
 
 
 class DeveloperAgent:
@@ -58,24 +60,19 @@ class DeveloperAgent:
 
     # Create wrapper functions for non-async calls
     def _transfer_to_test_agent(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.transfer_to_test_agent(unused))
+        return run_tool(self.transfer_to_test_agent(unused))
 
     def _transfer_to_orchestrator(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.transfer_to_orchestrator(unused))
+        return run_tool(self.transfer_to_orchestrator(unused))
 
+    @read_only
+    @cached(file=lambda self, args: args["path"])
     def _read_component(self, path: str) -> str:
-        import asyncio
-
-        return asyncio.run(self.read_component(path))
+        return run_tool(self.read_component(path))
 
+    @invalidates(tags=lambda self, args: {file_tag(args["path"])})
     def _write_component(self, path: str, content: str) -> str:
-        import asyncio
-
-        return asyncio.run(self.write_component(path, content))
+        return run_tool(self.write_component(path, content))
 
     def create_agent(self) -> Agent:
         return Agent(
@@ -1,4 +1,5 @@
 from swarm import Agent
+from core.tool_runtime import read_only
 import os
 import shutil
 import subprocess
@@ -17,6 +18,7 @@ class FileAgent:
         except Exception as e:
             return f"Error creating directory: {str(e)}"
 
+    @read_only
     def read_file(self, file_path: str) -> str:
         """Read contents of a file
 
@@ -43,6 +45,7 @@ class FileAgent:
         except Exception as e:
             return f"Error writing file: {str(e)}"
 
+    @read_only
     def list_files(self, directory: str = ".") -> str:
         """List files in a directory
 
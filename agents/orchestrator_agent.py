@@ -2,6 +2,8 @@ from swarm import Agent
 from typing import List, Dict
 import os
 import chainlit as cl
+from core.tool_runtime import read_only, run_tool
+from core.tool_cache import cached
 
 
 class OrchestratorAgent:
@@ -56,29 +58,22 @@ class OrchestratorAgent:
 
     # Create wrapper functions for non-async calls
     def _transfer_to_dev_agent(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.transfer_to_dev_agent(unused))
+        return run_tool(self.transfer_to_dev_agent(unused))
 
     def _transfer_to_test_agent(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.transfer_to_test_agent(unused))
+        return run_tool(self.transfer_to_test_agent(unused))
 
+    @read_only
+    @cached(file=lambda self, args: self.readme_path)
     def _read_readme(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.read_readme(unused))
+        return run_tool(self.read_readme(unused))
 
+    @read_only
     def _get_cwd(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.get_cwd(unused))
+        return run_tool(self.get_cwd(unused))
 
     def _change_cwd(self, path: str) -> str:
-        import asyncio
-
-        return asyncio.run(self.change_cwd(path))
+        return run_tool(self.change_cwd(path))
 
     def create_agent(self) -> Agent:
         return Agent(
@@ -6,10 +6,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from typing import Dict, List, Any, Optional
-import asyncio
 import json
 from datetime import datetime
 import os
+from core.tool_runtime import run_tool
 
 
 class SeleniumAgent:
@@ -194,28 +194,28 @@ class SeleniumAgent:
 
     # Create wrapper functions for non-async calls
     def _navigate_to(self, url: str) -> str:
-        return asyncio.run(self.navigate_to(url))
+        return run_tool(self.navigate_to(url))
 
     def _get_page_title(self, unused_param: str = None) -> str:
-        return asyncio.run(self.get_page_title(unused_param))
+        return run_tool(self.get_page_title(unused_param))
 
     def _find_element_text(self, selector: str) -> str:
-        return asyncio.run(self.find_element_text(selector))
+        return run_tool(self.find_element_text(selector))
 
     def _click_element(self, selector: str) -> str:
-        return asyncio.run(self.click_element(selector))
+        return run_tool(self.click_element(selector))
 
     def _input_text(self, selector: str, text: str) -> str:
-        return asyncio.run(self.input_text(selector, text))
+        return run_tool(self.input_text(selector, text))
 
     def _get_element_attribute(self, data: Dict[str, str]) -> str:
-        return asyncio.run(self.get_element_attribute(data))
+        return run_tool(self.get_element_attribute(data))
 
     def _get_page_source(self, unused_param: str = None) -> str:
-        return asyncio.run(self.get_page_source(unused_param))
+        return run_tool(self.get_page_source(unused_param))
 
     def _take_screenshot(self, filename: Optional[str] = None) -> str:
-        return asyncio.run(self.take_screenshot(filename))
+        return run_tool(self.take_screenshot(filename))
 
     def create_agent(self) -> Agent:
         """Create and return a Swarm Agent with Selenium capabilities"""
@@ -242,7 +242,7 @@ class SeleniumAgent:
 
     def close(self):
         """Close the WebDriver"""
-        if self.driver:
+        if getattr(self, "driver", None):
             self.driver.quit()
             self.driver = None
 
@@ -3,19 +3,60 @@ from swarm import Agent
 import pyodbc
 from typing import List, Dict, Any, Optional
 from contextlib import contextmanager
-import asyncio
+import functools
+import hashlib
+import itertools
 import os
+import re
+import time
+from core.bulk_rows import load_rows, quote_name
+from core.connection_pool import ConnectionPool
+from core.query_cache import create_query_cache, referenced_tables, statement_kind
+from core.query_cost import LIMITED_MARKER, create_cost_guard
+from core.query_executor import RunningQuery, query_executor
+from core.result_set import ResultSet, ResultSetRegistry
+from core.schema_catalog import SchemaCatalog
+from core.schema_search import SchemaSearch, compact_schema
+from core.tool_runtime import read_only, run_tool
+
+# Statements that can change the catalog
+DDL_PATTERN = re.compile(r"\b(create|alter|drop|sp_rename)\b", re.IGNORECASE)
 
 
 class SQLAgent:
     def __init__(self, connection_string: str):
-        """Initialize SQL Agent with connection string and establish connection
+        """Initialize SQL Agent with connection string and a connection pool
 
         Args:
             connection_string: MS SQL Server connection string
         """
         self.connection_string = connection_string
-        self.conn = self._establish_connection()
+        # pyodbc connections must not be used from several threads at once:
+        # every caller gets its own connection from the pool, initialized
+        # once with ADMIN_QUERY
+        self.pool = ConnectionPool(
+            self._establish_connection, init_query=os.environ.get("ADMIN_QUERY")
+        )
+        # Budget of each page of query results returned to the model
+        self.max_rows = int(os.environ.get("SQL_RESULT_MAX_ROWS", "50"))
+        self.max_bytes = int(os.environ.get("SQL_RESULT_MAX_BYTES", "8000"))
+        # Result sets with rows left, under their continuation handles
+        self.results = ResultSetRegistry()
+        # Whole-database schema index, snapshotted per connection string
+        digest = hashlib.sha256(connection_string.encode("utf-8")).hexdigest()[:16]
+        catalog_dir = os.environ.get("SQL_CATALOG_DIR", ".sql_catalog")
+        self.catalog = SchemaCatalog(os.path.join(catalog_dir, f"{digest}.json"))
+        self.schema_search = SchemaSearch(self.catalog)
+        # Rows per executemany call of bulk_insert
+        self.bulk_batch_size = int(os.environ.get("SQL_BULK_BATCH_SIZE", "1000"))
+        # Size of the schemas returned by find_relevant_tables
+        self.search_budget_tokens = int(
+            os.environ.get("SQL_SCHEMA_SEARCH_TOKENS", "1500")
+        )
+        # Results of read-only queries, None unless SQL_QUERY_CACHE=on
+        self.query_cache = create_query_cache()
+        # Estimated plan check before each query, None unless SQL_COST_GUARD is set
+        self.cost_guard = create_cost_guard()
 
     def _establish_connection(self) -> pyodbc.Connection:
         """Internal method to establish database connection"""
@@ -26,20 +67,149 @@ class SQLAgent:
 
     @contextmanager
     def get_cursor(self):
-        """Context manager for database cursor"""
-        cursor = self.conn.cursor()
-        cursor.execute(os.environ.get("ADMIN_QUERY"))
+        """Context manager for a cursor on a pooled connection"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    async def run_query(self, work, timeout: Optional[float] = None):
+        """Run work(cursor) on the database threads without blocking the loop
+
+        The query is cancelled on the server after timeout, when the calling
+        task is cancelled, or when its session is passed to `cancel_session`.
+
+        Args:
+            work: Runs the query with a cursor on a pooled connection
+            timeout: Seconds the query may run, SQL_QUERY_TIMEOUT by default
+        """
+        return await query_executor.run(self.pool, work, self._session_id(), timeout)
+
+    @staticmethod
+    def _session_id() -> Optional[str]:
+        try:
+            return cl.context.session.id if cl.context.session else None
+        except Exception:
+            # Called outside of a Chainlit session
+            return None
+
+    def _keep_result(self, result: ResultSet, query: RunningQuery, page: str) -> str:
+        """Register a result set with rows left and add its handle to the page
+
+        Runs on the database thread: a result nobody waits for anymore
+        (timed out or cancelled) is closed instead.
+        """
+        with query.lock:
+            if query.cancelled or result.done:
+                result.close()
+                return page
+            handle = self.results.add(result)
+        if handle is None:
+            return page
+        return f"{page}\nMore rows: call fetch_more_rows with handle {handle}"
+
+    def _open_result(
+        self,
+        sql: str,
+        timeout: Optional[float],
+        export_path: str,
+        query: RunningQuery,
+    ) -> str:
+        """Execute a query and read its first page, or export all its rows"""
+        conn = self.pool.acquire()
+        cursor = None
+        try:
+            query_executor.set_timeout(conn, timeout or query_executor.timeout)
+            cursor = conn.cursor()
+            query.attach(cursor)
+            note = ""
+            if self.cost_guard:
+                # Exports are meant for large results: only their cost is limited
+                sql, note = self.cost_guard.check(
+                    cursor, sql, check_rows=not export_path
+                )
+            cursor.execute(sql)
+            if cursor.description is None:
+                # Statement without a result set: apply it
+                count = cursor.rowcount
+                conn.commit()
+                query.detach()
+                cursor.close()
+                self.pool.release(conn)
+                return f"Query OK, {count} rows affected"
+        except BaseException:
+            query.detach()
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            self.pool.release(conn, failed=True)
+            raise
+
+        result = ResultSet(self.pool, conn, cursor)
         try:
-            yield cursor
+            if export_path:
+                count = result.export(export_path)
+                result.close()
+                columns = ", ".join(result.columns)
+                return f"Wrote {count} rows ({columns}) to {export_path}"
+            page = result.page(self.max_rows, self.max_bytes)
+        except BaseException:
+            result.close(failed=True)
+            raise
         finally:
-            cursor.close()
+            query.detach()
+        if note:
+            page = f"{page}\n{note}"
+        return self._keep_result(result, query, page)
+
+    def _read_result(
+        self, handle: str, result: ResultSet, max_rows: int, query: RunningQuery
+    ) -> str:
+        """Read the next page of a kept result set"""
+        try:
+            query.attach(result.cursor)
+            page = result.page(max_rows, self.max_bytes)
+        except BaseException:
+            result.close(failed=True)
+            raise
+        finally:
+            query.detach()
+        with query.lock:
+            if query.cancelled:
+                result.close()
+                return page
+            self.results.put(handle, result)
+        if result.done:
+            return page
+        return f"{page}\nMore rows: call fetch_more_rows with handle {handle}"
+
+    def cancel_session(self, session_id: str) -> int:
+        """Cancel the queries running for a session, e.g. when it is stopped
+
+        Returns:
+            Number of queries cancelled
+        """
+        return query_executor.cancel_session(session_id)
 
     @cl.step(type="tool")
-    async def execute_query(self, query: str) -> str:
-        """Execute a SQL query and return results
+    async def execute_query(
+        self, query: str, timeout: int = 0, export_path: str = ""
+    ) -> str:
+        """Execute a SQL query and return the first rows as a markdown table
+
+        Large results are paged: use the returned handle with
+        fetch_more_rows, or export_path to write all rows to a file.
 
         Args:
             query: SQL query to execute
+            timeout: Seconds the query may run before being cancelled, the
+                configured default when 0
+            export_path: CSV (or .parquet) file to write all rows to instead
+                of returning them
         """
         display_name = (
             f"🔍 Execute Query: {query[:100]}{'...' if len(query) > 100 else ''}"
@@ -47,12 +217,89 @@ class SQLAgent:
         cl.Step(name=display_name, type="tool")
 
         query = query.encode("utf-8").decode("unicode_escape")
+        kind = statement_kind(query) if self.query_cache else None
+        if kind == "read" and not export_path:
+            generation = self.query_cache.generation
+            cached_page = self.query_cache.get(query)
+            if cached_page is not None:
+                return cached_page
         try:
-            with self.get_cursor() as cursor:
-                results = cursor.execute(query).fetchall()
-                return str(results)
+            page = await query_executor.submit(
+                functools.partial(
+                    self._open_result, query, timeout or None, export_path
+                ),
+                self._session_id(),
+                timeout or None,
+            )
+        except ImportError as e:
+            return f"Error exporting results: {str(e)}; use a .csv path"
         except Exception as e:
             return f"Error executing query: {str(e)}"
+        finally:
+            if DDL_PATTERN.search(query):
+                # The next catalog lookup picks up the change
+                self.catalog.mark_stale()
+                if self.cost_guard:
+                    self.cost_guard.clear()
+            # Invalidated even when the statement failed: it may have
+            # written part of its changes
+            if kind == "write":
+                self.query_cache.invalidate(referenced_tables(query))
+            elif kind == "opaque":
+                self.query_cache.clear()
+        # Only complete results: a handle is only valid once, and results
+        # limited by the cost guard miss rows
+        if (
+            kind == "read"
+            and not export_path
+            and "More rows:" not in page
+            and LIMITED_MARKER not in page
+        ):
+            self.query_cache.put(query, page, generation=generation)
+        return page
+
+    @cl.step(type="tool")
+    async def fetch_more_rows(self, handle: str, max_rows: int = 0) -> str:
+        """Get the next rows of a query result returned with a handle
+
+        Args:
+            handle: Handle returned by execute_query, e.g. "result_1"
+            max_rows: Rows to return, the default page size when 0
+        """
+        display_name = f"📄 Fetch More Rows: {handle}"
+        cl.Step(name=display_name, type="tool")
+
+        result = self.results.take(handle)
+        if result is None:
+            return (
+                f"No open result with handle {handle}: it was fully read, "
+                "expired, or closed to make room; run the query again"
+            )
+        try:
+            return await query_executor.submit(
+                functools.partial(
+                    self._read_result, handle, result, max_rows or self.max_rows
+                ),
+                self._session_id(),
+            )
+        except Exception as e:
+            return f"Error fetching rows: {str(e)}"
+
+    async def get_catalog(self) -> SchemaCatalog:
+        """Get the schema catalog, checking for schema changes when due"""
+        if self.catalog.due:
+            await self.run_query(self.catalog.refresh_if_due)
+        return self.catalog
+
+    async def find_table(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """Look up a table in the catalog, refreshing it once if not found"""
+        catalog = await self.get_catalog()
+        table = catalog.find(table_name)
+        if table is None:
+            # Possibly created since the last check
+            catalog.mark_stale()
+            table = (await self.get_catalog()).find(table_name)
+        return table
 
     @cl.step(type="tool")
     async def get_table_names(self, unused_param: str = None) -> List[str]:
@@ -61,13 +308,45 @@ class SQLAgent:
         cl.Step(name=display_name, type="tool")
 
         try:
-            with self.get_cursor() as cursor:
-                tables = cursor.execute("SELECT name FROM sys.tables").fetchall()
-                result = [table[0] for table in tables]
-                return result
+            return (await self.get_catalog()).table_names()
         except Exception as e:
             return f"Error getting table names: {str(e)}"
 
+    @cl.step(type="tool")
+    async def find_relevant_tables(self, question: str, max_tables: int = 8) -> str:
+        """Find the tables most relevant to a question, with their schemas
+
+        Use this before listing all tables or fetching schemas one by one.
+
+        Args:
+            question: Question to answer or terms to look for
+            max_tables: Maximum number of tables to return
+        """
+        display_name = f"🔎 Find Tables: {question[:100]}"
+        cl.Step(name=display_name, type="tool")
+
+        try:
+            await self.get_catalog()
+            ranked = self.schema_search.search(question, limit=max(1, max_tables))
+        except Exception as e:
+            return f"Error finding tables: {str(e)}"
+        if not ranked:
+            return "No table matches; try other terms or get_table_names"
+
+        # ~4 characters per token
+        budget = self.search_budget_tokens * 4
+        lines = []
+        for table, _ in ranked:
+            line = compact_schema(table)
+            if lines and len(line) + 1 > budget:
+                break
+            lines.append(line)
+            budget -= len(line) + 1
+        omitted = [table["name"] for table, _ in ranked[len(lines) :]]
+        if omitted:
+            lines.append(f"Also relevant (schema omitted): {', '.join(omitted)}")
+        return "\n".join(lines)
+
     @cl.step(type="tool")
     async def get_column_info(self, table_name: str) -> List[Dict[str, str]]:
         """Get column information for a specific table
@@ -79,16 +358,12 @@ class SQLAgent:
         cl.Step(name=display_name, type="tool")
 
         try:
-            with self.get_cursor() as cursor:
-                columns = cursor.execute(
-                    f"""
-                    SELECT c.name, t.name as type_name
-                    FROM sys.columns c
-                    JOIN sys.types t ON c.system_type_id = t.system_type_id
-                    WHERE object_id = OBJECT_ID('dbo.{table_name}')
-                """
-                ).fetchall()
-                return [{"name": col[0], "type": col[1]} for col in columns]
+            table = await self.find_table(table_name)
+            if table is None:
+                return f"Error getting column info: table {table_name} not found"
+            return [
+                {"name": col["name"], "type": col["type"]} for col in table["columns"]
+            ]
         except Exception as e:
             return f"Error getting column info: {str(e)}"
 
@@ -103,78 +378,18 @@ class SQLAgent:
         cl.Step(name=display_name, type="tool")
 
         try:
-            with self.get_cursor() as cursor:
-                # Get column information with types
-                column_query = """
-                    SELECT 
-                        c.name,
-                        t.name as data_type,
-                        c.is_nullable,
-                        c.is_identity
-                    FROM sys.columns c
-                    JOIN sys.types t ON c.user_type_id = t.user_type_id
-                    WHERE object_id = OBJECT_ID('dbo.{table_name}')
-                """.format(
-                    table_name=table_name
-                )
-
-                columns = [
-                    {
-                        "name": row[0],
-                        "type": row[1],
-                        "nullable": bool(row[2]),
-                        "is_identity": bool(row[3]),
-                    }
-                    for row in cursor.execute(column_query).fetchall()
-                ]
-
-                # Get primary key columns
-                pk_query = """
-                    SELECT c.name
-                    FROM sys.indexes i
-                    JOIN sys.index_columns ic ON i.object_id = ic.object_id
-                    JOIN sys.columns c ON ic.object_id = c.object_id AND ic.column_id = c.column_id
-                    WHERE i.is_primary_key = 1
-                    AND i.object_id = OBJECT_ID('dbo.{table_name}')
-                """.format(
-                    table_name=table_name
-                )
-
-                primary_keys = [row[0] for row in cursor.execute(pk_query).fetchall()]
-
-                # Get foreign key relationships
-                fk_query = """
-                    SELECT 
-                        pc.name as column_name,
-                        ro.name as referenced_table,
-                        rc.name as referenced_column
-                    FROM sys.foreign_keys fk
-                    JOIN sys.foreign_key_columns fkc ON fk.object_id = fkc.constraint_object_id
-                    JOIN sys.columns pc ON fkc.parent_column_id = pc.column_id AND fkc.parent_object_id = pc.object_id
-                    JOIN sys.columns rc ON fkc.referenced_column_id = rc.column_id AND fkc.referenced_object_id = rc.object_id
-                    JOIN sys.objects ro ON fk.referenced_object_id = ro.object_id
-                    WHERE fk.parent_object_id = OBJECT_ID('dbo.{table_name}')
-                """.format(
-                    table_name=table_name
-                )
-
-                foreign_keys = [
-                    {
-                        "column": row[0],
-                        "references": {"table": row[1], "column": row[2]},
-                    }
-                    for row in cursor.execute(fk_query).fetchall()
-                ]
-
-                return {
-                    "table_name": table_name,
-                    "columns": columns,
-                    "primary_keys": primary_keys,
-                    "foreign_keys": foreign_keys,
-                }
+            if await self.find_table(table_name) is None:
+                return f"Error getting table schema: table {table_name} not found"
+            return self.catalog.schema(table_name)
         except Exception as e:
             return f"Error getting table schema: {str(e)}"
 
+    def _invalidate_table(self, table_name: str):
+        """Drop the cached query results reading a table after writing it"""
+        if self.query_cache:
+            name = table_name.strip().replace("].[", ".").split(".")[-1].strip("[]")
+            self.query_cache.invalidate({name})
+
     @cl.step(type="tool")
     async def insert_data(self, table_name: str, data: Dict[str, Any]) -> str:
         """Insert data into specified table
@@ -187,31 +402,136 @@ class SQLAgent:
         cl.Step(name=display_name, type="tool")
 
         try:
-            with self.get_cursor() as cursor:
+            def work(cursor):
                 columns = ", ".join(data.keys())
                 values = ", ".join(["?" for _ in data])
                 query = f"INSERT INTO {table_name} ({columns}) VALUES ({values})"
                 cursor.execute(query, list(data.values()))
-                self.conn.commit()
+                cursor.connection.commit()
                 return f"Successfully inserted data into {table_name}"
+
+            return await self.run_query(work)
         except Exception as e:
             return f"Error inserting data: {str(e)}"
+        finally:
+            self._invalidate_table(table_name)
+
+    @cl.step(type="tool")
+    async def bulk_insert(
+        self, table_name: str, rows: str = "", file_path: str = ""
+    ) -> str:
+        """Insert many rows into a table in one transaction
+
+        All rows are inserted or, on any error, none.
+
+        Args:
+            table_name: Name of the table to insert into
+            rows: JSON array of objects mapping column names to values
+            file_path: CSV file with a header row, or JSON file with an array
+                of objects, to insert instead of rows
+        """
+        source = file_path or f"{len(rows)} chars of rows"
+        display_name = f"📥 Bulk Insert Into {table_name}: {source}"
+        cl.Step(name=display_name, type="tool")
+
+        try:
+            columns, values = load_rows(rows, file_path)
+        except (OSError, ValueError) as e:
+            return f"Error reading rows: {str(e)}"
+        if not columns:
+            return "Error inserting data: no rows given"
+
+        try:
+            table = await self.find_table(table_name)
+        except Exception as e:
+            return f"Error inserting data: {str(e)}"
+        if table is None:
+            return f"Error inserting data: table {table_name} not found"
+        # Validate before sending anything to the server
+        known = {column["name"].lower(): column for column in table["columns"]}
+        unknown = [column for column in columns if column.lower() not in known]
+        if unknown:
+            return (
+                f"Error inserting data: unknown columns {', '.join(unknown)} in "
+                f"{table['name']} "
+                f"(columns: {', '.join(column['name'] for column in known.values())})"
+            )
+        identity = [
+            column for column in columns if known[column.lower()]["is_identity"]
+        ]
+        if identity:
+            return (
+                f"Error inserting data: {', '.join(identity)} is an identity "
+                "column, leave it out"
+            )
+
+        target = f"{quote_name(table['schema'])}.{quote_name(table['name'])}"
+        names = [quote_name(known[column.lower()]["name"]) for column in columns]
+        query = (
+            f"INSERT INTO {target} ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+
+        def work(cursor):
+            if hasattr(cursor, "fast_executemany"):
+                # pyodbc: send each batch as one parameter array
+                cursor.fast_executemany = True
+            start = time.perf_counter()
+            inserted = 0
+            while True:
+                batch = list(itertools.islice(values, self.bulk_batch_size))
+                if not batch:
+                    break
+                cursor.executemany(query, batch)
+                inserted += len(batch)
+            # Committed once; an error rolls everything back
+            cursor.connection.commit()
+            return inserted, time.perf_counter() - start
+
+        try:
+            inserted, elapsed = await self.run_query(work)
+        except Exception as e:
+            return f"Error inserting data, no rows were inserted: {str(e)}"
+        finally:
+            self._invalidate_table(table["name"])
+        rate = inserted / elapsed if elapsed > 0 else float(inserted)
+        return (
+            f"Successfully inserted {inserted} rows into {table['name']} "
+            f"in {elapsed:.2f}s ({rate:.0f} rows/s)"
+        )
 
     # Create wrapper functions for non-async calls
-    def _execute_query(self, query: str) -> str:
-        return asyncio.run(self.execute_query(query))
+    def _execute_query(
+        self, query: str, timeout: int = 0, export_path: str = ""
+    ) -> str:
+        return run_tool(self.execute_query(query, timeout, export_path))
+
+    def _fetch_more_rows(self, handle: str, max_rows: int = 0) -> str:
+        return run_tool(self.fetch_more_rows(handle, max_rows))
 
+    # Catalog lookups are served from the schema catalog, which keeps itself
+    # up to date: they are not cached again as tool results
+    @read_only
     def _get_table_names(self, unused_param: str = None) -> List[str]:
-        return asyncio.run(self.get_table_names(unused_param))
+        return run_tool(self.get_table_names(unused_param))
 
+    @read_only
+    def _find_relevant_tables(self, question: str, max_tables: int = 8) -> str:
+        return run_tool(self.find_relevant_tables(question, max_tables))
+
+    @read_only
     def _get_column_info(self, table_name: str) -> List[Dict[str, str]]:
-        return asyncio.run(self.get_column_info(table_name))
+        return run_tool(self.get_column_info(table_name))
 
+    @read_only
     def _get_table_schema(self, table_name: str) -> Dict[str, Any]:
-        return asyncio.run(self.get_table_schema(table_name))
+        return run_tool(self.get_table_schema(table_name))
 
     def _insert_data(self, table_name: str, data: Dict[str, Any]) -> str:
-        return asyncio.run(self.insert_data(table_name, data))
+        return run_tool(self.insert_data(table_name, data))
+
+    def _bulk_insert(self, table_name: str, rows: str = "", file_path: str = "") -> str:
+        return run_tool(self.bulk_insert(table_name, rows, file_path))
 
     def create_agent(self) -> Agent:
         """Create and return a Swarm Agent with SQL capabilities"""
@@ -220,17 +540,22 @@ class SQLAgent:
             model="gemini/gemini-2.0-flash-exp",
             instructions="""You are a helpful AI assistant with SQL database capabilities.
             You can execute queries, list tables and their columns, and insert data.
+            Use bulk_insert rather than insert_data when adding more than a few rows.
             You can inspect detailed schema information for specific tables.
+            Start with find_relevant_tables to locate the tables a question needs.
             Always validate inputs before executing SQL operations.
             Provide clear feedback about database operations.
             Try to answer questions about the structure yourself by using the functions provided.
             Be careful with data modifications and confirm before making changes.""",
             functions=[
                 self._execute_query,
+                self._fetch_more_rows,
+                self._find_relevant_tables,
                 self._get_table_names,
                 self._get_column_info,
                 self._get_table_schema,
                 self._insert_data,
+                self._bulk_insert,
             ],
         )
 
@@ -243,10 +568,14 @@ class SQLAgent:
         self.close()
 
     def close(self):
-        """Explicitly close the database connection"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Explicitly close the database connections"""
+        results = getattr(self, "results", None)
+        if results:
+            results.close()
+        pool = getattr(self, "pool", None)
+        if pool:
+            pool.close()
+            self.pool = None
 
     def __del__(self):
         """Cleanup database connection"""
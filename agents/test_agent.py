@@ -2,6 +2,7 @@ from swarm import Agent
 from agents.selenium_agent import SeleniumAgent
 from typing import List, Dict
 import chainlit as cl
+from core.tool_runtime import run_tool
 
 
 class TestAgent(SeleniumAgent):
@@ -22,9 +23,7 @@ class TestAgent(SeleniumAgent):
 
     # Create wrapper function for non-async call
     def _transfer_to_orchestrator(self, unused: str = "") -> str:
-        import asyncio
-
-        return asyncio.run(self.transfer_to_orchestrator(unused))
+        return run_tool(self.transfer_to_orchestrator(unused))
 
     def create_agent(self) -> Agent:
         selenium_agent = super().create_agent()
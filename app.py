@@ -1,13 +1,22 @@
 import chainlit as cl
-from swarm import Swarm
 from agents.file_agent import FileAgent
 from agents.sql_agent import SQLAgent
 from agents.selenium_agent import SeleniumAgent
 from agents.cli_agent import CLIAgent
+from core.swarm_client import SwarmClient
+from core.turn_executor import TurnExecutor
+from core.context_manager import ContextManager
+from core.session_store import SessionStore
+from core.query_executor import query_executor
+from core.process_resources import resource_monitor
 import os
+import logging
 
 # Initialize Swarm client
-client = Swarm()
+client = SwarmClient()
+
+# Run turns off the event loop so sessions don't block each other
+turn_executor = TurnExecutor()
 
 # Create agents
 cli_agent = CLIAgent()
@@ -15,32 +24,58 @@ cli_agent = CLIAgent()
 # Choose which agent to use (you can modify this based on your needs)
 agent = cli_agent.create_agent()
 
-# Store conversation history
-conversation_history = {}
+# Keep the history sent to the model within a token budget
+context_manager = ContextManager()
+
+
+def forget_session(session_id: str):
+    """Release everything held for a session that ended or was evicted"""
+    turn_executor.forget(session_id)
+    context_manager.forget(session_id)
+    # Queries run on database threads: cancel them on the server
+    query_executor.cancel_session(session_id)
+    cli_agent.close_session(session_id)
+
+
+# Store conversation history, evicting idle sessions between turns
+session_store = SessionStore(on_evict=forget_session, is_busy=turn_executor.busy)
 
 
 @cl.on_chat_start
 async def on_chat_start():
-    conversation_history[cl.user_session.get("id")] = []
+    session_store.create(cl.user_session.get("id"))
 
 
 @cl.on_message
 async def main(message: cl.Message):
     session_id = cl.user_session.get("id")
-    messages = conversation_history[session_id]
+    session = session_store.get(session_id) or session_store.create(session_id)
+    messages = session["history"]
     messages.append({"role": "user", "content": message.content})
 
     try:
-        response = client.run(agent=agent, messages=messages)
+        messages = context_manager.compact(messages, agent.model, session_id)
+        response = await turn_executor.run(
+            session_id, client.run, agent=agent, messages=messages
+        )
         messages.extend(response.messages)
-        conversation_history[session_id] = messages
+        session_store.set_history(session_id, messages)
         await cl.Message(content=response.messages[-1]["content"]).send()
+        logging.info(f"CLI processes: {resource_monitor.gauges()}")
     except Exception as e:
         error_msg = f"An error occurred: {str(e)}"
         print(error_msg)
         await cl.Message(content=error_msg).send()
 
 
+@cl.on_chat_end
+def on_chat_end():
+    session_id = cl.user_session.get("id")
+    session_store.remove(session_id)
+    forget_session(session_id)
+
+
 @cl.on_stop
 def on_stop():
+    query_executor.cancel_session(cl.user_session.get("id"))
     cli_agent.close()
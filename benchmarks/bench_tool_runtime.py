@@ -0,0 +1,49 @@
+"""Micro-benchmark: per-call overhead of dispatching a tool coroutine
+
+Compares the previous `asyncio.run` per call with the shared tool runtime,
+from a worker thread (as Swarm turns run) and from inside a running loop.
+
+Usage:
+    python -m benchmarks.bench_tool_runtime [calls]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import sys
+import time
+
+from core.tool_runtime import ToolRuntime
+
+
+async def tool(value: int) -> int:
+    """Stand-in for a `@cl.step` tool with no real work"""
+    return value + 1
+
+
+def bench(name: str, call, calls: int):
+    start = time.perf_counter()
+    for i in range(calls):
+        call(i)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {elapsed / calls * 1e6:8.1f} us/call")
+
+
+def main(calls: int):
+    runtime = ToolRuntime()
+    with ThreadPoolExecutor(max_workers=1) as worker:
+        worker.submit(
+            bench, "asyncio.run (worker thread)", lambda i: asyncio.run(tool(i)), calls
+        ).result()
+        worker.submit(
+            bench, "ToolRuntime (worker thread)", lambda i: runtime.run(tool(i)), calls
+        ).result()
+
+    async def from_loop():
+        bench("ToolRuntime (inside running loop)", lambda i: runtime.run(tool(i)), calls)
+
+    asyncio.run(from_loop())
+    runtime.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
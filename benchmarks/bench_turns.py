@@ -0,0 +1,411 @@
+"""End-to-end turn benchmark against a local scripted model
+
+Runs whole agent turns through SwarmClient and TurnExecutor, exactly as the
+Chainlit handlers do, but against benchmarks.mock_llm instead of a real
+model, with local stand-ins for the browser, database and project files.
+
+Flows:
+    dev  main.py's orchestrator -> developer -> tester -> orchestrator flow
+    cli  CLIAgent tools against short-lived local subprocesses
+    sql  SQLAgent tools against an SQLite database
+
+Usage:
+    python -m benchmarks.bench_turns --flow dev --sessions 20 --concurrency 4
+    python -m benchmarks.bench_turns --flow all --stream --json results.json
+"""
+
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from benchmarks import fixtures
+from benchmarks.mock_llm import MockLLMServer
+
+MOCK_MODEL = "mock-model"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile, 0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Metrics:
+    """Timings collected from worker threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turns: List[float] = []
+        self.first_tokens: List[float] = []
+        self.llm_calls: List[float] = []
+        self.tool_calls: List[float] = []
+        self.errors = 0
+
+    def add(self, name: str, value: float):
+        with self.lock:
+            getattr(self, name).append(value)
+
+    def summary(self, sessions: int, wall_time: float) -> Dict[str, Any]:
+        turn_total = sum(self.turns)
+        overhead = turn_total - sum(self.llm_calls) - sum(self.tool_calls)
+        return {
+            "sessions": sessions,
+            "turns": len(self.turns),
+            "errors": self.errors,
+            "turn_p50_ms": percentile(self.turns, 0.5) * 1000,
+            "turn_p95_ms": percentile(self.turns, 0.95) * 1000,
+            "first_token_p50_ms": percentile(self.first_tokens, 0.5) * 1000,
+            "first_token_p95_ms": percentile(self.first_tokens, 0.95) * 1000,
+            "llm_call_p50_ms": percentile(self.llm_calls, 0.5) * 1000,
+            "tool_call_p50_ms": percentile(self.tool_calls, 0.5) * 1000,
+            "tool_call_p95_ms": percentile(self.tool_calls, 0.95) * 1000,
+            "overhead_ms_per_turn": overhead / len(self.turns) * 1000 if self.turns else 0,
+            "sessions_per_second": sessions / wall_time if wall_time else 0,
+        }
+
+
+def create_client(base_url: str, metrics: Metrics):
+    """SwarmClient pointed at the mock server that records LLM and tool time"""
+    from openai import OpenAI
+    from core.swarm_client import SwarmClient
+
+    class BenchClient(SwarmClient):
+        def get_chat_completion(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().get_chat_completion(*args, **kwargs)
+            finally:
+                metrics.add("llm_calls", time.perf_counter() - start)
+
+        def handle_tool_calls(self, tool_calls, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return super().handle_tool_calls(tool_calls, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                for _ in tool_calls:
+                    metrics.add("tool_calls", elapsed / len(tool_calls))
+
+    return BenchClient(client=OpenAI(base_url=base_url, api_key="mock"))
+
+
+# Transfer tools and the agent main.py switches to for the next turn
+TRANSFERS = {
+    "_transfer_to_dev_agent": "developer",
+    "_transfer_to_test_agent": "tester",
+    "_transfer_to_orchestrator": "orchestrator",
+}
+
+
+class DevFlow:
+    """main.py's orchestrator -> developer -> tester -> orchestrator flow
+
+    As in main.py, a transfer takes effect on the next user turn, so one
+    round trip through the three agents takes three turns.
+    """
+
+    prompt = "Change the footer text to 'Demo shop'"
+
+    def __init__(self, project: str):
+        self.project = project
+
+    def script(self) -> Dict[str, List[Dict[str, Any]]]:
+        header = os.path.join(self.project, "src", "components", "Header.tsx")
+        footer = os.path.join(self.project, "src", "components", "Footer.tsx")
+        return {
+            "orchestrator of a web development": [
+                {"tool_calls": [{"name": "_read_readme"}]},
+                {"tool_calls": [{"name": "_transfer_to_dev_agent"}]},
+                {"content": "The developer will update Footer.tsx."},
+            ],
+            "TypeScript/React developer": [
+                {
+                    "tool_calls": [
+                        {"name": "_read_component", "arguments": {"path": header}},
+                        {"name": "_read_component", "arguments": {"path": footer}},
+                    ]
+                },
+                {
+                    "tool_calls": [
+                        {
+                            "name": "_write_component",
+                            "arguments": {
+                                "path": footer,
+                                "content": fixtures.COMPONENT.format(
+                                    name="Footer", lower="footer"
+                                ),
+                            },
+                        }
+                    ]
+                },
+                {"tool_calls": [{"name": "_transfer_to_test_agent"}]},
+                {"content": "Footer.tsx is updated, handing over to testing."},
+            ],
+            "web automation": [
+                {
+                    "tool_calls": [
+                        {
+                            "name": "_navigate_to",
+                            "arguments": {"url": "http://localhost:3000"},
+                        }
+                    ]
+                },
+                {
+                    "tool_calls": [
+                        {
+                            "name": "_find_element_text",
+                            "arguments": {"selector": ".footer"},
+                        }
+                    ]
+                },
+                {"tool_calls": [{"name": "_transfer_to_orchestrator"}]},
+                {"content": "The footer renders the new text."},
+            ],
+        }
+
+    def setup(self):
+        """Create the agents like main.setup_agents, with a fake browser"""
+        from agents.developer_agent import DeveloperAgent
+        from agents.orchestrator_agent import OrchestratorAgent
+        from agents.test_agent import TestAgent
+
+        test_agent = TestAgent(orchestrator_agent=None)
+        test_agent.driver = fixtures.FakeWebDriver()
+        dev_agent = DeveloperAgent(test_agent=test_agent)
+        orchestrator_agent = OrchestratorAgent(dev_agent=dev_agent, test_agent=test_agent)
+        dev_agent.orchestrator_agent = orchestrator_agent
+        test_agent.orchestrator_agent = orchestrator_agent
+
+        agents = {
+            "orchestrator": orchestrator_agent.create_agent(),
+            "developer": dev_agent.create_agent(),
+            "tester": test_agent.create_agent(),
+        }
+        return agents, "orchestrator", [test_agent]
+
+
+class CLIFlow:
+    """CLIAgent tools against local subprocesses"""
+
+    prompt = "Start the counter script and show me its output"
+
+    def script(self) -> List[Dict[str, Any]]:
+        counter = (
+            f'"{sys.executable}" -u -c "import time\n'
+            'for i in range(200):\n    print(i)\n    time.sleep(0.01)"'
+        )
+        return [
+            {"tool_calls": [{"name": "_get_current_dir"}]},
+            {"tool_calls": [{"name": "_run_command", "arguments": {"command": "echo ready"}}]},
+            {"tool_calls": [{"name": "_start_process", "arguments": {"command": counter}}]},
+            {
+                "tool_calls": [
+                    {
+                        "name": "_wait_for_output",
+                        "arguments": {"process_id": "process_0", "pattern": "^20$", "timeout": 10},
+                    }
+                ]
+            },
+            {"tool_calls": [{"name": "_get_latest_output", "arguments": {"process_id": "process_0"}}]},
+            {"tool_calls": [{"name": "_stop_process", "arguments": {"process_id": "process_0"}}]},
+            {"content": "The counter printed its first lines and was stopped."},
+        ]
+
+    def setup(self):
+        from agents.cli_agent import CLIAgent
+
+        cli_agent = CLIAgent()
+        return {"cli": cli_agent.create_agent()}, "cli", [cli_agent]
+
+
+class SQLFlow:
+    """SQLAgent tools against an SQLite database"""
+
+    prompt = "How many users are there? Add one and show the newest users."
+
+    def __init__(self, database: str):
+        self.database = database
+
+    def script(self) -> List[Dict[str, Any]]:
+        return [
+            {"tool_calls": [{"name": "_execute_query", "arguments": {"query": "SELECT COUNT(*) FROM users"}}]},
+            {
+                "tool_calls": [
+                    {
+                        "name": "_insert_data",
+                        "arguments": {"table_name": "users", "data": fixtures.insert_row(0)},
+                    }
+                ]
+            },
+            {
+                "tool_calls": [
+                    {
+                        "name": "_execute_query",
+                        "arguments": {"query": "SELECT * FROM users ORDER BY id DESC LIMIT 20"},
+                    }
+                ]
+            },
+            {"content": "There are 1001 users now; the newest are listed above."},
+        ]
+
+    def setup(self):
+        sql_agent = fixtures.sqlite_agent(self.database)
+        return {"sql": sql_agent.create_agent()}, "sql", [sql_agent]
+
+
+async def run_session(
+    index: int, flow, client, turn_executor, metrics: Metrics, turns: int, stream: bool
+):
+    """Run one session's turns like the Chainlit on_message handler"""
+    from chainlit.context import init_http_context
+
+    init_http_context()
+    session_id = f"bench-{index}"
+    agents, current, resources = flow.setup()
+    history: List[Dict[str, Any]] = []
+
+    def run_turn(agent, messages):
+        start = time.perf_counter()
+        if not stream:
+            response = client.run(
+                agent=agent, messages=messages, model_override=MOCK_MODEL
+            )
+        else:
+            response = None
+            first_token = None
+            for chunk in client.run(
+                agent=agent, messages=messages, model_override=MOCK_MODEL, stream=True
+            ):
+                if chunk.get("content") and first_token is None:
+                    first_token = time.perf_counter() - start
+                    metrics.add("first_tokens", first_token)
+                if "response" in chunk:
+                    response = chunk["response"]
+        metrics.add("turns", time.perf_counter() - start)
+        return response
+
+    try:
+        for _ in range(turns):
+            agent = agents[current]
+            history.append(
+                {"role": "user", "content": f"{flow.prompt}\nYou're {agent.name}"}
+            )
+            try:
+                response = await turn_executor.run(
+                    session_id, run_turn, agent, list(history)
+                )
+            except Exception as e:
+                metrics.errors += 1
+                print(f"Session {session_id} failed: {e}", file=sys.stderr)
+                break
+            history.extend(response.messages)
+
+            # Switch agents by transfer tool name, like main.py
+            for message in response.messages:
+                for tool_call in message.get("tool_calls") or []:
+                    name = tool_call["function"]["name"]
+                    if name in TRANSFERS and TRANSFERS[name] in agents:
+                        current = TRANSFERS[name]
+    finally:
+        for resource in resources:
+            resource.close()
+
+
+async def run_flow(name: str, flow, args) -> Dict[str, Any]:
+    """Benchmark one flow and return its summary"""
+    from core.turn_executor import TurnExecutor
+
+    metrics = Metrics()
+    server = MockLLMServer(
+        flow.script(), latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms
+    )
+    client = create_client(server.base_url, metrics)
+    turn_executor = TurnExecutor(max_workers=args.concurrency)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                run_session(i, flow, client, turn_executor, metrics, args.turns, args.stream)
+                for i in range(args.sessions)
+            ]
+        )
+        wall_time = time.perf_counter() - start
+    finally:
+        turn_executor.shutdown()
+        server.close()
+
+    summary = metrics.summary(args.sessions, wall_time)
+    summary["flow"] = name
+    summary["concurrency"] = args.concurrency
+    summary["llm_requests"] = server.requests
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(
+        f"{summary['flow']:<4} sessions={summary['sessions']} "
+        f"concurrency={summary['concurrency']} turns={summary['turns']} "
+        f"errors={summary['errors']}"
+    )
+    print(
+        f"     turn p50={summary['turn_p50_ms']:.1f}ms p95={summary['turn_p95_ms']:.1f}ms"
+        f"  first token p50={summary['first_token_p50_ms']:.1f}ms"
+        f"  llm p50={summary['llm_call_p50_ms']:.1f}ms"
+    )
+    print(
+        f"     tool p50={summary['tool_call_p50_ms']:.2f}ms p95={summary['tool_call_p95_ms']:.2f}ms"
+        f"  overhead/turn={summary['overhead_ms_per_turn']:.1f}ms"
+        f"  sessions/s={summary['sessions_per_second']:.2f}"
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flow", choices=["dev", "cli", "sql", "all"], default="all")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--latency-ms", type=float, default=20, help="model latency per call")
+    parser.add_argument("--token-delay-ms", type=float, default=0, help="delay between streamed chunks")
+    parser.add_argument("--stream", action="store_true", help="use Swarm's streaming run")
+    parser.add_argument("--json", help="write the summaries to this file")
+    args = parser.parse_args(argv)
+
+    # cl.step logs a traceback whenever it cannot deepcopy a tool's agent
+    # (locks, drivers); the step still runs, so keep the report readable
+    logging.getLogger("chainlit").setLevel(logging.CRITICAL)
+
+    project = fixtures.create_project()
+    database = fixtures.create_sqlite_database()
+    # The orchestrator reads its README relative to the working directory
+    os.chdir(project)
+
+    flows = {
+        "dev": DevFlow(project),
+        "cli": CLIFlow(),
+        "sql": SQLFlow(database),
+    }
+    names = list(flows) if args.flow == "all" else [args.flow]
+
+    summaries = []
+    for name in names:
+        summary = asyncio.run(run_flow(name, flows[name], args))
+        print_summary(summary)
+        summaries.append(summary)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(summaries, file, indent=2)
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Local stand-ins used by the benchmark flows
+
+- a temporary React-style project with the README the orchestrator reads
+- a WebDriver replacement so the tester's tools run without a browser
+- an SQLAgent backed by an SQLite file instead of SQL Server
+"""
+
+from typing import Dict, List
+import os
+import sqlite3
+import tempfile
+
+README = """# Demo shop
+
+- src/components/Header.tsx: page header
+- src/components/Footer.tsx: page footer
+"""
+
+COMPONENT = """import React from "react";
+
+export const {name} = () => <div className="{lower}">{name}</div>;
+"""
+
+
+def create_project() -> str:
+    """Create a temporary project and return its path"""
+    root = tempfile.mkdtemp(prefix="bench-project-")
+    with open(os.path.join(root, "IF_YOURE_AN_LLM_README.md"), "w") as file:
+        file.write(README)
+    os.makedirs(os.path.join(root, "src", "components"))
+    for name in ["Header", "Footer"]:
+        with open(os.path.join(root, "src", "components", f"{name}.tsx"), "w") as file:
+            file.write(COMPONENT.format(name=name, lower=name.lower()))
+    return root
+
+
+class FakeElement:
+    def __init__(self, selector: str):
+        self.text = f"Text of {selector}"
+        self.selector = selector
+
+    def click(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def send_keys(self, text: str):
+        self.text = text
+
+    def get_attribute(self, name: str) -> str:
+        return f"{name} of {self.selector}"
+
+    def is_displayed(self) -> bool:
+        return True
+
+    def is_enabled(self) -> bool:
+        return True
+
+
+class FakeWebDriver:
+    """Answers the WebDriver calls made by SeleniumAgent instantly"""
+
+    def __init__(self):
+        self.current_url = "about:blank"
+        self.title = ""
+        self.page_source = "<html></html>"
+
+    def implicitly_wait(self, seconds: float):
+        pass
+
+    def get(self, url: str):
+        self.current_url = url
+        self.title = f"Page at {url}"
+        self.page_source = f"<html><head><title>{self.title}</title></head></html>"
+
+    def find_element(self, by: str, selector: str) -> FakeElement:
+        return FakeElement(selector)
+
+    def find_elements(self, by: str, selector: str) -> List[FakeElement]:
+        return [FakeElement(selector)]
+
+    def save_screenshot(self, path: str) -> bool:
+        with open(path, "wb") as file:
+            file.write(b"\x89PNG")
+        return True
+
+    def quit(self):
+        pass
+
+
+def create_sqlite_database() -> str:
+    """Create a temporary SQLite database with a populated users table"""
+    fd, path = tempfile.mkstemp(prefix="bench-", suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT)")
+    conn.executemany(
+        "INSERT INTO users (name, email) VALUES (?, ?)",
+        [(f"user {i}", f"user{i}@example.com") for i in range(1000)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def sqlite_agent(path: str):
+    """Create an SQLAgent whose connection is an SQLite database"""
+    from agents.sql_agent import SQLAgent
+
+    # The admin/session query is run against SQLite as well
+    os.environ.setdefault("ADMIN_QUERY", "SELECT 1")
+
+    class SQLiteAgent(SQLAgent):
+        def _establish_connection(self):
+            return sqlite3.connect(self.connection_string, check_same_thread=False)
+
+    return SQLiteAgent(path)
+
+
+def insert_row(index: int) -> Dict[str, str]:
+    return {"name": f"bench {index}", "email": f"bench{index}@example.com"}
@@ -0,0 +1,210 @@
+"""Scripted OpenAI-compatible chat completion server for offline benchmarks
+
+The server answers `POST /v1/chat/completions` (streaming and non-streaming)
+from a script instead of a model. A script is a list of steps; the step
+played is the number of assistant messages since the last user message, so
+every user turn walks through the script from the start.
+
+Each step is either `{"content": "..."}` or
+`{"tool_calls": [{"name": "_read_readme", "arguments": {...}}, ...]}`.
+Once the script is exhausted the server answers with a final text message.
+
+To script several agents, pass a dict mapping a piece of each agent's
+instructions to its steps; the script whose key appears in the system
+message is played.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Union
+import itertools
+import json
+import threading
+import time
+
+FINAL_MESSAGE = "Done."
+
+
+class MockLLMServer:
+    def __init__(
+        self,
+        script: Union[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]],
+        latency_ms: float = 0,
+        token_delay_ms: float = 0,
+        port: int = 0,
+    ):
+        """Start a scripted chat completion server on localhost
+
+        Args:
+            script: Steps played for every user turn, or steps per agent
+            latency_ms: Delay before the first byte of each response
+            token_delay_ms: Delay between streamed chunks
+            port: Port to listen on, any free port by default
+        """
+        self.scripts = script if isinstance(script, dict) else {"": script}
+        self.latency_ms = latency_ms
+        self.token_delay_ms = token_delay_ms
+        self.requests = 0
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(_Handler):
+            mock = server
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def next_step(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Pick the scripted step for a conversation"""
+        system = ""
+        if messages and messages[0].get("role") == "system":
+            system = messages[0].get("content") or ""
+        script = next(
+            (steps for key, steps in self.scripts.items() if key in system), []
+        )
+
+        step = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                break
+            if message.get("role") == "assistant":
+                step += 1
+        if step < len(script):
+            return script[step]
+        return {"content": FINAL_MESSAGE}
+
+    def completion(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a non-streaming chat completion for a request"""
+        step = self.next_step(request.get("messages", []))
+        message: Dict[str, Any] = {"role": "assistant", "content": step.get("content")}
+        tool_calls = self._tool_calls(step)
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        prompt_tokens = len(json.dumps(request.get("messages", []))) // 4
+        completion_tokens = len(json.dumps(message)) // 4
+        return {
+            "id": f"mock-{next(self.ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def chunks(self, request: Dict[str, Any]):
+        """Build the streamed chunks of a chat completion for a request"""
+        step = self.next_step(request.get("messages", []))
+        completion_id = f"mock-{next(self.ids)}"
+        base = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+        }
+
+        def chunk(delta, finish_reason=None):
+            return {
+                **base,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+
+        yield chunk({"role": "assistant", "content": ""})
+        if step.get("content"):
+            tokens = step["content"].split(" ")
+            for i, token in enumerate(tokens):
+                yield chunk({"content": token if i == len(tokens) - 1 else token + " "})
+        # Swarm merges a single tool call per chunk
+        for index, tool_call in enumerate(self._tool_calls(step)):
+            yield chunk({"tool_calls": [{"index": index, **tool_call}]})
+        yield chunk({}, "tool_calls" if step.get("tool_calls") else "stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens = len(json.dumps(request.get("messages", []))) // 4
+            completion_tokens = len(json.dumps(step)) // 4
+            yield {
+                **base,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+
+    def _tool_calls(self, step: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": f"call_{next(self.ids)}",
+                "type": "function",
+                "function": {
+                    "name": tool_call["name"],
+                    "arguments": json.dumps(tool_call.get("arguments", {})),
+                },
+            }
+            for tool_call in step.get("tool_calls", [])
+        ]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock: Optional[MockLLMServer] = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.mock.lock:
+            self.mock.requests += 1
+
+        if self.mock.latency_ms:
+            time.sleep(self.mock.latency_ms / 1000)
+
+        if not request.get("stream"):
+            body = json.dumps(self.mock.completion(request)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for chunk in self.mock.chunks(request):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.mock.token_delay_ms:
+                time.sleep(self.mock.token_delay_ms / 1000)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
@@ -0,0 +1,54 @@
+from typing import Any, Iterator, List, Tuple
+import csv
+import json
+
+
+def quote_name(name: str) -> str:
+    """Quote an identifier for SQL Server, e.g. "order" -> "[order]" """
+    return "[" + name.replace("]", "]]") + "]"
+
+
+def _read_csv(path: str) -> Iterator[tuple]:
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for record in reader:
+            yield tuple(value if value != "" else None for value in record)
+
+
+def load_rows(rows: Any, file_path: str = "") -> Tuple[List[str], Iterator[tuple]]:
+    """Read rows to insert from JSON text, a list of dicts, or a CSV/JSON file
+
+    Args:
+        rows: JSON array of objects (as text or parsed), used without file_path
+        file_path: CSV file with a header row, or JSON file with an array of
+            objects
+
+    Returns:
+        The column names, and an iterator of value tuples in that order.
+        CSV files are read lazily; their empty fields are inserted as NULL.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the rows are not a list of objects
+    """
+    if file_path and file_path.lower().endswith(".csv"):
+        with open(file_path, newline="", encoding="utf-8-sig") as file:
+            columns = next(csv.reader(file), [])
+        return columns, _read_csv(file_path)
+
+    if file_path:
+        with open(file_path, encoding="utf-8") as file:
+            rows = json.load(file)
+    elif isinstance(rows, str):
+        rows = json.loads(rows) if rows.strip() else []
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("rows must be a JSON array of objects")
+    columns: List[str] = []
+    for row in rows:
+        for column in row:
+            if column not in columns:
+                columns.append(column)
+    return columns, (tuple(row.get(column) for column in columns) for row in rows)
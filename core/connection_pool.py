@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import os
+import threading
+import time
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        init_query: Optional[str] = None,
+        acquire_timeout: Optional[float] = None,
+        ping_after: Optional[float] = None,
+        ping_query: str = "SELECT 1",
+    ):
+        """Thread-safe pool of DB-API connections
+
+        Each caller gets a connection of its own, so concurrent sessions run
+        their queries in parallel. The session initialization query runs once
+        per physical connection, when it is opened. A connection idle for
+        longer than ping_after is checked before being handed out, and one
+        that fails while in use is checked when returned; broken connections
+        are discarded and replaced by new ones.
+
+        Args:
+            connect: Opens a new connection
+            min_size: Connections opened up front and kept open. Defaults to
+                SQL_POOL_MIN_SIZE, or 1.
+            max_size: Upper bound of open connections. Defaults to
+                SQL_POOL_MAX_SIZE, or 8.
+            init_query: Run on every new connection, e.g. ADMIN_QUERY
+            acquire_timeout: Seconds to wait for a free connection. Defaults
+                to SQL_POOL_TIMEOUT, or 30.
+            ping_after: Idle seconds after which a connection is checked
+                before use. Defaults to SQL_POOL_PING_AFTER, or 60.
+            ping_query: Query used to check a connection
+        """
+        if min_size is None:
+            min_size = int(os.environ.get("SQL_POOL_MIN_SIZE", "1"))
+        if max_size is None:
+            max_size = int(os.environ.get("SQL_POOL_MAX_SIZE", "8"))
+        if acquire_timeout is None:
+            acquire_timeout = float(os.environ.get("SQL_POOL_TIMEOUT", "30"))
+        if ping_after is None:
+            ping_after = float(os.environ.get("SQL_POOL_PING_AFTER", "60"))
+        self.connect = connect
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.init_query = init_query
+        self.acquire_timeout = acquire_timeout
+        self.ping_after = ping_after
+        self.ping_query = ping_query
+        # Idle connections with the time they were returned, most recent last
+        self.idle: List[tuple] = []
+        self.size = 0
+        self.closed = False
+        self.created = 0
+        self.discarded = 0
+        self.waits = 0
+        self.changed = threading.Condition()
+        for _ in range(self.min_size):
+            self.size += 1
+            self.idle.append((self._open(), time.monotonic()))
+
+    def _open(self):
+        """Open and initialize a connection whose slot is already counted"""
+        try:
+            conn = self.connect()
+            if self.init_query:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(self.init_query)
+                finally:
+                    cursor.close()
+        except Exception:
+            with self.changed:
+                self.size -= 1
+                self.changed.notify()
+            raise
+        with self.changed:
+            self.created += 1
+        return conn
+
+    def _alive(self, conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_query).fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.changed:
+            self.size -= 1
+            self.discarded += 1
+            self.changed.notify()
+
+    def acquire(self):
+        """Get a connection, opening one if none is idle and there is room
+
+        Raises:
+            TimeoutError: If no connection became free within acquire_timeout
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self.changed:
+                if self.closed:
+                    raise ConnectionError("Connection pool is closed")
+                if not self.idle and self.size >= self.max_size:
+                    self.waits += 1
+                    while not self.idle and self.size >= self.max_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(
+                                f"No database connection free after {self.acquire_timeout:.0f}s"
+                            )
+                        self.changed.wait(remaining)
+                if self.idle:
+                    entry = self.idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    self.size += 1
+                    entry = None
+            if entry is None:
+                return self._open()
+            conn, returned_at = entry
+            if time.monotonic() - returned_at < self.ping_after or self._alive(conn):
+                return conn
+            logging.warning("Discarding broken database connection")
+            self._discard(conn)
+
+    def release(self, conn, failed: bool = False):
+        """Return a connection to the pool
+
+        Args:
+            conn: Connection from acquire()
+            failed: The caller hit an error: keep the connection only if it
+                still works
+        """
+        if failed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            if not self._alive(conn):
+                logging.warning("Discarding broken database connection")
+                self._discard(conn)
+                return
+        with self.changed:
+            if not self.closed:
+                self.idle.append((conn, time.monotonic()))
+                self.changed.notify()
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager for a pooled connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, failed=True)
+            raise
+        self.release(conn)
+
+    def gauges(self) -> Dict[str, int]:
+        """Get open, idle and in-use connections and lifetime counters"""
+        with self.changed:
+            return {
+                "open": self.size,
+                "idle": len(self.idle),
+                "in_use": self.size - len(self.idle),
+                "created": self.created,
+                "discarded": self.discarded,
+                "waits": self.waits,
+            }
+
+    def close(self):
+        """Close idle connections; in-use ones are closed when returned"""
+        with self.changed:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self._discard(conn)
@@ -0,0 +1,151 @@
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+
+# Token budget for the history sent with each turn, per model
+MODEL_TOKEN_BUDGETS = {
+    "gemini/gemini-2.0-flash-exp": 32000,
+}
+DEFAULT_TOKEN_BUDGET = 16000
+
+COMPACTED_MARKER = "[compacted"
+
+
+class ContextManager:
+    def __init__(
+        self,
+        budget_tokens: Optional[int] = None,
+        keep_recent_turns: int = 3,
+        stub_chars: int = 200,
+    ):
+        """Keep conversation history within a per-model token budget
+
+        The most recent turns are always kept verbatim. Older tool results
+        are replaced by short stubs, oldest first, until the history fits;
+        if that is not enough the oldest turns are dropped entirely.
+
+        Args:
+            budget_tokens: Budget applied to every model, overriding
+                MODEL_TOKEN_BUDGETS. Defaults to SWARM_CONTEXT_BUDGET if set.
+            keep_recent_turns: Number of most recent user turns kept verbatim
+            stub_chars: Number of characters of a tool result kept in its stub
+        """
+        if budget_tokens is None and os.environ.get("SWARM_CONTEXT_BUDGET"):
+            budget_tokens = int(os.environ["SWARM_CONTEXT_BUDGET"])
+        self.budget_tokens = budget_tokens
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.stub_chars = stub_chars
+        self.last_stats: Dict[str, Dict[str, int]] = {}
+
+    def budget_for(self, model: str) -> int:
+        """Get the token budget for a model"""
+        if self.budget_tokens is not None:
+            return self.budget_tokens
+        return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+    @staticmethod
+    def count_message_tokens(message: Dict[str, Any]) -> int:
+        """Estimate the tokens of a single message (~4 characters per token)"""
+        size = len(message.get("content") or "")
+        if message.get("tool_calls"):
+            size += len(json.dumps(message["tool_calls"]))
+        return size // 4 + 4
+
+    def count_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """Estimate the tokens of a list of messages"""
+        return sum(self.count_message_tokens(message) for message in messages)
+
+    def _recent_start(self, messages: List[Dict[str, Any]]) -> int:
+        """Index of the first message that must be kept verbatim"""
+        user_indexes = [
+            i for i, message in enumerate(messages) if message.get("role") == "user"
+        ]
+        if len(user_indexes) <= self.keep_recent_turns:
+            return 0
+        return user_indexes[-self.keep_recent_turns]
+
+    def _stub(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace a tool result with a compact stub"""
+        content = message.get("content") or ""
+        head = " ".join(content[: self.stub_chars].split())
+        stub = dict(message)
+        stub["content"] = (
+            f"{COMPACTED_MARKER} {message.get('tool_name', 'tool')} result, "
+            f"{len(content)} chars] {head}..."
+        )
+        return stub
+
+    def compact(
+        self, messages: List[Dict[str, Any]], model: str, session_id: str = ""
+    ) -> List[Dict[str, Any]]:
+        """Return a copy of the history that fits the model's budget
+
+        Args:
+            messages: Conversation history
+            model: Model the history is sent to
+            session_id: Session used for reporting
+        """
+        budget = self.budget_for(model)
+        compacted = list(messages)
+        tokens_before = self.count_tokens(compacted)
+        tokens = tokens_before
+        stubbed = 0
+        dropped = 0
+
+        recent_start = self._recent_start(compacted)
+        for i in range(recent_start):
+            if tokens <= budget:
+                break
+            message = compacted[i]
+            content = message.get("content") or ""
+            if (
+                message.get("role") != "tool"
+                or content.startswith(COMPACTED_MARKER)
+                or len(content) <= self.stub_chars
+            ):
+                continue
+            stub = self._stub(message)
+            tokens += self.count_message_tokens(stub) - self.count_message_tokens(
+                message
+            )
+            compacted[i] = stub
+            stubbed += 1
+
+        # Still over budget: drop whole turns, oldest first
+        recent_start = self._recent_start(compacted)
+        drop_until = 0
+        while tokens > budget and drop_until < recent_start:
+            next_turn = drop_until + 1
+            while (
+                next_turn < recent_start and compacted[next_turn].get("role") != "user"
+            ):
+                next_turn += 1
+            tokens -= self.count_tokens(compacted[drop_until:next_turn])
+            dropped += next_turn - drop_until
+            drop_until = next_turn
+        if dropped:
+            notice = {
+                "role": "user",
+                "content": f"{COMPACTED_MARKER}] {dropped} earlier messages were omitted to save context.",
+            }
+            compacted = [notice] + compacted[drop_until:]
+            tokens += self.count_message_tokens(notice)
+
+        stats = {
+            "budget": budget,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens,
+            "stubbed": stubbed,
+            "dropped": dropped,
+        }
+        self.last_stats[session_id] = stats
+        logging.info(
+            f"Context for session {session_id}: {tokens_before} -> {tokens} tokens "
+            f"(budget {budget}, {stubbed} stubbed, {dropped} dropped)"
+        )
+        return compacted
+
+    def forget(self, session_id: str):
+        """Drop reporting state for a finished session"""
+        self.last_stats.pop(session_id, None)
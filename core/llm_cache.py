@@ -0,0 +1,142 @@
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a request has no recorded completion"""
+
+
+def fingerprint(payload: Dict[str, Any]) -> str:
+    """Stable hash of a completion request (model, messages, tools, params)"""
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str, max_bytes: int = 512 * 1024**2, replay: bool = False):
+        """Disk-backed cache of chat completions keyed by request fingerprint
+
+        Entries are stored compressed in a SQLite file. When the stored size
+        exceeds max_bytes, the least recently used entries are evicted.
+
+        Args:
+            path: Path of the SQLite cache file
+            max_bytes: Maximum total size of stored completions
+            replay: Read-only mode: never store, and raise CacheMiss for
+                requests that were not recorded
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if replay:
+            # Recordings are only read: never create or modify the file, nor
+            # its -wal/-shm files (immutable, as nothing records meanwhile)
+            self.conn = sqlite3.connect(
+                f"file:{urllib.parse.quote(path)}?mode=ro&immutable=1",
+                uri=True,
+                timeout=30,
+                check_same_thread=False,
+            )
+            return
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a stored completion (as JSON), counting the hit or miss"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay:
+                    raise CacheMiss(f"No recorded completion for request {key[:12]}")
+                return None
+            self.hits += 1
+            if not self.replay:
+                self.conn.execute(
+                    "UPDATE completions SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self.conn.commit()
+            return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key: str, value: str):
+        """Store a completion (as JSON) and evict old entries over the size cap"""
+        if self.replay:
+            return
+        data = zlib.compress(value.encode("utf-8"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            total = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.conn.execute(
+                    "SELECT key, size FROM completions ORDER BY last_access"
+                ).fetchall()
+                evict = []
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    total -= size
+                self.conn.executemany("DELETE FROM completions WHERE key = ?", evict)
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the stored size"""
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def create_llm_cache() -> Optional[LLMCache]:
+    """Create the cache selected by LLM_CACHE (off, on or replay)"""
+    mode = os.environ.get("LLM_CACHE", "off").lower()
+    if mode == "off":
+        return None
+    if mode not in ("on", "replay"):
+        raise ValueError(f"Unknown LLM cache mode: {mode}")
+    return LLMCache(
+        os.environ.get("LLM_CACHE_PATH", ".llm_cache.db"),
+        max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", str(512 * 1024**2))),
+        replay=mode == "replay",
+    )
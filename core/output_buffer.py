@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+import itertools
+import os
+import re
+
+# A line and its sequence number
+Line = Tuple[int, str]
+
+
+class OutputBuffer:
+    def __init__(self, max_lines: Optional[int] = None, max_bytes: Optional[int] = None):
+        """Fixed-size ring buffer of a process's output lines
+
+        Every line gets a sequence number, increasing from 0, that stays
+        valid after older lines were dropped, so readers can keep a cursor.
+        Not thread-safe: callers hold the owning process's lock.
+
+        Args:
+            max_lines: Lines kept. Defaults to PROCESS_OUTPUT_MAX_LINES, or 2000.
+            max_bytes: Approximate size of the kept lines. Longer lines are
+                truncated to fit. Defaults to PROCESS_OUTPUT_MAX_BYTES, or 1 MB.
+        """
+        if max_lines is None:
+            max_lines = int(os.environ.get("PROCESS_OUTPUT_MAX_LINES", "2000"))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("PROCESS_OUTPUT_MAX_BYTES", str(1024**2)))
+        self.max_lines = max(1, max_lines)
+        self.max_bytes = max(1, max_bytes)
+        self.lines: Deque[Line] = deque()
+        self.bytes = 0
+        self.next_seq = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest kept line"""
+        return self.lines[0][0] if self.lines else self.next_seq
+
+    def append(self, line: str):
+        """Add a line, dropping the oldest ones over the size limits"""
+        if len(line) > self.max_bytes:
+            line = line[: self.max_bytes] + "…"
+        self.lines.append((self.next_seq, line))
+        self.next_seq += 1
+        self.bytes += len(line)
+        while len(self.lines) > self.max_lines or (
+            self.bytes > self.max_bytes and len(self.lines) > 1
+        ):
+            _, old = self.lines.popleft()
+            self.bytes -= len(old)
+            self.dropped += 1
+
+    def since(self, cursor: int) -> Tuple[List[Line], int]:
+        """Get the lines from a sequence number on
+
+        Returns:
+            The kept lines with seq >= cursor, and how many lines after the
+            cursor were dropped before they could be read
+        """
+        missed = max(0, self.first_seq - max(cursor, 0))
+        start = max(cursor, self.first_seq) - self.first_seq
+        # Indexing a deque is O(n): iterate it instead
+        return list(itertools.islice(self.lines, start, None)), missed
+
+    def last(self, count: int) -> List[Line]:
+        """Get the last count lines"""
+        count = min(max(count, 0), len(self.lines))
+        return list(itertools.islice(reversed(self.lines), count))[::-1]
+
+    def grep(self, pattern: str, limit: int = 100) -> List[Line]:
+        """Get the last lines matching a regex
+
+        Raises:
+            re.error: If the pattern is invalid
+        """
+        regex = re.compile(pattern)
+        matches = (line for line in reversed(self.lines) if regex.search(line[1]))
+        return list(itertools.islice(matches, max(limit, 0)))[::-1]
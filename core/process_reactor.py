@@ -0,0 +1,308 @@
+from core.output_buffer import Line, OutputBuffer
+from typing import Callable, Dict, List, Optional, Pattern
+import logging
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+
+READ_SIZE = 65536
+
+
+class ManagedProcess:
+    def __init__(self, process_id: str, command: str, popen: subprocess.Popen):
+        """A child process whose output is captured by the reactor
+
+        Args:
+            process_id: ID shown to the model, e.g. "process_0"
+            command: Command line the process was started with
+            popen: The running process, with stdout as a binary pipe
+        """
+        self.process_id = process_id
+        self.command = command
+        self.popen = popen
+        self.output = OutputBuffer()
+        self.partial = b""
+        self.exit_code: Optional[int] = None
+        self.started = time.time()
+        self.ended: Optional[float] = None
+        self.output_closed = False
+        # Set when the process was killed for exceeding a resource limit
+        self.killed_reason: Optional[str] = None
+        # Set when its output could not be captured any more
+        self.capture_error: Optional[str] = None
+        # Notified on every new line and on exit
+        self.changed = threading.Condition()
+
+    @property
+    def running(self) -> bool:
+        return self.exit_code is None
+
+    def _append(self, data: bytes):
+        """Split received bytes into complete lines"""
+        data = self.partial + data
+        *complete, self.partial = data.split(b"\n")
+        if len(self.partial) > self.output.max_bytes:
+            # Output without newlines (progress bars): keep it bounded
+            complete.append(self.partial)
+            self.partial = b""
+        if complete:
+            with self.changed:
+                for line in complete:
+                    self.output.append(line.decode("utf-8", errors="replace").rstrip("\r"))
+                self.changed.notify_all()
+
+    def _close_output(self):
+        """Keep a final line without newline once the pipe is closed"""
+        with self.changed:
+            if self.partial:
+                self.output.append(
+                    self.partial.decode("utf-8", errors="replace").rstrip("\r")
+                )
+                self.partial = b""
+            self.output_closed = True
+            self.changed.notify_all()
+
+    def _exited(self, exit_code: int):
+        with self.changed:
+            if self.exit_code is not None:
+                return
+            self.exit_code = exit_code
+            self.ended = time.time()
+            self.changed.notify_all()
+
+    def exit_status(self) -> str:
+        """Describe how the process ended"""
+        if self.killed_reason:
+            return f"Process killed: {self.killed_reason} (exit code {self.exit_code})"
+        if self.capture_error:
+            return (
+                f"Process exited with code {self.exit_code} (output lost: "
+                f"{self.capture_error})"
+            )
+        return f"Process exited with code {self.exit_code}"
+
+    def _signal(self, sig: int):
+        """Signal the process, and its whole group if it leads one"""
+        try:
+            if os.getpgid(self.popen.pid) == self.popen.pid:
+                os.killpg(self.popen.pid, sig)
+                return
+        except OSError:
+            pass
+        self.popen.send_signal(sig)
+
+    def stop(self, timeout: float = 5) -> int:
+        """Terminate the process (kill it after timeout) and get its exit code"""
+        if self.popen.poll() is None:
+            self._signal(signal.SIGTERM)
+            try:
+                self.popen.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._signal(signal.SIGKILL)
+                self.popen.wait()
+        self._exited(self.popen.returncode)
+        return self.exit_code
+
+    def wait_for(
+        self, regex: Pattern, cursor: int, timeout: float
+    ) -> Optional[Line]:
+        """Wait for an output line matching a regex
+
+        Lines from the cursor on are searched first, then new lines as they
+        arrive.
+
+        Args:
+            regex: Compiled pattern searched in each line
+            cursor: Sequence number of the first line to search
+            timeout: Seconds to wait
+
+        Returns:
+            The first matching line, or None if the process exited (and its
+            output was read) or the timeout elapsed first
+        """
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                lines, _ = self.output.since(cursor)
+                for line in lines:
+                    if regex.search(line[1]):
+                        return line
+                cursor = self.output.next_seq
+                if self.exit_code is not None and self.output_closed:
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.changed.wait(remaining)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        """Wait until the process exited and its output was read
+
+        Returns:
+            The exit code, or None on timeout
+        """
+        with self.changed:
+            self.changed.wait_for(
+                lambda: self.exit_code is not None and self.output_closed, timeout
+            )
+            return self.exit_code
+
+
+class ProcessReactor:
+    """Capture the output of all child processes on a single thread
+
+    The pipes of every started process are multiplexed with a selector, so
+    an idle process costs no CPU and no thread of its own. Output is read
+    until the pipe closes, including anything printed right before exit,
+    and the exit code is recorded once the process has been reaped.
+    """
+
+    def __init__(self):
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.pending: List[ManagedProcess] = []
+        self.wakeup_read: Optional[int] = None
+        self.wakeup_write: Optional[int] = None
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.selector = selectors.DefaultSelector()
+            self.wakeup_read, self.wakeup_write = os.pipe()
+            os.set_blocking(self.wakeup_read, False)
+            self.selector.register(self.wakeup_read, selectors.EVENT_READ, None)
+            self.thread = threading.Thread(
+                target=self._run, name="process-reactor", daemon=True
+            )
+            self.thread.start()
+
+    def start(
+        self,
+        process_id: str,
+        command: str,
+        cwd: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        preexec_fn: Optional[Callable[[], None]] = None,
+    ) -> ManagedProcess:
+        """Start a shell command and capture its stdout and stderr
+
+        The command runs in its own process group, so stopping it also stops
+        the processes it started (e.g. node under npm).
+
+        Args:
+            process_id: ID to register the process under
+            command: Shell command to run
+            cwd: Working directory
+            env: Environment, the current one by default
+            preexec_fn: Called in the child before the command runs
+        """
+        popen = subprocess.Popen(
+            command,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+            env=env,
+            start_new_session=True,
+            preexec_fn=preexec_fn,
+        )
+        return self.attach(ManagedProcess(process_id, command, popen))
+
+    def attach(self, process: ManagedProcess) -> ManagedProcess:
+        """Capture the output of a process started by the caller
+
+        Its stdout must be a pipe, with stderr redirected to it if needed.
+        """
+        self._ensure_started()
+        os.set_blocking(process.popen.stdout.fileno(), False)
+        with self.lock:
+            self.pending.append(process)
+        os.write(self.wakeup_write, b"\0")
+        return process
+
+    def _run(self):
+        # The only reader of every process: an error must not end it
+        while True:
+            for key, _ in self.selector.select():
+                try:
+                    if key.data is None:
+                        self._register_pending()
+                    else:
+                        self._read(key.data)
+                except Exception as e:
+                    if key.data is None:
+                        logging.error(f"Error registering processes: {e}")
+                    else:
+                        self._fail(key.data, e)
+
+    def _register_pending(self):
+        try:
+            while os.read(self.wakeup_read, READ_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for process in pending:
+            try:
+                self.selector.register(
+                    process.popen.stdout, selectors.EVENT_READ, process
+                )
+            except (OSError, ValueError) as e:
+                # E.g. a pipe closed before it was registered
+                self._fail(process, e)
+
+    def _read(self, process: ManagedProcess):
+        try:
+            data = os.read(process.popen.stdout.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if data:
+            process._append(data)
+            return
+
+        # EOF: everything the process wrote has been read
+        self.selector.unregister(process.popen.stdout)
+        process.popen.stdout.close()
+        process._close_output()
+        self._reap(process)
+
+    def _fail(self, process: ManagedProcess, error: Exception):
+        """Stop capturing a process whose output could not be handled"""
+        logging.error(f"Error capturing the output of {process.process_id}: {error}")
+        process.capture_error = str(error) or type(error).__name__
+        try:
+            self.selector.unregister(process.popen.stdout)
+        except (KeyError, ValueError):
+            pass
+        try:
+            process.popen.stdout.close()
+        except OSError:
+            pass
+        process._close_output()
+        self._reap(process)
+
+    def _reap(self, process: ManagedProcess):
+        """Record the exit code of a process whose output is closed"""
+        if process.popen.poll() is not None:
+            process._exited(process.popen.returncode)
+        else:
+            # Closed its output but still running: reap it without blocking
+            # the reactor
+            threading.Thread(
+                target=lambda: process._exited(process.popen.wait()),
+                name=f"reap-{process.process_id}",
+                daemon=True,
+            ).start()
+
+
+# Shared by all CLI agents in the process
+process_reactor = ProcessReactor()
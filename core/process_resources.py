@@ -0,0 +1,367 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import itertools
+import logging
+import os
+import threading
+import time
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Consecutive samples over the CPU limit before a process tree is killed
+CPU_BREACH_SAMPLES = 3
+
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+def _read_stat(pid: int) -> Optional[List[str]]:
+    """Fields of /proc/<pid>/stat after the command name, or None"""
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            data = file.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses
+    return data[data.rindex(")") + 2 :].split()
+
+
+def children_map() -> Dict[int, List[int]]:
+    """Map every running pid to its child pids, from /proc"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        fields = _read_stat(int(entry))
+        if fields:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+    return children
+
+
+def process_tree(
+    pid: int, children: Optional[Dict[int, List[int]]] = None
+) -> List[int]:
+    """Get a process and all its descendants
+
+    Args:
+        pid: Root of the tree
+        children: Result of children_map(), read from /proc if omitted
+    """
+    if children is None:
+        children = children_map()
+    tree = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def sample_tree(
+    pid: int, children: Optional[Dict[int, List[int]]] = None
+) -> Dict[str, Any]:
+    """Sum CPU time, RSS and open fds over a process tree
+
+    Returns:
+        {"pids", "cpu_seconds", "rss_bytes", "fds"}, with "pids" 0 once the
+        process is gone
+    """
+    sample = {"pids": 0, "cpu_seconds": 0.0, "rss_bytes": 0, "fds": 0}
+    for member in process_tree(pid, children):
+        fields = _read_stat(member)
+        if fields is None or fields[0] == "Z":
+            continue
+        sample["pids"] += 1
+        # utime and stime (fields 14 and 15), rss in pages (field 24)
+        sample["cpu_seconds"] += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        sample["rss_bytes"] += int(fields[21]) * PAGE_SIZE
+        try:
+            sample["fds"] += len(os.listdir(f"/proc/{member}/fd"))
+        except OSError:
+            pass
+    return sample
+
+
+def _write(path: str, value: str):
+    """Write a cgroup control file without Python-level buffering"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    try:
+        os.write(fd, value.encode())
+    finally:
+        os.close(fd)
+
+
+def spawn_limits() -> Optional[Callable[[], None]]:
+    """Build a preexec_fn applying the configured rlimits to a new process
+
+    Uses PROCESS_RLIMIT_AS_MB, PROCESS_RLIMIT_CPU_SECONDS and
+    PROCESS_RLIMIT_NOFILE; returns None when none is set.
+    """
+    import resource
+
+    limits = []
+    address_space = _env_number("PROCESS_RLIMIT_AS_MB")
+    if address_space:
+        limits.append((resource.RLIMIT_AS, int(address_space * 1024**2)))
+    cpu_seconds = _env_number("PROCESS_RLIMIT_CPU_SECONDS")
+    if cpu_seconds:
+        limits.append((resource.RLIMIT_CPU, int(cpu_seconds)))
+    open_files = _env_number("PROCESS_RLIMIT_NOFILE")
+    if open_files:
+        limits.append((resource.RLIMIT_NOFILE, int(open_files)))
+    if not limits:
+        return None
+
+    def apply():
+        for limit, value in limits:
+            resource.setrlimit(limit, (value, value))
+
+    return apply
+
+
+class ResourceMonitor:
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        max_rss_mb: Optional[float] = None,
+        max_cpu_percent: Optional[float] = None,
+        cgroup: Optional[str] = None,
+    ):
+        """Sample CPU, memory and fds of watched process trees, enforcing limits
+
+        A background thread samples every watched process (with all its
+        descendants) while at least one is running. A tree over the RSS
+        limit, or over the CPU limit for several samples in a row, is
+        stopped and the reason recorded on the process.
+
+        Args:
+            interval: Seconds between samples. Defaults to
+                PROCESS_SAMPLE_INTERVAL, or 2.
+            max_rss_mb: RSS limit per tree. Defaults to PROCESS_MAX_RSS_MB.
+            max_cpu_percent: CPU limit per tree (100 = one core). Defaults to
+                PROCESS_MAX_CPU_PERCENT.
+            cgroup: cgroup v2 directory under which each process gets its own
+                group with memory.max/cpu.max set from the limits above.
+                Defaults to PROCESS_CGROUP; not used when unset.
+        """
+        if interval is None:
+            interval = float(os.environ.get("PROCESS_SAMPLE_INTERVAL", "2"))
+        self.interval = interval
+        self.max_rss_mb = (
+            max_rss_mb if max_rss_mb is not None else _env_number("PROCESS_MAX_RSS_MB")
+        )
+        self.max_cpu_percent = (
+            max_cpu_percent
+            if max_cpu_percent is not None
+            else _env_number("PROCESS_MAX_CPU_PERCENT")
+        )
+        self.cgroup = cgroup or os.environ.get("PROCESS_CGROUP")
+        self.watched: Dict[int, Dict[str, Any]] = {}
+        # Groups created for new processes, removed once their last member
+        # is gone
+        self.stale_cgroups: Set[str] = set()
+        self.cgroup_ids = itertools.count()
+        self.kills = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def _open_cgroup(self) -> Tuple[str, int]:
+        """Create a new group with the configured limits
+
+        Returns:
+            The group's path and an open fd of its cgroup.procs
+        """
+        path = os.path.join(self.cgroup, f"cli-{os.getpid()}-{next(self.cgroup_ids)}")
+        os.makedirs(path, exist_ok=True)
+        try:
+            if self.max_rss_mb:
+                memory = int(self.max_rss_mb * 1024**2)
+                _write(os.path.join(path, "memory.max"), str(memory))
+            if self.max_cpu_percent:
+                period = 100000
+                quota = int(period * self.max_cpu_percent / 100)
+                _write(os.path.join(path, "cpu.max"), f"{quota} {period}")
+            fd = os.open(os.path.join(path, "cgroup.procs"), os.O_WRONLY | os.O_CREAT)
+        except OSError:
+            self.stale_cgroups.add(path)
+            raise
+        return path, fd
+
+    @contextmanager
+    def spawn_limits(self):
+        """Get a preexec_fn applying the rlimits and the cgroup limits
+
+        The cgroup is created and configured here, in the parent. The child
+        only writes to the group's already open cgroup.procs before the
+        command runs, so nothing it forks or allocates escapes the limits.
+        Processes must be started within the block. Yields None when no
+        limit is configured.
+        """
+        rlimits = spawn_limits()
+        if not self.cgroup:
+            yield rlimits
+            return
+        try:
+            path, fd = self._open_cgroup()
+        except OSError as e:
+            logging.error(f"Error creating a cgroup under {self.cgroup}: {e}")
+            yield rlimits
+            return
+
+        def apply():
+            try:
+                # "0" moves the writing process itself
+                os.write(fd, b"0")
+            except OSError:
+                # The child cannot log: watch() reports it
+                pass
+            if rlimits:
+                rlimits()
+
+        try:
+            yield apply
+        finally:
+            os.close(fd)
+            # Removed as soon as its last process is gone
+            self.stale_cgroups.add(path)
+            self.wakeup.set()
+
+    def _check_cgroup(self, process):
+        """Log an error if a process did not join its cgroup"""
+        try:
+            with open(f"/proc/{process.popen.pid}/cgroup") as file:
+                joined = "/cli-" in file.read()
+        except OSError:
+            # Already gone
+            return
+        if not joined:
+            logging.error(f"Error applying cgroup limits to {process.process_id}")
+
+    def _remove_stale_cgroups(self):
+        for path in list(self.stale_cgroups):
+            try:
+                os.rmdir(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Descendants still running: retried on the next sample
+                continue
+            self.stale_cgroups.discard(path)
+
+    def watch(self, process):
+        """Start sampling a ManagedProcess and its descendants"""
+        pid = process.popen.pid
+        if self.cgroup:
+            self._check_cgroup(process)
+        with self.lock:
+            self.watched[pid] = {
+                "process": process,
+                "sample": None,
+                "cpu_percent": 0.0,
+                "sampled_at": None,
+                "cpu_breaches": 0,
+            }
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name="resource-monitor", daemon=True
+                )
+                self.thread.start()
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                entries = list(self.watched.items())
+                if not entries:
+                    self.wakeup.clear()
+            if self.stale_cgroups:
+                self._remove_stale_cgroups()
+            if not entries:
+                # Nothing to watch: sleep until watch() is called
+                self.wakeup.wait(self.interval if self.stale_cgroups else None)
+                continue
+            children = children_map()
+            for pid, entry in entries:
+                self._sample(pid, entry, children)
+            time.sleep(self.interval)
+
+    def _sample(self, pid: int, entry: Dict[str, Any], children: Dict[int, List[int]]):
+        process = entry["process"]
+        if not process.running:
+            with self.lock:
+                self.watched.pop(pid, None)
+            return
+
+        now = time.monotonic()
+        sample = sample_tree(pid, children)
+        previous = entry["sample"]
+        if previous is not None:
+            elapsed = now - entry["sampled_at"]
+            cpu = max(0.0, sample["cpu_seconds"] - previous["cpu_seconds"])
+            entry["cpu_percent"] = 100 * cpu / elapsed if elapsed > 0 else 0.0
+        entry["sample"] = sample
+        entry["sampled_at"] = now
+
+        reason = None
+        if self.max_rss_mb and sample["rss_bytes"] > self.max_rss_mb * 1024**2:
+            reason = (
+                f"RSS {sample['rss_bytes'] / 1024**2:.0f} MB over the "
+                f"{self.max_rss_mb:.0f} MB limit"
+            )
+        if self.max_cpu_percent and entry["cpu_percent"] > self.max_cpu_percent:
+            entry["cpu_breaches"] += 1
+            if entry["cpu_breaches"] >= CPU_BREACH_SAMPLES:
+                reason = (
+                    f"CPU {entry['cpu_percent']:.0f}% over the "
+                    f"{self.max_cpu_percent:.0f}% limit"
+                )
+        else:
+            entry["cpu_breaches"] = 0
+
+        if reason:
+            logging.warning(
+                f"Killing {process.process_id} ({process.command}): {reason}"
+            )
+            process.killed_reason = reason
+            self.kills += 1
+            process.stop()
+            with self.lock:
+                self.watched.pop(pid, None)
+
+    def usage(self, process) -> Optional[Dict[str, Any]]:
+        """Get the latest sample of a watched process, sampling now if none"""
+        with self.lock:
+            entry = self.watched.get(process.popen.pid)
+        if entry is None:
+            return None
+        sample = entry["sample"] or sample_tree(process.popen.pid)
+        return {**sample, "cpu_percent": entry["cpu_percent"]}
+
+    def gauges(self) -> Dict[str, Any]:
+        """Totals over all watched processes, for the log and get_process_resources"""
+        with self.lock:
+            entries = list(self.watched.values())
+        totals = {
+            "watched_processes": len(entries),
+            "pids": 0,
+            "cpu_percent": 0.0,
+            "rss_bytes": 0,
+            "fds": 0,
+            "kills": self.kills,
+        }
+        for entry in entries:
+            if entry["sample"]:
+                totals["pids"] += entry["sample"]["pids"]
+                totals["rss_bytes"] += entry["sample"]["rss_bytes"]
+                totals["fds"] += entry["sample"]["fds"]
+            totals["cpu_percent"] += entry["cpu_percent"]
+        return totals
+
+
+# Shared by all CLI agents in the process
+resource_monitor = ResourceMonitor()
@@ -0,0 +1,69 @@
+from chainlit.utils import utc_now
+from core.process_reactor import ManagedProcess
+from typing import List, Optional
+import asyncio
+import os
+
+
+def format_batch(lines: List[str], missed: int, max_chars: int) -> str:
+    """Join a batch of lines, keeping only the newest that fit in max_chars"""
+    kept: List[str] = []
+    size = 0
+    for line in reversed(lines):
+        if size + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        size += len(line) + 1
+    skipped = missed + len(lines) - len(kept)
+    if skipped:
+        kept.append(f"[… {skipped} lines skipped]")
+    return "".join(line + "\n" for line in reversed(kept))
+
+
+async def stream_process_output(
+    process: ManagedProcess,
+    step,
+    interval: Optional[float] = None,
+    max_chars: Optional[int] = None,
+):
+    """Stream a process's output into a sent Chainlit step until it exits
+
+    New lines are sent at most once per interval, in batches of at most
+    max_chars, so a chatty process cannot flood the websocket. Cancel the
+    task to detach the step from the process.
+
+    Args:
+        process: Process to follow
+        step: Step already sent to the UI
+        interval: Seconds between updates. Defaults to
+            PROCESS_STREAM_INTERVAL, or 1.
+        max_chars: Size cap of each update, and of the output kept on the
+            step. Defaults to PROCESS_STREAM_MAX_CHARS, or 8000.
+    """
+    if interval is None:
+        interval = float(os.environ.get("PROCESS_STREAM_INTERVAL", "1"))
+    if max_chars is None:
+        max_chars = int(os.environ.get("PROCESS_STREAM_MAX_CHARS", "8000"))
+
+    cursor = 0
+    status = "[Detached]"
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            with process.changed:
+                lines, missed = process.output.since(cursor)
+                cursor = process.output.next_seq
+                done = process.exit_code is not None and process.output_closed
+
+            batch = format_batch([line for _, line in lines], missed, max_chars)
+            if batch:
+                await step.stream_token(batch)
+                # The UI has the full stream; keep only the tail in memory
+                step.output = step.output[-max_chars:]
+            if done:
+                status = f"[{process.exit_status()}]"
+                break
+    finally:
+        step.output = (step.output + status)[-max_chars:]
+        step.end = utc_now()
+        await step.update()
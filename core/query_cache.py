@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+import os
+import re
+import threading
+import time
+
+# String literals, comments, quoted identifiers and words of a statement
+SQL_TOKEN = re.compile(
+    r"(?P<string>N?'(?:[^']|'')*')"
+    r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<quoted>\[(?:[^\]]|\]\])*\]|\"(?:[^\"]|\"\")*\")"
+    r"|(?P<word>[A-Za-z_@#][\w@#$]*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.DOTALL,
+)
+
+# Results of queries using these change without any write
+VOLATILE = {
+    "getdate", "getutcdate", "sysdatetime", "sysutcdatetime", "sysdatetimeoffset",
+    "current_timestamp", "newid", "newsequentialid", "rand", "crypt_gen_random",
+    "@@identity", "scope_identity", "@@rowcount", "@@spid",
+}
+
+# Words that make a statement more than a plain read
+WRITES = {
+    "insert", "update", "delete", "merge", "truncate", "into", "exec", "execute",
+    "create", "alter", "drop", "grant", "revoke", "deny", "set", "declare",
+    "updlock", "xlock", "holdlock", "tablockx", "begin", "commit", "rollback",
+}
+
+DML = {"insert", "update", "delete", "merge", "truncate"}
+
+# Statements whose effects on tables cannot be told from their text
+OPAQUE = {"create", "alter", "drop", "exec", "execute", "sp_rename"}
+
+
+def _tokens(sql: str):
+    """Yield (kind, text) for the tokens of a statement, without comments"""
+    for match in SQL_TOKEN.finditer(sql):
+        if match.lastgroup != "comment":
+            yield match.lastgroup, match.group()
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical text of a statement: no comments, single spaces, lowercase
+    outside string literals, no trailing semicolon"""
+    parts = []
+    for kind, text in _tokens(sql):
+        if kind == "space":
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind == "string":
+            parts.append(text)
+        else:
+            parts.append(text.lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """Names a statement may refer to a table by
+
+    Every word and identifier is included (schema names, columns and aliases
+    too), so invalidation errs on the side of dropping too much.
+    """
+    words = set()
+    for kind, text in _tokens(sql):
+        if kind == "word":
+            words.add(text.lower())
+        elif kind == "quoted":
+            words.add(text[1:-1].replace("]]", "]").replace('""', '"').lower())
+    return words
+
+
+def is_read_only(sql: str) -> bool:
+    """Whether a statement is a single plain SELECT whose result can be cached
+
+    Conservative: anything that writes, locks, uses temporary tables or
+    variables, or reads the clock or random values is not.
+    """
+    tokens = [(kind, text.lower()) for kind, text in _tokens(sql) if kind != "space"]
+    while tokens and tokens[-1][1] == ";":
+        tokens.pop()
+    if not tokens or tokens[0][1] not in ("select", "with"):
+        return False
+    for kind, text in tokens:
+        if text == ";":
+            return False
+        if kind == "word" and (text in WRITES or text in VOLATILE or text[0] in "@#"):
+            return False
+    return True
+
+
+def statement_kind(sql: str) -> str:
+    """Classify a statement for the cache
+
+    Returns:
+        "read" for a cacheable query, "write" for DML whose tables can be
+        invalidated, "opaque" for DDL, procedure calls and SELECT INTO, which
+        invalidate everything, and "uncached" for other reads
+    """
+    if is_read_only(sql):
+        return "read"
+    words = referenced_tables(sql)
+    if words & OPAQUE:
+        return "opaque"
+    if words & DML:
+        return "write"
+    if "into" in words:
+        # SELECT INTO creates a table
+        return "opaque"
+    return "uncached"
+
+
+class QueryCache:
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """Results of read-only queries, keyed on their normalized text
+
+        Entries expire after the TTL and are dropped when a write touches a
+        table they refer to. Writes the agent does not see (other clients,
+        triggers, tables read through views) are only bounded by the TTL.
+
+        Args:
+            ttl_seconds: Seconds a result stays valid. Defaults to
+                SQL_QUERY_CACHE_TTL, or 300.
+            max_entries: Results kept. Defaults to
+                SQL_QUERY_CACHE_MAX_ENTRIES, or 256.
+            max_bytes: Total size of the results kept. Defaults to
+                SQL_QUERY_CACHE_MAX_BYTES, or 8 MB.
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("SQL_QUERY_CACHE_TTL", "300"))
+        if max_entries is None:
+            max_entries = int(os.environ.get("SQL_QUERY_CACHE_MAX_ENTRIES", "256"))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("SQL_QUERY_CACHE_MAX_BYTES", str(8 * 1024**2)))
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        # Incremented by every invalidation, see `put`
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str, params: Iterable[Any] = ()) -> tuple:
+        return (normalize_sql(sql), tuple(str(param) for param in params))
+
+    def _drop(self, key: tuple):
+        entry = self.entries.pop(key)
+        self.bytes -= entry["size"]
+
+    def get(self, sql: str, params: Iterable[Any] = ()) -> Optional[str]:
+        """Get the cached result of a query, counting the hit or miss"""
+        key = self.key(sql, params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() > entry["expires"]:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry["result"]
+
+    def put(self, sql: str, result: str, params: Iterable[Any] = (), generation: Optional[int] = None):
+        """Cache the result of a read-only query
+
+        Args:
+            sql: Query text
+            result: Result to cache
+            params: Query parameters
+            generation: `generation` read before running the query: the
+                result is not cached if a write invalidated the cache since
+        """
+        size = len(result)
+        if size > self.max_bytes:
+            return
+        key = self.key(sql, params)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = {
+                "result": result,
+                "size": size,
+                "tables": referenced_tables(sql),
+                "expires": time.monotonic() + self.ttl_seconds,
+            }
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self, tables: Iterable[str]):
+        """Drop the results referring to any of the tables"""
+        tables = {table.lower() for table in tables}
+        with self.lock:
+            stale = [key for key, entry in self.entries.items() if entry["tables"] & tables]
+            for key in stale:
+                self._drop(key)
+            self.stats["invalidations"] += len(stale)
+            self.generation += 1
+
+    def clear(self):
+        """Drop every result, e.g. after DDL or a stored procedure call"""
+        with self.lock:
+            self.stats["invalidations"] += len(self.entries)
+            self.entries.clear()
+            self.bytes = 0
+            self.generation += 1
+
+    def gauges(self) -> Dict[str, Any]:
+        """Get hits, misses, hit ratio and the size of the cache"""
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+
+def create_query_cache() -> Optional[QueryCache]:
+    """Create the cache selected by SQL_QUERY_CACHE (off or on)"""
+    mode = os.environ.get("SQL_QUERY_CACHE", "off").lower()
+    if mode == "off":
+        return None
+    if mode != "on":
+        raise ValueError(f"Unknown SQL query cache mode: {mode}")
+    return QueryCache()
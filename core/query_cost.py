@@ -0,0 +1,293 @@
+from collections import OrderedDict
+from core.query_cache import SQL_TOKEN, normalize_sql, referenced_tables
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+SHOWPLAN_NAMESPACE = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+# Statements whose plan is estimated; others (DDL, EXEC, SET, ...) run unchecked
+GUARDED = {"select", "with", "insert", "update", "delete", "merge"}
+
+# Estimates kept, least recently used dropped first
+MAX_ESTIMATES = 512
+
+# Scans listed in a refusal
+MAX_REPORTED_SCANS = 3
+
+# Added to the note of results limited with TOP, which are incomplete
+LIMITED_MARKER = "(TOP added)"
+
+# Keywords that make a leading TOP change the meaning of a SELECT or fail
+NO_TOP = {"union", "intersect", "except", "offset", "top", "into"}
+
+
+class QueryRefused(Exception):
+    """Raised when the estimated plan of a query is over the cost guard limits"""
+
+
+class ShowplanReset(Exception):
+    """Raised when a connection could not leave showplan mode and was closed"""
+
+
+class PlanEstimate:
+    def __init__(self, rows: float, cost: float, scans: List[str], warnings: List[str]):
+        """Estimates of the optimizer for a batch, from its showplan XML
+
+        Args:
+            rows: Estimated rows of the largest statement
+            cost: Estimated subtree cost of all statements, in optimizer units
+            scans: Largest table and index scans, e.g. "Table Scan [dbo].[orders] (~5000000 rows)"
+            warnings: Plan warnings, e.g. "no join predicate"
+        """
+        self.rows = rows
+        self.cost = cost
+        self.scans = scans
+        self.warnings = warnings
+
+
+def parse_showplan(documents: List[str]) -> PlanEstimate:
+    """Extract estimated rows, cost, scans and warnings from showplan XML documents"""
+    rows, cost = 0.0, 0.0
+    scans: List[Tuple[float, str]] = []
+    warnings: List[str] = []
+    for document in documents:
+        root = ElementTree.fromstring(document)
+        for statement in root.iter(f"{SHOWPLAN_NAMESPACE}StmtSimple"):
+            rows = max(rows, float(statement.get("StatementEstRows", 0)))
+            cost += float(statement.get("StatementSubTreeCost", 0))
+        for operator in root.iter(f"{SHOWPLAN_NAMESPACE}RelOp"):
+            physical = operator.get("PhysicalOp", "")
+            if "Scan" in physical:
+                target = operator.find(f".//{SHOWPLAN_NAMESPACE}Object")
+                words = [physical]
+                if target is not None:
+                    words.append(
+                        ".".join(target.get(part) for part in ("Schema", "Table") if target.get(part))
+                    )
+                estimated = float(operator.get("EstimateRows", 0))
+                words.append(f"(~{estimated:.0f} rows)")
+                scans.append((estimated, " ".join(word for word in words if word)))
+            for warning in operator.findall(f"{SHOWPLAN_NAMESPACE}Warnings"):
+                if warning.get("NoJoinPredicate") == "true":
+                    warnings.append("no join predicate")
+                for child in warning:
+                    warnings.append(child.tag.replace(SHOWPLAN_NAMESPACE, ""))
+    scans.sort(key=lambda scan: scan[0], reverse=True)
+    return PlanEstimate(
+        rows=rows,
+        cost=cost,
+        scans=[description for _, description in scans[:MAX_REPORTED_SCANS]],
+        warnings=list(dict.fromkeys(warnings)),
+    )
+
+
+def add_top(sql: str, rows: int) -> Optional[str]:
+    """Limit a single SELECT to its first rows, None if it cannot be done safely"""
+    if referenced_tables(sql) & NO_TOP or ";" in normalize_sql(sql):
+        return None
+    words = []
+    for match in SQL_TOKEN.finditer(sql):
+        if match.lastgroup in ("comment", "space"):
+            continue
+        if match.lastgroup != "word":
+            break
+        word = match.group().lower()
+        if not words and word != "select":
+            return None
+        if words and word not in ("distinct", "all"):
+            break
+        words.append(word)
+        end = match.end()
+    if not words:
+        return None
+    return f"{sql[:end]} TOP ({rows}){sql[end:]}"
+
+
+class QueryCostGuard:
+    def __init__(
+        self,
+        action: str = "refuse",
+        max_cost: Optional[float] = None,
+        max_rows: Optional[float] = None,
+        top_rows: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        """Check the estimated plan of a query before running it
+
+        The plan is requested with SET SHOWPLAN_XML, which compiles the
+        statements without executing them. Estimates are cached per
+        normalized query.
+
+        Args:
+            action: "refuse" rejects queries over the limits; "top" first
+                limits a SELECT returning too many rows with TOP and only
+                rejects it if it is still too expensive
+            max_cost: Largest estimated cost, in optimizer units. Defaults to
+                SQL_MAX_QUERY_COST, or 100.
+            max_rows: Largest estimated row count of a SELECT. Defaults to
+                SQL_MAX_ESTIMATED_ROWS, or 1000000.
+            top_rows: Rows kept by the TOP added in "top" mode. Defaults to
+                SQL_COST_GUARD_TOP_ROWS, or 1000.
+            ttl_seconds: Seconds an estimate is reused. Defaults to
+                SQL_COST_GUARD_TTL, or 600.
+        """
+        if action not in ("refuse", "top"):
+            raise ValueError(f"Unknown SQL cost guard action: {action}")
+        if max_cost is None:
+            max_cost = float(os.environ.get("SQL_MAX_QUERY_COST", "100"))
+        if max_rows is None:
+            max_rows = float(os.environ.get("SQL_MAX_ESTIMATED_ROWS", "1000000"))
+        if top_rows is None:
+            top_rows = int(os.environ.get("SQL_COST_GUARD_TOP_ROWS", "1000"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("SQL_COST_GUARD_TTL", "600"))
+        self.action = action
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.top_rows = top_rows
+        self.ttl_seconds = ttl_seconds
+        self.estimates: "OrderedDict[str, Tuple[PlanEstimate, float]]" = OrderedDict()
+        self.stats = {"checked": 0, "cached": 0, "limited": 0, "refused": 0, "errors": 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def guarded(sql: str) -> bool:
+        """Whether the plan of a statement is checked"""
+        return normalize_sql(sql).split(" ", 1)[0] in GUARDED
+
+    @staticmethod
+    def _showplan(cursor, sql: str) -> List[str]:
+        cursor.execute("SET SHOWPLAN_XML ON")
+        try:
+            cursor.execute(sql)
+            documents = []
+            while True:
+                if cursor.description is not None:
+                    documents.extend(str(row[0]) for row in cursor.fetchall())
+                if not cursor.nextset():
+                    break
+            return documents
+        finally:
+            try:
+                cursor.execute("SET SHOWPLAN_XML OFF")
+            except Exception as e:
+                # Never return a connection still in showplan mode: closed,
+                # it fails the pool's check and is discarded
+                cursor.connection.close()
+                raise ShowplanReset(
+                    f"Could not check the query plan and the connection was reset ({e}); "
+                    "run the query again"
+                ) from e
+
+    def estimate(self, cursor, sql: str) -> PlanEstimate:
+        """Get the estimated plan of a query, from the cache when possible"""
+        key = normalize_sql(sql)
+        with self.lock:
+            cached = self.estimates.get(key)
+            if cached is not None and time.monotonic() < cached[1]:
+                self.estimates.move_to_end(key)
+                self.stats["cached"] += 1
+                return cached[0]
+        estimate = parse_showplan(self._showplan(cursor, sql))
+        with self.lock:
+            self.estimates[key] = (estimate, time.monotonic() + self.ttl_seconds)
+            self.estimates.move_to_end(key)
+            while len(self.estimates) > MAX_ESTIMATES:
+                self.estimates.popitem(last=False)
+        return estimate
+
+    def _over(self, estimate: PlanEstimate, check_rows: bool) -> List[str]:
+        reasons = []
+        if estimate.cost > self.max_cost:
+            reasons.append(f"estimated cost {estimate.cost:.1f} > {self.max_cost:g}")
+        if check_rows and estimate.rows > self.max_rows:
+            reasons.append(f"estimated rows {estimate.rows:.0f} > {self.max_rows:.0f}")
+        return reasons
+
+    def check(self, cursor, sql: str, check_rows: bool = True) -> Tuple[str, str]:
+        """Check a query before running it on cursor
+
+        Args:
+            cursor: Cursor of the connection the query runs on next
+            sql: Query to check
+            check_rows: Whether to limit the estimated rows of a SELECT, e.g.
+                not for exports
+
+        Returns:
+            The query to run, possibly limited with TOP, and a note for the
+            model about the change (empty if unchanged)
+
+        Raises:
+            QueryRefused: If the query is over the limits
+            ShowplanReset: If the connection was closed while estimating
+        """
+        if not self.guarded(sql):
+            return sql, ""
+        with self.lock:
+            self.stats["checked"] += 1
+        try:
+            estimate = self.estimate(cursor, sql)
+        except ShowplanReset:
+            # The connection is closed: the query cannot run on it
+            raise
+        except Exception as e:
+            # Syntax errors and the like are reported by the execution itself
+            logging.warning(f"Cost guard could not estimate query: {e}")
+            with self.lock:
+                self.stats["errors"] += 1
+            return sql, ""
+        is_select = normalize_sql(sql).split(" ", 1)[0] in ("select", "with")
+        reasons = self._over(estimate, check_rows and is_select)
+        if not reasons:
+            return sql, ""
+
+        limited = add_top(sql, self.top_rows) if self.action == "top" and check_rows else None
+        if limited is not None:
+            try:
+                limited_estimate = self.estimate(cursor, limited)
+            except ShowplanReset:
+                raise
+            except Exception as e:
+                logging.warning(f"Cost guard could not estimate limited query: {e}")
+                limited_estimate = estimate
+            if not self._over(limited_estimate, True):
+                with self.lock:
+                    self.stats["limited"] += 1
+                return limited, (
+                    f"Note: {', '.join(reasons)}; only the first {self.top_rows} rows "
+                    f"were read {LIMITED_MARKER}. Add filters or aggregate for complete results."
+                )
+            estimate = limited_estimate
+            reasons = self._over(estimate, True)
+
+        with self.lock:
+            self.stats["refused"] += 1
+        details = [*estimate.scans, *(f"warning: {warning}" for warning in estimate.warnings)]
+        raise QueryRefused(
+            f"Query refused by the cost guard: {', '.join(reasons)}"
+            + (f" (plan: {'; '.join(details)})" if details else "")
+            + ". Rewrite it with selective filters, complete join conditions, "
+            "aggregation or TOP, and try again."
+        )
+
+    def clear(self):
+        """Forget the cached estimates, e.g. after DDL"""
+        with self.lock:
+            self.estimates.clear()
+
+    def gauges(self) -> Dict[str, Any]:
+        """Get counts of checked, limited and refused queries"""
+        with self.lock:
+            return {**self.stats, "estimates": len(self.estimates)}
+
+
+def create_cost_guard() -> Optional[QueryCostGuard]:
+    """Create the guard selected by SQL_COST_GUARD (off, refuse or top)"""
+    mode = os.environ.get("SQL_COST_GUARD", "off").lower()
+    if mode == "off":
+        return None
+    return QueryCostGuard(action=mode)
@@ -0,0 +1,258 @@
+from concurrent.futures import ThreadPoolExecutor
+from core.connection_pool import ConnectionPool
+from core.tracing import span
+from typing import Any, Callable, Dict, Optional, Set
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+
+# Seconds between checks of the client-side deadline
+POLL_INTERVAL = 0.25
+
+
+def _ignore_result(future: asyncio.Future):
+    """Retrieve the outcome of a query nobody awaits anymore"""
+    if not future.cancelled():
+        future.exception()
+
+
+class RunningQuery:
+    def __init__(self, session_id: Optional[str]):
+        """A query submitted to the QueryExecutor
+
+        Args:
+            session_id: Chainlit session the query runs for
+        """
+        self.session_id = session_id
+        self.submitted = time.perf_counter()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cursor = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    @property
+    def queue_wait(self) -> float:
+        """Seconds spent waiting for a thread and a connection"""
+        return (self.started or time.perf_counter()) - self.submitted
+
+    @property
+    def execution_time(self) -> float:
+        """Seconds spent running on the server"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def attach(self, cursor):
+        """Start timing a query about to run on cursor, unless cancelled
+
+        Raises:
+            RuntimeError: If the query was cancelled before it started
+        """
+        with self.lock:
+            if self.cancelled:
+                raise RuntimeError("Query cancelled before it started")
+            self.cursor = cursor
+            if self.started is None:
+                self.started = time.perf_counter()
+
+    def detach(self):
+        """Stop timing; the cursor can no longer be cancelled through this query"""
+        with self.lock:
+            self.cursor = None
+            self.finished = time.perf_counter()
+
+    def cancel(self):
+        """Cancel the query on the server, or before it starts"""
+        with self.lock:
+            self.cancelled = True
+            cursor = self.cursor
+        if cursor is None:
+            return
+        try:
+            if hasattr(cursor, "cancel"):
+                cursor.cancel()
+            else:
+                # sqlite3 cursors have no cancel()
+                cursor.connection.interrupt()
+        except Exception as e:
+            logging.error(f"Error cancelling query: {e}")
+
+
+class QueryExecutor:
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None):
+        """Run blocking database queries on a dedicated thread pool
+
+        The calling event loop only awaits the result, so a slow query never
+        blocks it. Queries get a server-side timeout, are cancelled on the
+        server when the caller gives up (timeout or task cancellation) or the
+        session is stopped, and report their queue wait and execution time.
+
+        Args:
+            max_workers: Queries running at once. Defaults to
+                SQL_QUERY_WORKERS, or 8.
+            timeout: Seconds a query may run. Defaults to SQL_QUERY_TIMEOUT,
+                or 120; 0 disables the timeout.
+        """
+        if max_workers is None:
+            max_workers = int(os.environ.get("SQL_QUERY_WORKERS", "8"))
+        if timeout is None:
+            timeout = float(os.environ.get("SQL_QUERY_TIMEOUT", "120"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="sql-query"
+        )
+        self.timeout = timeout
+        self.running: Dict[Optional[str], Set[RunningQuery]] = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            "queries": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "queue_wait_seconds": 0.0,
+            "execution_seconds": 0.0,
+        }
+
+    @staticmethod
+    def set_timeout(conn, timeout: float):
+        """Set the server-side timeout of the cursors opened next on conn"""
+        if hasattr(conn, "timeout"):
+            # pyodbc applies it to the cursors created afterwards; 0 = none
+            conn.timeout = max(1, int(timeout)) if timeout else 0
+
+    def _execute(
+        self, pool: ConnectionPool, work: Callable[[Any], Any], timeout: float, query: RunningQuery
+    ):
+        with pool.connection() as conn:
+            self.set_timeout(conn, timeout)
+            cursor = conn.cursor()
+            try:
+                query.attach(cursor)
+                return work(cursor)
+            finally:
+                query.detach()
+                cursor.close()
+
+    async def run(
+        self,
+        pool: ConnectionPool,
+        work: Callable[[Any], Any],
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Run work(cursor) on a pooled connection in a database thread
+
+        Args:
+            pool: Pool to take the connection from
+            work: Runs the query with the cursor and returns its result
+            session_id: Session to cancel the query with in `cancel_session`
+            timeout: Seconds the query may run, SQL_QUERY_TIMEOUT by default
+
+        Raises:
+            TimeoutError: If the query was cancelled after timeout
+        """
+        if timeout is None:
+            timeout = self.timeout
+        return await self.submit(
+            functools.partial(self._execute, pool, work, timeout), session_id, timeout
+        )
+
+    async def submit(
+        self,
+        func: Callable[[RunningQuery], Any],
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Run func(query) in a database thread, with timing and cancellation
+
+        For queries managing their own connection and cursor: func calls
+        `query.attach(cursor)` before executing and `query.detach()` after.
+
+        Args:
+            func: Runs the query
+            session_id: Session to cancel the query with in `cancel_session`
+            timeout: Seconds the query may run, SQL_QUERY_TIMEOUT by default
+
+        Raises:
+            TimeoutError: If the query was cancelled after timeout
+        """
+        if timeout is None:
+            timeout = self.timeout
+        query = RunningQuery(session_id)
+        with self.lock:
+            self.running.setdefault(session_id, set()).add(query)
+        loop = asyncio.get_running_loop()
+        with span("sql", timeout=timeout) as current:
+            try:
+                future = loop.run_in_executor(self.executor, func, query)
+                # The client-side deadline starts when the query does, not
+                # while it waits for a thread or a connection
+                while True:
+                    done, _ = await asyncio.wait({future}, timeout=POLL_INTERVAL)
+                    if done:
+                        return future.result()
+                    if timeout and query.execution_time > timeout:
+                        with self.lock:
+                            self.stats["timeouts"] += 1
+                        query.cancel()
+                        future.add_done_callback(_ignore_result)
+                        raise TimeoutError(f"Query cancelled after {timeout:.0f}s")
+            except asyncio.CancelledError:
+                with self.lock:
+                    self.stats["cancelled"] += 1
+                query.cancel()
+                future.add_done_callback(_ignore_result)
+                raise
+            finally:
+                with self.lock:
+                    self.running[session_id].discard(query)
+                    if not self.running[session_id]:
+                        del self.running[session_id]
+                    self.stats["queries"] += 1
+                    self.stats["queue_wait_seconds"] += query.queue_wait
+                    self.stats["execution_seconds"] += query.execution_time
+                if current is not None:
+                    current.set(
+                        queue_wait_ms=round(query.queue_wait * 1000, 1),
+                        execution_ms=round(query.execution_time * 1000, 1),
+                        cancelled=query.cancelled,
+                    )
+                logging.info(
+                    f"SQL query: queued {query.queue_wait:.3f}s, "
+                    f"ran {query.execution_time:.3f}s"
+                    + (" (cancelled)" if query.cancelled else "")
+                )
+
+    def cancel_session(self, session_id: Optional[str]) -> int:
+        """Cancel the running and queued queries of a session
+
+        Returns:
+            Number of queries cancelled
+        """
+        with self.lock:
+            queries = list(self.running.get(session_id, ()))
+        for query in queries:
+            query.cancel()
+        return len(queries)
+
+    def gauges(self) -> Dict[str, Any]:
+        """Get running queries and totals over all finished ones"""
+        with self.lock:
+            return {
+                "running": sum(len(queries) for queries in self.running.values()),
+                **self.stats,
+            }
+
+    def shutdown(self, wait: bool = False):
+        """Cancel running queries and release the database threads"""
+        with self.lock:
+            queries = [query for queries in self.running.values() for query in queries]
+        for query in queries:
+            query.cancel()
+        self.executor.shutdown(wait=wait)
+
+
+# Shared by all SQL agents in the process
+query_executor = QueryExecutor()
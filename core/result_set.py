@@ -0,0 +1,276 @@
+from collections import OrderedDict, deque
+from core.connection_pool import ConnectionPool
+from typing import Any, Deque, List, Optional
+import csv
+import itertools
+import logging
+import os
+import threading
+import time
+
+
+def format_value(value: Any, max_chars: int) -> str:
+    """Render one cell compactly for a markdown table"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        text = "0x" + bytes(value[: max_chars // 2]).hex()
+    elif isinstance(value, float):
+        text = f"{value:.6g}"
+    else:
+        text = str(value)
+    text = text.replace("\\", "\\\\").replace("|", "\\|").replace("\r", "").replace("\n", " ")
+    if len(text) > max_chars:
+        text = text[:max_chars] + "…"
+    return text
+
+
+def markdown_row(values: List[str]) -> str:
+    return "| " + " | ".join(values) + " |"
+
+
+class ResultSet:
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        conn,
+        cursor,
+        batch_size: Optional[int] = None,
+        max_cell_chars: Optional[int] = None,
+    ):
+        """Rows of an executed query, fetched in batches as they are read
+
+        Holds its pooled connection until the rows are exhausted or it is
+        closed. Not thread-safe: one page is read at a time.
+
+        Args:
+            pool: Pool the connection is returned to
+            conn: Connection the query ran on
+            cursor: Cursor with a result set
+            batch_size: Rows per fetchmany. Defaults to SQL_FETCH_BATCH, or 500.
+            max_cell_chars: Longer cell values are truncated. Defaults to
+                SQL_RESULT_MAX_CELL_CHARS, or 200.
+        """
+        if batch_size is None:
+            batch_size = int(os.environ.get("SQL_FETCH_BATCH", "500"))
+        if max_cell_chars is None:
+            max_cell_chars = int(os.environ.get("SQL_RESULT_MAX_CELL_CHARS", "200"))
+        self.pool = pool
+        self.conn = conn
+        self.cursor = cursor
+        self.batch_size = max(1, batch_size)
+        self.max_cell_chars = max_cell_chars
+        self.columns = [column[0] for column in cursor.description]
+        # Rows fetched from the driver but not returned yet
+        self.pending: Deque[tuple] = deque()
+        self.rows_read = 0
+        self.exhausted = False
+        self.closed = False
+        self.last_used = time.monotonic()
+
+    @property
+    def total_rows(self) -> Optional[int]:
+        """Row count, when the driver reports it or all rows were read"""
+        if self.exhausted:
+            return self.rows_read + len(self.pending)
+        rowcount = getattr(self.cursor, "rowcount", -1)
+        return rowcount if rowcount is not None and rowcount >= 0 else None
+
+    def _fill(self) -> bool:
+        """Fetch the next batch; False once there are no more rows"""
+        if self.exhausted:
+            return False
+        rows = self.cursor.fetchmany(self.batch_size)
+        if not rows:
+            self.exhausted = True
+            return False
+        self.pending.extend(rows)
+        if len(rows) < self.batch_size:
+            self.exhausted = True
+        return True
+
+    @property
+    def done(self) -> bool:
+        return not self.pending and self.exhausted
+
+    def rows(self, max_rows: int, max_bytes: int) -> List[List[str]]:
+        """Read the next rows within a row and size budget (at least one row)"""
+        self.last_used = time.monotonic()
+        page: List[List[str]] = []
+        size = 0
+        while len(page) < max_rows:
+            if not self.pending and not self._fill():
+                break
+            cells = [format_value(value, self.max_cell_chars) for value in self.pending[0]]
+            row_size = sum(len(cell) + 3 for cell in cells)
+            if page and size + row_size > max_bytes:
+                break
+            self.pending.popleft()
+            self.rows_read += 1
+            page.append(cells)
+            size += row_size
+        if not self.pending:
+            # Learn whether this was the last page
+            self._fill()
+        return page
+
+    def page(self, max_rows: int, max_bytes: int) -> str:
+        """Read the next rows as a markdown table"""
+        first = self.rows_read + 1
+        page = self.rows(max_rows, max_bytes)
+        lines = [
+            markdown_row(self.columns),
+            markdown_row(["---"] * len(self.columns)),
+            *(markdown_row(cells) for cells in page),
+        ]
+        total = self.total_rows
+        if not page:
+            lines.append("(no rows)")
+        elif self.done:
+            lines.append(f"Rows {first}-{self.rows_read} of {total}")
+        else:
+            of = f" of {total}" if total is not None else ", more available"
+            lines.append(f"Rows {first}-{self.rows_read}{of}")
+        return "\n".join(lines)
+
+    def export(self, path: str) -> int:
+        """Write the remaining rows to a CSV or Parquet file
+
+        Returns:
+            Number of rows written
+
+        Raises:
+            ImportError: For a .parquet path without pyarrow installed
+        """
+        if path.lower().endswith(".parquet"):
+            return self._export_parquet(path)
+        written = 0
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(self.columns)
+            for batch in self._batches():
+                writer.writerows(batch)
+                written += len(batch)
+        return written
+
+    def _export_parquet(self, path: str) -> int:
+        import pyarrow
+        import pyarrow.parquet
+
+        written = 0
+        writer = None
+        try:
+            for batch in self._batches():
+                table = pyarrow.Table.from_pylist(
+                    [dict(zip(self.columns, row)) for row in batch]
+                )
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                written += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+
+    def _batches(self):
+        """Yield the remaining rows batch by batch"""
+        while self.pending or self._fill():
+            batch = list(self.pending)
+            self.pending.clear()
+            self.rows_read += len(batch)
+            yield [tuple(row) for row in batch]
+
+    def close(self, failed: bool = False):
+        """Close the cursor and return the connection to the pool
+
+        Args:
+            failed: Reading failed: the connection is checked before reuse
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.cursor.close()
+        except Exception as e:
+            logging.error(f"Error closing result set: {e}")
+            failed = True
+        self.pool.release(self.conn, failed=failed)
+
+
+class ResultSetRegistry:
+    def __init__(self, max_open: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        """Result sets kept open between tool calls, under continuation handles
+
+        Each open result set holds a pooled connection, so their number is
+        capped (the least recently used is closed first) and idle ones expire.
+
+        Args:
+            max_open: Result sets kept open. Defaults to SQL_RESULT_MAX_OPEN, or 4.
+            ttl_seconds: Idle time before a result set is closed. Defaults to
+                SQL_RESULT_TTL, or 300.
+        """
+        if max_open is None:
+            max_open = int(os.environ.get("SQL_RESULT_MAX_OPEN", "4"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("SQL_RESULT_TTL", "300"))
+        self.max_open = max(0, max_open)
+        self.ttl_seconds = ttl_seconds
+        self.results: "OrderedDict[str, ResultSet]" = OrderedDict()
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add(self, result: ResultSet) -> Optional[str]:
+        """Keep a result set open and get its handle, None if none can be kept"""
+        self.sweep()
+        if self.max_open == 0:
+            result.close()
+            return None
+        handle = f"result_{next(self.counter)}"
+        with self.lock:
+            self.results[handle] = result
+            evicted = []
+            while len(self.results) > self.max_open:
+                evicted.append(self.results.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return handle
+
+    def take(self, handle: str) -> Optional[ResultSet]:
+        """Remove a result set from the registry to read it
+
+        Put it back with `put` if rows are left, so that two calls never read
+        the same result set at once.
+        """
+        self.sweep()
+        with self.lock:
+            return self.results.pop(handle, None)
+
+    def put(self, handle: str, result: ResultSet):
+        """Return a result set after reading it, closing it if exhausted"""
+        if result.done:
+            result.close()
+            return
+        with self.lock:
+            self.results[handle] = result
+
+    def sweep(self):
+        """Close result sets idle for longer than the TTL"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [
+                handle
+                for handle, result in self.results.items()
+                if now - result.last_used > self.ttl_seconds
+            ]
+            closing = [self.results.pop(handle) for handle in expired]
+        for result in closing:
+            result.close()
+
+    def close(self):
+        """Close all open result sets"""
+        with self.lock:
+            closing = list(self.results.values())
+            self.results.clear()
+        for result in closing:
+            result.close()
@@ -0,0 +1,279 @@
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+# Snapshot format; older files are ignored and rebuilt
+CATALOG_VERSION = 1
+
+# Object ids per IN (...) list of an incremental refresh; SQL Server allows
+# 2100 parameters per statement
+MAX_IDS_PER_QUERY = 1000
+
+TABLES_QUERY = """
+    SELECT t.object_id, s.name, t.name,
+           CONVERT(varchar(30), t.modify_date, 126)
+    FROM sys.tables t
+    JOIN sys.schemas s ON t.schema_id = s.schema_id
+"""
+
+COLUMNS_QUERY = """
+    SELECT c.object_id, c.name, ty.name, c.is_nullable, c.is_identity
+    FROM sys.columns c
+    JOIN sys.tables t ON c.object_id = t.object_id
+    JOIN sys.types ty ON c.user_type_id = ty.user_type_id
+    {where}
+    ORDER BY c.object_id, c.column_id
+"""
+
+PRIMARY_KEYS_QUERY = """
+    SELECT ic.object_id, c.name
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+    JOIN sys.columns c ON ic.object_id = c.object_id AND ic.column_id = c.column_id
+    WHERE i.is_primary_key = 1 {and_where}
+    ORDER BY ic.object_id, ic.key_ordinal
+"""
+
+FOREIGN_KEYS_QUERY = """
+    SELECT fk.parent_object_id, pc.name, rs.name, ro.name, rc.name
+    FROM sys.foreign_keys fk
+    JOIN sys.foreign_key_columns fkc ON fk.object_id = fkc.constraint_object_id
+    JOIN sys.columns pc ON fkc.parent_column_id = pc.column_id AND fkc.parent_object_id = pc.object_id
+    JOIN sys.columns rc ON fkc.referenced_column_id = rc.column_id AND fkc.referenced_object_id = rc.object_id
+    JOIN sys.objects ro ON fk.referenced_object_id = ro.object_id
+    JOIN sys.schemas rs ON ro.schema_id = rs.schema_id
+    {where}
+    ORDER BY fk.parent_object_id, fkc.constraint_column_id
+"""
+
+
+class SchemaCatalog:
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[float] = None):
+        """In-memory index of every table, column, key and relationship
+
+        The whole schema is introspected with four set-based catalog queries
+        instead of several queries per table. The snapshot is saved to a
+        local file and reloaded at startup; afterwards only the tables whose
+        sys.tables.modify_date changed (or that were created or dropped) are
+        introspected again.
+
+        Args:
+            path: JSON snapshot file, not persisted when None
+            ttl_seconds: Seconds before the next check for schema changes.
+                Defaults to SQL_CATALOG_TTL, or 300.
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("SQL_CATALOG_TTL", "300"))
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        # Tables by object id
+        self.tables: Dict[int, Dict[str, Any]] = {}
+        # Object ids by lowercase "schema.name" and by lowercase name
+        self.by_qualified_name: Dict[str, int] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        self.checked_at: Optional[float] = None
+        self.lock = threading.RLock()
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                snapshot = json.load(file)
+            if snapshot.get("version") != CATALOG_VERSION:
+                return
+            self.tables = {int(object_id): table for object_id, table in snapshot["tables"].items()}
+            self._reindex()
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error loading schema catalog {self.path}: {e}")
+            self.tables = {}
+
+    def _save_snapshot(self):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump({"version": CATALOG_VERSION, "tables": self.tables}, file)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            logging.error(f"Error saving schema catalog {self.path}: {e}")
+
+    def _reindex(self):
+        by_qualified_name: Dict[str, int] = {}
+        by_name: Dict[str, List[int]] = {}
+        for object_id, table in self.tables.items():
+            by_qualified_name[f"{table['schema']}.{table['name']}".lower()] = object_id
+            by_name.setdefault(table["name"].lower(), []).append(object_id)
+        self.by_qualified_name = by_qualified_name
+        self.by_name = by_name
+
+    @property
+    def due(self) -> bool:
+        """Whether the schema should be checked for changes"""
+        return self.checked_at is None or time.monotonic() - self.checked_at > self.ttl_seconds
+
+    def mark_stale(self):
+        """Check for schema changes on next use, e.g. after DDL"""
+        self.checked_at = None
+
+    def refresh_if_due(self, cursor) -> bool:
+        """Refresh the catalog when due
+
+        Returns:
+            Whether any table was introspected again
+        """
+        with self.lock:
+            # Another thread may have refreshed while this one waited
+            if not self.due:
+                return False
+            return self.refresh(cursor)
+
+    def refresh(self, cursor) -> bool:
+        """Introspect the tables created or modified since the last refresh
+
+        Returns:
+            Whether any table was introspected again
+        """
+        with self.lock:
+            # Lookups keep reading the previous tables until the swap below
+            tables = dict(self.tables)
+            current = {
+                int(row[0]): {"schema": row[1], "name": row[2], "modify_date": row[3]}
+                for row in cursor.execute(TABLES_QUERY).fetchall()
+            }
+            changed = [
+                object_id
+                for object_id, table in current.items()
+                if tables.get(object_id, {}).get("modify_date") != table["modify_date"]
+            ]
+            dropped = [object_id for object_id in tables if object_id not in current]
+            for object_id in dropped:
+                del tables[object_id]
+            renamed = [
+                object_id
+                for object_id, table in current.items()
+                if object_id in tables
+                and (tables[object_id]["schema"], tables[object_id]["name"])
+                != (table["schema"], table["name"])
+            ]
+            for object_id in renamed:
+                tables[object_id] = {**tables[object_id], **current[object_id]}
+            if changed:
+                if len(changed) == len(current):
+                    # First load: no need to list every id
+                    self._introspect(cursor, tables, current, None)
+                else:
+                    for start in range(0, len(changed), MAX_IDS_PER_QUERY):
+                        self._introspect(
+                            cursor, tables, current, changed[start : start + MAX_IDS_PER_QUERY]
+                        )
+            if changed or dropped or renamed:
+                self.tables = tables
+                self._reindex()
+                self._save_snapshot()
+                logging.info(
+                    f"Schema catalog: {len(changed)} tables introspected, "
+                    f"{len(dropped)} dropped, {len(self.tables)} total"
+                )
+            self.checked_at = time.monotonic()
+            return bool(changed or dropped or renamed)
+
+    @staticmethod
+    def _execute(cursor, query: str, params: List[int]) -> List[Any]:
+        return (cursor.execute(query, params) if params else cursor.execute(query)).fetchall()
+
+    def _introspect(
+        self,
+        cursor,
+        tables: Dict[int, Dict[str, Any]],
+        current: Dict[int, Dict[str, Any]],
+        object_ids: Optional[List[int]],
+    ):
+        """Load columns and keys of some tables into tables, all when object_ids is None"""
+        if object_ids is None:
+            ids = list(current)
+            params: List[int] = []
+            where, and_where, fk_where = "", "", ""
+        else:
+            ids = object_ids
+            params = object_ids
+            placeholders = ", ".join("?" for _ in object_ids)
+            where = f"WHERE c.object_id IN ({placeholders})"
+            and_where = f"AND ic.object_id IN ({placeholders})"
+            fk_where = f"WHERE fk.parent_object_id IN ({placeholders})"
+
+        for object_id in ids:
+            tables[object_id] = {
+                **current[object_id],
+                "columns": [],
+                "primary_keys": [],
+                "foreign_keys": [],
+            }
+        for row in self._execute(cursor, COLUMNS_QUERY.format(where=where), params):
+            if int(row[0]) in tables:
+                tables[int(row[0])]["columns"].append(
+                    {
+                        "name": row[1],
+                        "type": row[2],
+                        "nullable": bool(row[3]),
+                        "is_identity": bool(row[4]),
+                    }
+                )
+        for row in self._execute(cursor, PRIMARY_KEYS_QUERY.format(and_where=and_where), params):
+            if int(row[0]) in tables:
+                tables[int(row[0])]["primary_keys"].append(row[1])
+        for row in self._execute(cursor, FOREIGN_KEYS_QUERY.format(where=fk_where), params):
+            if int(row[0]) in tables:
+                tables[int(row[0])]["foreign_keys"].append(
+                    {
+                        "column": row[1],
+                        "references": {
+                            "schema": row[2],
+                            "table": row[3],
+                            "column": row[4],
+                        },
+                    }
+                )
+
+    def find(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """Look up a table by "schema.name" or by name, preferring dbo"""
+        key = table_name.strip().strip("[]").replace("].[", ".").lower()
+        object_id = self.by_qualified_name.get(key)
+        if object_id is None:
+            object_id = self.by_qualified_name.get(f"dbo.{key}")
+        if object_id is None and len(self.by_name.get(key, [])) == 1:
+            object_id = self.by_name[key][0]
+        return self.tables.get(object_id) if object_id is not None else None
+
+    def table_names(self) -> List[str]:
+        """Names of all tables"""
+        return sorted(table["name"] for table in self.tables.values())
+
+    def schema(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """Columns, primary key and foreign keys of a table"""
+        table = self.find(table_name)
+        if table is None:
+            return None
+        return {
+            "table_name": table["name"],
+            "columns": table["columns"],
+            "primary_keys": table["primary_keys"],
+            "foreign_keys": [
+                {
+                    "column": fk["column"],
+                    "references": {
+                        "table": fk["references"]["table"],
+                        "column": fk["references"]["column"],
+                    },
+                }
+                for fk in table["foreign_keys"]
+            ],
+        }
@@ -0,0 +1,192 @@
+from collections import Counter
+from core.schema_catalog import SchemaCatalog
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import re
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Weight of a term in each part of a table's document
+TABLE_NAME_WEIGHT = 3.0
+COLUMN_NAME_WEIGHT = 1.0
+NEIGHBOUR_WEIGHT = 0.5
+
+# Query terms absent from the schema match terms this similar, by trigrams
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+WORD_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Question words that never identify a table
+STOPWORDS = {
+    "a", "all", "an", "and", "are", "by", "did", "do", "doe", "each", "for",
+    "from", "get", "ha", "have", "how", "in", "is", "list", "many", "much",
+    "of", "on", "or", "per", "show", "that", "the", "their", "to", "was",
+    "what", "when", "where", "which", "who", "with",
+}
+
+
+def stem(word: str) -> str:
+    """Reduce plurals to a common form, e.g. "categories" -> "category" """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Split identifiers and questions into words
+
+    snake_case, camelCase and PascalCase identifiers are split into their
+    parts, e.g. "OrderLineItems" -> ["order", "line", "item"].
+    """
+    return [stem(word.lower()) for word in WORD_PATTERN.findall(text)]
+
+
+def trigrams(term: str) -> set:
+    padded = f"  {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def compact_schema(table: Dict[str, Any]) -> str:
+    """One-line schema, e.g. "dbo.orders(id int PK, customer_id int -> customers.id)" """
+    foreign_keys = {fk["column"]: fk["references"] for fk in table["foreign_keys"]}
+    columns = []
+    for column in table["columns"]:
+        text = f"{column['name']} {column['type']}"
+        if column["name"] in table["primary_keys"]:
+            text += " PK"
+        if column["name"] in foreign_keys:
+            ref = foreign_keys[column["name"]]
+            text += f" -> {ref['table']}.{ref['column']}"
+        if column["nullable"]:
+            text += " NULL"
+        columns.append(text)
+    return f"{table['schema']}.{table['name']}({', '.join(columns)})"
+
+
+class SearchIndex:
+    def __init__(
+        self,
+        tables: Dict[int, Dict[str, Any]],
+        postings: Dict[str, Dict[int, float]],
+        lengths: Dict[int, float],
+        average_length: float,
+        vocabulary_trigrams: Dict[str, set],
+    ):
+        """Inverted index of the catalog's tables at one point in time
+
+        Args:
+            tables: Catalog tables the index was built from
+            postings: Weighted term frequency per table, by term
+            lengths: Weighted length of each table's document
+            average_length: Mean document length
+            vocabulary_trigrams: Trigrams of every indexed term
+        """
+        self.tables = tables
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = average_length
+        self.vocabulary_trigrams = vocabulary_trigrams
+
+
+class SchemaSearch:
+    def __init__(self, catalog: SchemaCatalog):
+        """BM25 search over the tables of a schema catalog
+
+        Each table is a document made of its name, its column names and the
+        names of the tables it is linked to by foreign keys, with decreasing
+        weights. The index is rebuilt whenever the catalog changes.
+
+        Args:
+            catalog: Catalog to search
+        """
+        self.catalog = catalog
+        self.index: Optional[SearchIndex] = None
+
+    def _build(self):
+        tables = self.catalog.tables
+        qualified = {
+            f"{table['schema']}.{table['name']}".lower(): object_id
+            for object_id, table in tables.items()
+        }
+        # Names of the tables linked to each table, in both directions
+        neighbours: Dict[int, List[str]] = {object_id: [] for object_id in tables}
+        for object_id, table in tables.items():
+            for fk in table["foreign_keys"]:
+                ref = fk["references"]
+                target = qualified.get(f"{ref['schema']}.{ref['table']}".lower())
+                if target is not None and target != object_id:
+                    neighbours[object_id].append(ref["table"])
+                    neighbours[target].append(table["name"])
+
+        documents: Dict[int, Counter] = {}
+        for object_id, table in tables.items():
+            terms: Counter = Counter()
+            for term in tokenize(table["name"]):
+                terms[term] += TABLE_NAME_WEIGHT
+            for column in table["columns"]:
+                for term in tokenize(column["name"]):
+                    terms[term] += COLUMN_NAME_WEIGHT
+            for name in set(neighbours[object_id]):
+                for term in tokenize(name):
+                    terms[term] += NEIGHBOUR_WEIGHT
+            documents[object_id] = terms
+        postings: Dict[str, Dict[int, float]] = {}
+        for object_id, terms in documents.items():
+            for term, frequency in terms.items():
+                postings.setdefault(term, {})[object_id] = frequency
+        lengths = {object_id: sum(terms.values()) for object_id, terms in documents.items()}
+
+        # Replaced in one go: searches running meanwhile use the old index
+        self.index = SearchIndex(
+            tables=tables,
+            postings=postings,
+            lengths=lengths,
+            average_length=sum(lengths.values()) / len(lengths) if lengths else 0.0,
+            vocabulary_trigrams={term: trigrams(term) for term in postings},
+        )
+
+    @staticmethod
+    def _expand(index: "SearchIndex", term: str) -> List[Tuple[str, float]]:
+        """Schema terms matching a query term, with the match quality"""
+        if term in index.postings:
+            return [(term, 1.0)]
+        if len(term) < 4:
+            return []
+        # Typos and spelling variants, e.g. "custmer" -> "customer"
+        query_trigrams = trigrams(term)
+        matches = []
+        for candidate, candidate_trigrams in index.vocabulary_trigrams.items():
+            similarity = len(query_trigrams & candidate_trigrams) / len(
+                query_trigrams | candidate_trigrams
+            )
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                matches.append((candidate, similarity))
+        return matches
+
+    def search(self, question: str, limit: int = 10) -> List[Tuple[Dict[str, Any], float]]:
+        """Rank the tables most relevant to a question
+
+        Returns:
+            Up to limit (table, score) pairs, best first, with a score above 0
+        """
+        if self.index is None or self.index.tables is not self.catalog.tables:
+            self._build()
+        index = self.index
+        count = len(index.lengths)
+        scores: Counter = Counter()
+        for term in set(tokenize(question)) - STOPWORDS:
+            for match, quality in self._expand(index, term):
+                postings = index.postings[match]
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for object_id, tf in postings.items():
+                    norm = K1 * (1 - B + B * index.lengths[object_id] / index.average_length)
+                    scores[object_id] += quality * idf * tf * (K1 + 1) / (tf + norm)
+        return [
+            (index.tables[object_id], score) for object_id, score in scores.most_common(limit)
+        ]
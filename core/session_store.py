@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+
+class SessionStore:
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+        is_busy: Optional[Callable[[str], bool]] = None,
+        sweep_interval: Optional[float] = None,
+    ):
+        """Hold per-session state with idle expiry and a global memory cap
+
+        Each session keeps its conversation history, agents and resources
+        (objects with a `close()` method such as WebDriver or process
+        owners). Sessions idle for longer than the TTL are evicted, and the
+        least recently used sessions are evicted while the approximate bytes
+        held exceed the cap. Resources are closed on eviction. Besides
+        on every write, sessions are swept periodically on a background
+        thread, so idle ones are freed even when traffic stops.
+
+        Args:
+            ttl_seconds: Idle time before a session is evicted. Defaults to
+                SESSION_TTL_SECONDS, or one hour.
+            max_bytes: Approximate memory cap across all sessions. Defaults
+                to SESSION_MAX_BYTES, or 256 MB.
+            on_evict: Called with the session id after a session is evicted
+            is_busy: Called with a session id; sessions for which it returns
+                True (e.g. with a turn running) are never evicted
+            sweep_interval: Seconds between background sweeps. Defaults to
+                SESSION_SWEEP_SECONDS, or 60; 0 disables them.
+        """
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("SESSION_MAX_BYTES", str(256 * 1024**2)))
+        if sweep_interval is None:
+            sweep_interval = float(os.environ.get("SESSION_SWEEP_SECONDS", "60"))
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.is_busy = is_busy
+        self.sweep_interval = sweep_interval
+        self.sweeper: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.bytes_held = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _message_bytes(message: Dict[str, Any]) -> int:
+        """Approximate the memory held by one history message"""
+        size = 64 + len(str(message.get("content") or ""))
+        if message.get("tool_calls"):
+            size += len(json.dumps(message["tool_calls"], default=str))
+        return size
+
+    def _history_bytes(self, history: List[Dict[str, Any]]) -> int:
+        """Approximate the memory held by a history"""
+        return sum(self._message_bytes(message) for message in history)
+
+    def create(
+        self,
+        session_id: str,
+        agents: Optional[Dict[str, Any]] = None,
+        resources: Optional[List[Any]] = None,
+    ) -> Dict[str, Any]:
+        """Create (or replace) a session
+
+        Args:
+            session_id: Session to create
+            agents: Agents used by the session
+            resources: Objects closed when the session is evicted
+        """
+        self.remove(session_id)
+        session = {
+            "history": [],
+            "agents": agents or {},
+            "resources": resources or [],
+            "bytes": 0,
+            "last_access": time.monotonic(),
+        }
+        with self.lock:
+            self.sessions[session_id] = session
+            if self.sweep_interval > 0 and self.sweeper is None:
+                self.sweeper = threading.Thread(
+                    target=self._sweep_periodically, name="session-sweeper", daemon=True
+                )
+                self.sweeper.start()
+        self.sweep()
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session and mark it as recently used"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session["last_access"] = time.monotonic()
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def set_history(self, session_id: str, history: List[Dict[str, Any]]):
+        """Replace a session's history and update its size"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return
+            size = self._history_bytes(history)
+            self.bytes_held += size - session["bytes"]
+            session["history"] = history
+            session["bytes"] = size
+            session["last_access"] = time.monotonic()
+        self.sweep()
+
+    def remove(self, session_id: str) -> bool:
+        """Remove a session and close its resources
+
+        Returns:
+            Whether the session was there
+        """
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self.bytes_held -= session["bytes"]
+        for resource in session["resources"]:
+            try:
+                resource.close()
+            except Exception as e:
+                logging.error(f"Error closing resource of session {session_id}: {e}")
+        return True
+
+    def _sweep_periodically(self):
+        while not self.stopped.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error(f"Error sweeping sessions: {e}")
+
+    def _evictable(self, session_id: str) -> bool:
+        return self.is_busy is None or not self.is_busy(session_id)
+
+    def sweep(self):
+        """Evict idle sessions, then least recently used ones over the cap
+
+        Sessions that are busy are skipped.
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = [
+                session_id
+                for session_id, session in self.sessions.items()
+                if now - session["last_access"] > self.ttl_seconds
+                and self._evictable(session_id)
+            ]
+            over_cap = []
+            bytes_left = self.bytes_held - sum(
+                self.sessions[session_id]["bytes"] for session_id in expired
+            )
+            # Never evict the most recently used session for the cap
+            for session_id in list(self.sessions)[:-1]:
+                if bytes_left <= self.max_bytes:
+                    break
+                if session_id not in expired and self._evictable(session_id):
+                    over_cap.append(session_id)
+                    bytes_left -= self.sessions[session_id]["bytes"]
+
+        for session_id in expired + over_cap:
+            if not self.remove(session_id):
+                # Removed meanwhile, e.g. by a concurrent sweep
+                continue
+            logging.info(f"Evicted session {session_id}")
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(session_id)
+
+    def gauges(self) -> Dict[str, int]:
+        """Get gauges for live sessions and approximate bytes held"""
+        with self.lock:
+            return {
+                "live_sessions": len(self.sessions),
+                "bytes_held": self.bytes_held,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        """Remove all sessions and close their resources"""
+        self.stopped.set()
+        for session_id in list(self.sessions):
+            self.remove(session_id)
@@ -0,0 +1,136 @@
+from core.process_reactor import ManagedProcess, process_reactor
+from core.process_resources import resource_monitor
+from typing import List, Optional, Tuple
+import os
+import re
+import shutil
+import signal
+import subprocess
+import uuid
+
+
+class ShellResult:
+    def __init__(self, lines: List[str], exit_code: Optional[int], cwd: Optional[str], missed: int):
+        """Output and status of one command run in a ShellSession
+
+        Args:
+            lines: Output lines (stdout and stderr)
+            exit_code: Exit status, None if the command did not finish
+            cwd: Shell's working directory after the command
+            missed: Output lines dropped from the buffer before being read
+        """
+        self.lines = lines
+        self.exit_code = exit_code
+        self.cwd = cwd
+        self.missed = missed
+
+
+class ShellSession:
+    def __init__(self, cwd: Optional[str] = None, shell: Optional[str] = None):
+        """A long-lived shell running commands one after another
+
+        The working directory, exported variables and activated virtualenvs
+        carry over between commands, and the shell starts only once. Every
+        command is followed by a unique marker line carrying its exit code
+        and the shell's working directory, which separates the outputs of
+        consecutive commands. Output is captured by the process reactor.
+
+        Args:
+            cwd: Initial working directory
+            shell: Shell executable. Defaults to CLI_SHELL, then bash, then sh.
+        """
+        self.shell = shell or os.environ.get("CLI_SHELL") or shutil.which("bash") or "/bin/sh"
+        self.cwd = cwd
+        self.marker = f"__CLI_DONE_{uuid.uuid4().hex}__"
+        self.marker_regex = re.compile(rf"^(.*){self.marker} (-?\d+) (.*)$")
+        self.process: Optional[ManagedProcess] = None
+        self.start()
+
+    def start(self):
+        """Start (or restart) the shell process"""
+        with resource_monitor.spawn_limits() as preexec_fn:
+            popen = subprocess.Popen(
+                [self.shell],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=self.cwd,
+                # Own process group, so close() can stop everything it started
+                start_new_session=True,
+                preexec_fn=preexec_fn,
+            )
+        # Survive interrupted commands: a trapped SIGINT does not end the shell,
+        # while the commands it runs keep the default handling
+        popen.stdin.write(b"trap ':' INT\n")
+        popen.stdin.flush()
+        self.process = process_reactor.attach(ManagedProcess("shell", self.shell, popen))
+        resource_monitor.watch(self.process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.popen.poll() is None
+
+    def submit(self, command: str) -> int:
+        """Send a command to the shell
+
+        Returns:
+            Cursor of the command's first output line, for `wait_result`
+        """
+        with self.process.changed:
+            cursor = self.process.output.next_seq
+        # Commands read from /dev/null so they cannot swallow the next ones
+        framed = (
+            f"{{ {command}\n}} </dev/null\n"
+            f"printf '%s %d %s\\n' '{self.marker}' \"$?\" \"$PWD\"\n"
+        )
+        self.process.popen.stdin.write(framed.encode("utf-8"))
+        self.process.popen.stdin.flush()
+        return cursor
+
+    def wait_result(self, cursor: int, timeout: float) -> Optional[ShellResult]:
+        """Wait for the command submitted at cursor to finish
+
+        Returns:
+            The command's result, or None if it is still running after
+            timeout. If the shell died, the result has no exit code.
+        """
+        match = self.process.wait_for(self.marker_regex, cursor, timeout)
+        if match is None and self.process.running:
+            return None
+        lines, missed = self.output_since(cursor, match[0] if match else None)
+        if match is None:
+            return ShellResult(lines, None, None, missed)
+
+        groups = self.marker_regex.match(match[1]).groups()
+        if groups[0]:
+            # Last output line had no trailing newline
+            lines.append(groups[0])
+        self.cwd = groups[2]
+        return ShellResult(lines, int(groups[1]), groups[2], missed)
+
+    def output_since(self, cursor: int, end: Optional[int] = None) -> Tuple[List[str], int]:
+        """Get the output lines from cursor up to (excluding) end"""
+        with self.process.changed:
+            lines, missed = self.process.output.since(cursor)
+        return [line for seq, line in lines if end is None or seq < end], missed
+
+    def interrupt(self):
+        """Send SIGINT to the commands running in the shell, not the shell"""
+        pid = self.process.popen.pid
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as file:
+                children = [int(child) for child in file.read().split()]
+        except OSError:
+            children = []
+        for child in children:
+            try:
+                os.kill(child, signal.SIGINT)
+            except OSError:
+                pass
+
+    def close(self):
+        """Stop the shell and everything it started"""
+        if self.process is None:
+            return
+        self.process.stop()
+        self.process.popen.stdin.close()
@@ -0,0 +1,269 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Payloads larger than this are zlib-compressed before being stored
+COMPRESS_THRESHOLD = 512
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Serialize a message compactly, dropping empty fields"""
+    compact = {key: value for key, value in message.items() if value is not None}
+    data = json.dumps(compact, separators=(",", ":"), default=str).encode("utf-8")
+    if len(data) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+
+def decode_message(data: bytes) -> Dict[str, Any]:
+    """Deserialize a message written by encode_message"""
+    data = bytes(data)
+    if data[:1] == b"z":
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data[1:])
+
+
+class StateBackend(ABC):
+    """Storage for conversation history and the current agent of each session
+
+    Every write bumps the session's version so a worker holding a local
+    copy of the session can tell when another worker has changed it.
+    """
+
+    @abstractmethod
+    def get_version(self, session_id: str) -> int:
+        """Get the session's version (0 if the session is unknown)"""
+
+    @abstractmethod
+    def load_history(self, session_id: str) -> List[Dict[str, Any]]:
+        """Load the full conversation history of a session"""
+
+    @abstractmethod
+    def append_history(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Append messages to a session's history and return the new version"""
+
+    @abstractmethod
+    def replace_history(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Rewrite a session's history (e.g. after compaction)"""
+
+    @abstractmethod
+    def get_current_agent(self, session_id: str) -> Optional[str]:
+        """Get the key of the agent currently handling the session"""
+
+    @abstractmethod
+    def set_current_agent(self, session_id: str, agent_key: str) -> int:
+        """Set the key of the agent currently handling the session"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Delete all state of a session"""
+
+    def release(self, session_id: str):
+        """Drop any process-local copy of a session evicted from memory"""
+
+    def close(self):
+        """Release backend resources"""
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend, only suitable for a single worker"""
+
+    def __init__(self):
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def _session(self, session_id: str) -> Dict[str, Any]:
+        if session_id not in self.sessions:
+            self.sessions[session_id] = {"history": [], "agent": None, "version": 0}
+        return self.sessions[session_id]
+
+    def get_version(self, session_id: str) -> int:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return session["version"] if session else 0
+
+    def load_history(self, session_id: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return list(session["history"]) if session else []
+
+    def append_history(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        with self.lock:
+            session = self._session(session_id)
+            session["history"].extend(messages)
+            session["version"] += 1
+            return session["version"]
+
+    def replace_history(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        with self.lock:
+            session = self._session(session_id)
+            session["history"] = list(messages)
+            session["version"] += 1
+            return session["version"]
+
+    def get_current_agent(self, session_id: str) -> Optional[str]:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            return session["agent"] if session else None
+
+    def set_current_agent(self, session_id: str, agent_key: str) -> int:
+        with self.lock:
+            session = self._session(session_id)
+            session["agent"] = agent_key
+            session["version"] += 1
+            return session["version"]
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def release(self, session_id: str):
+        # Nothing outlives the process, so an evicted session is gone
+        self.delete(session_id)
+
+
+class SQLiteStateBackend(StateBackend):
+    def __init__(self, path: str):
+        """SQLite backend shared by all workers on a host
+
+        History is stored one row per message so turns only append rows.
+        The database runs in WAL mode so readers never block the writer.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    current_agent TEXT,
+                    length INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                ) WITHOUT ROWID;
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def _touch(self, conn: sqlite3.Connection, session_id: str, **fields) -> int:
+        """Bump a session's version, creating the row if needed"""
+        conn.execute(
+            "INSERT OR IGNORE INTO sessions (session_id, updated_at) VALUES (?, ?)",
+            (session_id, time.time()),
+        )
+        assignments = "".join(f", {name} = ?" for name in fields)
+        conn.execute(
+            f"UPDATE sessions SET version = version + 1, updated_at = ?{assignments} WHERE session_id = ?",
+            (time.time(), *fields.values(), session_id),
+        )
+        return conn.execute(
+            "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def get_version(self, session_id: str) -> int:
+        row = (
+            self._connect()
+            .execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,))
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def load_history(self, session_id: str) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT data FROM messages WHERE session_id = ? ORDER BY seq",
+            (session_id,),
+        )
+        return [decode_message(row[0]) for row in rows]
+
+    def append_history(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        conn = self._connect()
+        with conn:
+            # Lock out other writers before reading the length, or two workers
+            # appending at once pick the same seq
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT length FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            length = row[0] if row else 0
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, data) VALUES (?, ?, ?)",
+                [
+                    (session_id, length + i, encode_message(message))
+                    for i, message in enumerate(messages)
+                ],
+            )
+            return self._touch(conn, session_id, length=length + len(messages))
+
+    def replace_history(self, session_id: str, messages: List[Dict[str, Any]]) -> int:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO messages (session_id, seq, data) VALUES (?, ?, ?)",
+                [
+                    (session_id, i, encode_message(message))
+                    for i, message in enumerate(messages)
+                ],
+            )
+            return self._touch(conn, session_id, length=len(messages))
+
+    def get_current_agent(self, session_id: str) -> Optional[str]:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT current_agent FROM sessions WHERE session_id = ?",
+                (session_id,),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def set_current_agent(self, session_id: str, agent_key: str) -> int:
+        conn = self._connect()
+        with conn:
+            return self._touch(conn, session_id, current_agent=agent_key)
+
+    def delete(self, session_id: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def create_state_backend() -> StateBackend:
+    """Create the backend selected by SESSION_STATE_BACKEND (memory or sqlite)"""
+    backend = os.environ.get("SESSION_STATE_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteStateBackend(os.environ.get("SESSION_STATE_PATH", "session_state.db"))
+    if backend == "memory":
+        return MemoryStateBackend()
+    raise ValueError(f"Unknown session state backend: {backend}")
@@ -0,0 +1,188 @@
+import chainlit as cl
+from chainlit.utils import utc_now
+from core.tracing import span
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+import asyncio
+
+_DONE = object()
+
+
+def _is_text(chunk) -> bool:
+    """Whether a chunk only carries content tokens"""
+    return (
+        isinstance(chunk, dict)
+        and bool(chunk.get("content"))
+        and not chunk.get("tool_calls")
+        and "delim" not in chunk
+        and "response" not in chunk
+    )
+
+
+async def stream_turn(
+    turn_executor,
+    session_id: str,
+    client,
+    on_chunk: Callable[[Dict[str, Any]], Awaitable[None]],
+    **run_kwargs,
+):
+    """Run a streaming Swarm turn on the worker pool and forward its chunks
+
+    The blocking Swarm generator is consumed on a worker thread and each
+    chunk is handed back to the event loop as soon as it arrives. Content
+    tokens that queued up while the UI was busy are merged into one chunk,
+    flushed before the next chunk of another kind.
+
+    Args:
+        turn_executor: TurnExecutor used to order and bound the turn
+        session_id: Session the turn belongs to
+        client: Swarm client
+        on_chunk: Coroutine called with every delta/delimiter chunk
+        run_kwargs: Arguments passed through to `client.run`
+
+    Returns:
+        The final Swarm Response
+    """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    def produce():
+        try:
+            for chunk in client.run(stream=True, **run_kwargs):
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(chunks.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, _DONE)
+
+    producer = asyncio.ensure_future(turn_executor.run(session_id, produce))
+
+    response = None
+    error = None
+    held = None
+    while True:
+        if held is not None:
+            chunk, held = held, None
+        else:
+            chunk = await chunks.get()
+        if _is_text(chunk):
+            chunk = dict(chunk)
+            while not chunks.empty():
+                following = chunks.get_nowait()
+                if not _is_text(following):
+                    held = following
+                    break
+                chunk["content"] += following["content"]
+        if chunk is _DONE:
+            break
+        if isinstance(chunk, Exception):
+            error = chunk
+        elif "response" in chunk:
+            response = chunk["response"]
+        else:
+            await on_chunk(chunk)
+
+    await producer
+    if error:
+        raise error
+    return response
+
+
+class StreamRenderer:
+    def __init__(
+        self,
+        handoff_tools: Optional[Set[str]] = None,
+        on_handoff: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        """Render a streamed Swarm turn into Chainlit messages and steps
+
+        Args:
+            handoff_tools: Names of tools that transfer to another agent
+            on_handoff: Coroutine called with the tool name once a handoff
+                tool has run
+        """
+        self.handoff_tools = handoff_tools or set()
+        self.on_handoff = on_handoff
+        self.message: Optional[cl.Message] = None
+        self.tool_calls: Dict[int, Dict[str, str]] = {}
+        self.steps: Dict[str, cl.Step] = {}
+        self.sent_content = False
+
+    async def handle(self, chunk: Dict[str, Any]):
+        """Handle one chunk from Swarm's streaming run"""
+        delim = chunk.get("delim")
+        if delim == "start":
+            # A new completion starts once the previous tool calls have run
+            await self._finish_tool_calls()
+            return
+        if delim == "end":
+            await self._end_message()
+            await self._update_tool_inputs()
+            return
+
+        if chunk.get("content"):
+            if self.message is None:
+                self.message = cl.Message(content="")
+            await self.message.stream_token(chunk["content"])
+            self.sent_content = True
+
+        for tool_call in chunk.get("tool_calls") or []:
+            await self._merge_tool_call(tool_call)
+
+    async def finish(self, response=None):
+        """Close open messages and steps and attach tool outputs"""
+        await self._end_message()
+        await self._finish_tool_calls()
+        if response is None:
+            return
+
+        for message in response.messages:
+            step = self.steps.get(message.get("tool_call_id"))
+            if message.get("role") == "tool" and step:
+                step.output = message.get("content") or ""
+                await step.update()
+
+    async def _merge_tool_call(self, tool_call: Dict[str, Any]):
+        """Accumulate a tool call delta and open its step on first sight"""
+        entry = self.tool_calls.setdefault(
+            tool_call.get("index", 0), {"id": "", "name": "", "arguments": ""}
+        )
+        if tool_call.get("id"):
+            entry["id"] = tool_call["id"]
+        function = tool_call.get("function") or {}
+        if function.get("name"):
+            entry["name"] += function["name"]
+        if function.get("arguments"):
+            entry["arguments"] += function["arguments"]
+
+        if entry["id"] and entry["name"] and entry["id"] not in self.steps:
+            step = cl.Step(name=entry["name"], type="tool")
+            step.start = utc_now()
+            self.steps[entry["id"]] = step
+            await step.send()
+
+    async def _update_tool_inputs(self):
+        """Show the complete arguments once the model finished the call"""
+        for entry in self.tool_calls.values():
+            step = self.steps.get(entry["id"])
+            if step:
+                step.input = entry["arguments"]
+                await step.update()
+
+    async def _finish_tool_calls(self):
+        """Mark executed tool calls as done and announce handoffs"""
+        tool_calls = list(self.tool_calls.values())
+        self.tool_calls = {}
+        for entry in tool_calls:
+            step = self.steps.get(entry["id"])
+            if step and not step.end:
+                step.end = utc_now()
+                await step.update()
+            if entry["name"] in self.handoff_tools and self.on_handoff:
+                await self.on_handoff(entry["name"])
+
+    async def _end_message(self):
+        """Finalize the message currently being streamed"""
+        if self.message is not None:
+            with span("ui_send", content_chars=len(self.message.content)):
+                await self.message.send()
+            self.message = None
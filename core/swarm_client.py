@@ -0,0 +1,408 @@
+from swarm import Swarm
+from swarm.types import Response
+from swarm.util import function_to_json
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from core.llm_cache import LLMCache, create_llm_cache, fingerprint
+from core.tracing import current_span, end_span, payload_size, span, start_span
+import contextvars
+import logging
+import os
+
+# Tool parameter Swarm fills in itself, hidden from the model
+CONTEXT_VARIABLES = "context_variables"
+
+# Agent attributes that change the completion and belong in the cache key
+SAMPLING_PARAMS = ["tool_choice", "parallel_tool_calls", "temperature", "top_p", "seed"]
+
+
+class SwarmClient(Swarm):
+    def __init__(
+        self,
+        *args,
+        max_parallel_tools: Optional[int] = None,
+        llm_cache: Optional[LLMCache] = None,
+        **kwargs,
+    ):
+        """Swarm client with concurrent tool calls and an optional completion cache
+
+        When the model emits several tool calls in one message, consecutive
+        calls to tools marked with `@read_only` run concurrently on a shared
+        pool. Any other call (including agent transfers) runs on its own,
+        after the calls before it finished, so side effects and handoffs keep
+        their order. Results are returned in the original order.
+
+        Completions can be served from a disk cache keyed by the fingerprint
+        of the request, see core.llm_cache. Streamed completions are stored
+        whole and replayed as a short stream of chunks.
+
+        Args:
+            max_parallel_tools: Size of the tool pool. Defaults to
+                SWARM_MAX_PARALLEL_TOOLS, or 8.
+            llm_cache: Completion cache. Defaults to the one configured
+                through LLM_CACHE, if any.
+        """
+        super().__init__(*args, **kwargs)
+        if max_parallel_tools is None:
+            max_parallel_tools = int(os.environ.get("SWARM_MAX_PARALLEL_TOOLS", "8"))
+        self.tool_pool = ThreadPoolExecutor(
+            max_workers=max(1, max_parallel_tools), thread_name_prefix="swarm-tool"
+        )
+        self.llm_cache = llm_cache if llm_cache is not None else create_llm_cache()
+
+    @staticmethod
+    def _request_fingerprint(agent, history, context_variables, model_override) -> str:
+        """Fingerprint everything that is sent to the model for a completion"""
+        context_variables = defaultdict(str, context_variables)
+        instructions = (
+            agent.instructions(context_variables)
+            if callable(agent.instructions)
+            else agent.instructions
+        )
+        payload = {
+            "model": model_override or agent.model,
+            "messages": [{"role": "system", "content": instructions}] + history,
+            "tools": [function_to_json(f) for f in agent.functions],
+        }
+        for param in SAMPLING_PARAMS:
+            payload[param] = getattr(agent, param, None)
+        return fingerprint(payload)
+
+    def get_chat_completion(
+        self, agent, history, context_variables, model_override, stream, debug
+    ):
+        if stream:
+            return self._get_chat_completion_stream(
+                agent, history, context_variables, model_override
+            )
+        with span(
+            "llm",
+            agent=agent.name,
+            model=model_override or agent.model,
+            stream=stream,
+            messages=len(history),
+            request_bytes=payload_size(history),
+        ) as llm_span:
+            completion = self._get_chat_completion(
+                agent, history, context_variables, model_override, stream, debug
+            )
+            if llm_span is not None:
+                message = completion.choices[0].message
+                llm_span.set(response_bytes=payload_size(message.model_dump()))
+                if completion.usage:
+                    llm_span.set(
+                        prompt_tokens=completion.usage.prompt_tokens,
+                        completion_tokens=completion.usage.completion_tokens,
+                    )
+            return completion
+
+    def _get_chat_completion_stream(
+        self, agent, history, context_variables, model_override
+    ):
+        """Request a streamed completion, traced until the stream is consumed
+
+        Usage is requested in a final chunk without choices, which is
+        recorded on the "llm" span and not passed on to Swarm. With a cache,
+        a recorded completion is replayed instead, and a new one is stored
+        once its stream has been consumed.
+        """
+        llm_span = start_span(
+            "llm",
+            agent=agent.name,
+            model=model_override or agent.model,
+            stream=True,
+            messages=len(history),
+            request_bytes=payload_size(history),
+        )
+        try:
+            key = None
+            if self.llm_cache is not None:
+                key = self._request_fingerprint(
+                    agent, history, context_variables, model_override
+                )
+                # Raises CacheMiss in replay mode instead of calling the API
+                cached = self.llm_cache.get(key)
+                if cached is not None:
+                    if llm_span is not None:
+                        llm_span.set(cached=True)
+                    completion = self._replay_stream(
+                        ChatCompletion.model_validate_json(cached)
+                    )
+                    return self._traced_stream(completion, llm_span)
+
+            context_variables = defaultdict(str, context_variables)
+            instructions = (
+                agent.instructions(context_variables)
+                if callable(agent.instructions)
+                else agent.instructions
+            )
+            tools = [function_to_json(f) for f in agent.functions]
+            # Hidden from the model, as in Swarm.get_chat_completion
+            for tool in tools:
+                params = tool["function"]["parameters"]
+                params["properties"].pop(CONTEXT_VARIABLES, None)
+                if CONTEXT_VARIABLES in params["required"]:
+                    params["required"].remove(CONTEXT_VARIABLES)
+            create_params = {
+                "model": model_override or agent.model,
+                "messages": [{"role": "system", "content": instructions}] + history,
+                "tools": tools or None,
+                "tool_choice": agent.tool_choice,
+                "stream": True,
+                "stream_options": {"include_usage": True},
+            }
+            if tools:
+                create_params["parallel_tool_calls"] = agent.parallel_tool_calls
+            completion = self.client.chat.completions.create(**create_params)
+            if key is not None:
+                completion = self._recorded_stream(completion, key)
+        except BaseException as e:
+            if llm_span is not None:
+                llm_span.set(error=type(e).__name__)
+            end_span(llm_span)
+            raise
+        return self._traced_stream(completion, llm_span)
+
+    @staticmethod
+    def _replay_stream(completion: ChatCompletion):
+        """Yield a stored completion as chunks, the way the API streams it"""
+        base = {
+            "id": completion.id,
+            "object": "chat.completion.chunk",
+            "created": completion.created,
+            "model": completion.model,
+        }
+
+        def chunk(choices, usage=None):
+            return ChatCompletionChunk.model_validate(
+                {**base, "choices": choices, "usage": usage}
+            )
+
+        choice = completion.choices[0]
+        message = choice.message
+        yield chunk(
+            [{"index": 0, "delta": {"role": "assistant", "content": message.content}}]
+        )
+        # Swarm merges a single tool call per chunk
+        for index, tool_call in enumerate(message.tool_calls or []):
+            delta = {"tool_calls": [{"index": index, **tool_call.model_dump()}]}
+            yield chunk([{"index": 0, "delta": delta}])
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": choice.finish_reason}])
+        if completion.usage:
+            yield chunk([], completion.usage.model_dump())
+
+    def _recorded_stream(self, chunks, key: str):
+        """Yield the chunks of a stream and store the completion they make up
+
+        Nothing is stored when the stream is not consumed to the end.
+        """
+        first = None
+        content = []
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        finish_reason = None
+        usage = None
+        for chunk in chunks:
+            first = first or chunk
+            if chunk.usage:
+                usage = chunk.usage.model_dump()
+            for choice in chunk.choices[:1]:
+                if choice.delta.content:
+                    content.append(choice.delta.content)
+                for tool_call in choice.delta.tool_calls or []:
+                    entry = tool_calls.setdefault(
+                        tool_call.index,
+                        {
+                            "id": "",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""},
+                        },
+                    )
+                    if tool_call.id:
+                        entry["id"] = tool_call.id
+                    if tool_call.function and tool_call.function.name:
+                        entry["function"]["name"] += tool_call.function.name
+                    if tool_call.function and tool_call.function.arguments:
+                        entry["function"]["arguments"] += tool_call.function.arguments
+                finish_reason = choice.finish_reason or finish_reason
+            yield chunk
+        if first is None:
+            return
+
+        message: Dict[str, Any] = {"role": "assistant", "content": "".join(content)}
+        if tool_calls:
+            message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+        completion = ChatCompletion.model_validate(
+            {
+                "id": first.id,
+                "object": "chat.completion",
+                "created": first.created,
+                "model": first.model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": finish_reason or "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+        self.llm_cache.put(key, completion.model_dump_json())
+
+    @staticmethod
+    def _traced_stream(completion, llm_span):
+        """Yield the chunks of a stream, timing the "llm" span until the last one"""
+        response_bytes = 0
+        try:
+            for chunk in completion:
+                if chunk.usage and llm_span is not None:
+                    llm_span.set(
+                        prompt_tokens=chunk.usage.prompt_tokens,
+                        completion_tokens=chunk.usage.completion_tokens,
+                    )
+                if not chunk.choices:
+                    continue
+                response_bytes += payload_size(
+                    chunk.choices[0].delta.model_dump(exclude_none=True)
+                )
+                yield chunk
+        except BaseException as e:
+            if llm_span is not None:
+                llm_span.set(error=type(e).__name__)
+            raise
+        finally:
+            if llm_span is not None:
+                llm_span.set(response_bytes=response_bytes)
+            end_span(llm_span)
+
+    def _get_chat_completion(
+        self, agent, history, context_variables, model_override, stream, debug
+    ):
+        if self.llm_cache is None:
+            return super().get_chat_completion(
+                agent=agent,
+                history=history,
+                context_variables=context_variables,
+                model_override=model_override,
+                stream=stream,
+                debug=debug,
+            )
+
+        key = self._request_fingerprint(
+            agent, history, context_variables, model_override
+        )
+        cached = self.llm_cache.get(key)
+        if cached is not None:
+            if current_span() is not None:
+                current_span().set(cached=True)
+            return ChatCompletion.model_validate_json(cached)
+
+        completion = super().get_chat_completion(
+            agent=agent,
+            history=history,
+            context_variables=context_variables,
+            model_override=model_override,
+            stream=stream,
+            debug=debug,
+        )
+        self.llm_cache.put(key, completion.model_dump_json())
+        return completion
+
+    @staticmethod
+    def _is_read_only(tool_call, function_map: Dict[str, Any]) -> bool:
+        """Check whether a tool call targets a read-only tool"""
+        func = function_map.get(tool_call.function.name)
+        return bool(getattr(func, "read_only", False))
+
+    def _handle_tool_call(self, tool_call, functions, context_variables, debug):
+        """Run a single tool call through Swarm, traced as a "tool" span
+
+        A tool raising an exception gets an error result instead, so the other
+        calls of the message still run and the model can react.
+        """
+        with span(
+            "tool",
+            tool=tool_call.function.name,
+            arguments_bytes=payload_size(tool_call.function.arguments or ""),
+        ) as tool_span:
+            try:
+                response = super().handle_tool_calls(
+                    [tool_call], functions, context_variables, debug
+                )
+            except Exception as e:
+                logging.error(f"Error in tool {tool_call.function.name}: {e}")
+                if tool_span is not None:
+                    tool_span.set(error=type(e).__name__)
+                response = Response(
+                    messages=[
+                        {
+                            "role": "tool",
+                            "tool_call_id": tool_call.id,
+                            "tool_name": tool_call.function.name,
+                            "content": f"Error running {tool_call.function.name}: {str(e)}",
+                        }
+                    ],
+                    agent=None,
+                    context_variables={},
+                )
+            if tool_span is not None:
+                tool_span.set(
+                    result_bytes=sum(
+                        payload_size(m.get("content") or "") for m in response.messages
+                    )
+                )
+            return response
+
+    def _run_batch(self, tool_calls: List, functions, context_variables, debug):
+        """Run read-only tool calls concurrently, keeping their order"""
+        futures = [
+            self.tool_pool.submit(
+                # Each call needs its own copy of the (Chainlit) context
+                contextvars.copy_context().run,
+                self._handle_tool_call,
+                tool_call,
+                functions,
+                context_variables,
+                debug,
+            )
+            for tool_call in tool_calls
+        ]
+        return [future.result() for future in futures]
+
+    def handle_tool_calls(self, tool_calls, functions, context_variables, debug):
+        function_map = {f.__name__: f for f in functions}
+        read_only = [self._is_read_only(call, function_map) for call in tool_calls]
+
+        # Split into runs of read-only calls and single ordered calls
+        partials = []
+        i = 0
+        while i < len(tool_calls):
+            j = i + 1
+            if read_only[i]:
+                while j < len(tool_calls) and read_only[j]:
+                    j += 1
+            if j - i > 1:
+                partials.extend(
+                    self._run_batch(tool_calls[i:j], functions, context_variables, debug)
+                )
+            else:
+                partials.append(
+                    self._handle_tool_call(
+                        tool_calls[i], functions, context_variables, debug
+                    )
+                )
+            i = j
+
+        if not partials:
+            return super().handle_tool_calls(
+                tool_calls, functions, context_variables, debug
+            )
+        response = partials[0]
+        for partial in partials[1:]:
+            response.messages.extend(partial.messages)
+            response.context_variables.update(partial.context_variables)
+            if partial.agent:
+                response.agent = partial.agent
+        return response
@@ -0,0 +1,192 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+# Hits and misses per tool name, across all agent instances
+_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _count(tool: str, hit: bool):
+    with _stats_lock:
+        counters = _stats.setdefault(tool, {"hits": 0, "misses": 0})
+        counters["hits" if hit else "misses"] += 1
+
+
+def tool_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Get hits, misses and hit ratio per cached tool"""
+    with _stats_lock:
+        return {
+            tool: {
+                **counters,
+                "hit_ratio": counters["hits"] / (counters["hits"] + counters["misses"]),
+            }
+            for tool, counters in _stats.items()
+            if counters["hits"] + counters["misses"]
+        }
+
+
+def file_tag(path: str) -> str:
+    """Tag of the cache entries that depend on a file"""
+    return f"file:{os.path.abspath(path)}"
+
+
+def _file_stamp(path: str):
+    """Identify a file version by modification time and size"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ToolCache:
+    """Cached tool results of one agent instance"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """Get a valid entry, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires"] is not None and time.monotonic() > entry["expires"]:
+                del self.entries[key]
+                return None
+            if entry["file"] is not None:
+                try:
+                    if _file_stamp(entry["file"]) != entry["stamp"]:
+                        del self.entries[key]
+                        return None
+                except OSError:
+                    del self.entries[key]
+                    return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: Dict[str, Any]):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, tags: Iterable[str]):
+        """Drop every entry carrying one of the tags"""
+        tags = set(tags)
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e["tags"] & tags]:
+                del self.entries[key]
+
+
+def _tool_cache(instance) -> ToolCache:
+    """Get (or create) the tool cache of an agent instance"""
+    cache = instance.__dict__.get("_tool_cache")
+    if cache is None:
+        cache = instance.__dict__.setdefault("_tool_cache", ToolCache())
+    return cache
+
+
+def _bind(func, instance, args, kwargs) -> Dict[str, Any]:
+    """Map the call's arguments to parameter names, defaults included"""
+    bound = inspect.signature(func).bind(instance, *args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop("self", None)
+    return arguments
+
+
+def cached(
+    ttl: Optional[float] = None,
+    file: Optional[Callable[[Any, Dict[str, Any]], str]] = None,
+    tags: Optional[Callable[[Any, Dict[str, Any]], Set[str]]] = None,
+):
+    """Memoize a tool method per agent instance and arguments
+
+    Error results (strings starting with "Error") are never cached.
+
+    Args:
+        ttl: Seconds an entry stays valid
+        file: Returns the file a result was read from, given the agent and
+            the call's arguments. The entry is invalid once the file's
+            modification time or size changes.
+        tags: Returns tags for the entry, used by `invalidates`
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            arguments = _bind(func, self, args, kwargs)
+            # Relative paths are resolved against the current directory, which
+            # change_cwd moves: the resolved file is part of the key
+            path = os.path.abspath(file(self, arguments)) if file is not None else None
+            key = (func.__name__, json.dumps(arguments, sort_keys=True, default=str), path)
+            cache = _tool_cache(self)
+
+            entry = cache.get(key)
+            if entry is not None:
+                _count(func.__name__, hit=True)
+                return entry["result"]
+            _count(func.__name__, hit=False)
+
+            stamp = None
+            if path is not None:
+                try:
+                    stamp = _file_stamp(path)
+                except OSError:
+                    path = None
+
+            result = func(self, *args, **kwargs)
+            if isinstance(result, str) and result.startswith("Error"):
+                return result
+            if file is not None and path is None:
+                return result
+
+            entry_tags = set(tags(self, arguments)) if tags else set()
+            if path is not None:
+                entry_tags.add(file_tag(path))
+            cache.put(
+                key,
+                {
+                    "result": result,
+                    "expires": time.monotonic() + ttl if ttl is not None else None,
+                    "file": path,
+                    "stamp": stamp,
+                    "tags": entry_tags,
+                },
+            )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(tags: Callable[[Any, Dict[str, Any]], Set[str]]):
+    """Drop cached tool results affected by a write tool
+
+    The entries are dropped after the write ran, whatever its result.
+
+    Args:
+        tags: Returns the tags to invalidate, given the agent and the call's
+            arguments
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            arguments = _bind(func, self, args, kwargs)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                _tool_cache(self).invalidate(tags(self, arguments))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,184 @@
+from typing import Any, Coroutine, Optional
+import asyncio
+import copy
+import threading
+
+try:
+    from chainlit.context import context_var
+    from chainlit.emitter import BaseChainlitEmitter
+except ImportError:  # Allows the runtime to be used (and benchmarked) without Chainlit
+    context_var = None
+    BaseChainlitEmitter = None
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """Get the loop running in the calling thread, if any"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class SessionLoopEmitter:
+    """Forward a Chainlit emitter's coroutines to the session's event loop
+
+    Steps and messages created on a tool loop are emitted through the
+    session's socket, which belongs to the Chainlit loop. Every coroutine
+    method of the wrapped emitter is therefore scheduled on that loop and
+    awaited from the tool loop.
+    """
+
+    def __init__(self, emitter, loop: asyncio.AbstractEventLoop):
+        self._emitter = emitter
+        self._loop = loop
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._emitter, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def forward(*args, **kwargs):
+            future = asyncio.run_coroutine_threadsafe(
+                attr(*args, **kwargs), self._loop
+            )
+            return await asyncio.wrap_future(future)
+
+        return forward
+
+
+class ToolRuntime:
+    """Run tool coroutines from synchronous Swarm functions
+
+    Swarm calls agent functions synchronously, while the tools themselves are
+    `@cl.step` coroutines. Instead of creating and tearing down an event loop
+    per call with `asyncio.run`, each worker thread keeps one long-lived loop
+    that runs its tool coroutines, so blocking tool bodies stay on the worker
+    and sessions keep running in parallel. Calls made from a thread that
+    already runs a loop are handed to a shared background loop instead.
+
+    The caller's Chainlit context is propagated into the coroutine, with its
+    emitter bound to the session loop so steps reach the right socket.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.background_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.background_thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def _thread_loop(self) -> asyncio.AbstractEventLoop:
+        """Get the calling worker thread's loop, created on first use"""
+        loop = getattr(self.local, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            self.local.loop = loop
+        return loop
+
+    def _background(self) -> asyncio.AbstractEventLoop:
+        """Get the shared background loop, started on first use"""
+        with self.lock:
+            if self.background_loop is None or self.background_loop.is_closed():
+                self.background_loop = asyncio.new_event_loop()
+                self.background_thread = threading.Thread(
+                    target=self.background_loop.run_forever,
+                    name="tool-runtime",
+                    daemon=True,
+                )
+                self.background_thread.start()
+            return self.background_loop
+
+    @staticmethod
+    def _bind_chainlit_context(
+        loop: asyncio.AbstractEventLoop,
+        blocked_loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        """Set a copy of the Chainlit context whose emitter targets the session loop
+
+        When the session loop is the one blocked on the call (e.g. resources
+        closed from `on_chat_end`), forwarding would deadlock, so the steps
+        are not emitted.
+
+        Args:
+            loop: Loop the coroutine runs on
+            blocked_loop: Loop waiting for the result, if any
+
+        Returns:
+            Token to reset the context variable with, or None
+        """
+        if context_var is None:
+            return None
+        try:
+            context = context_var.get()
+        except LookupError:
+            return None
+        if context.loop is loop or isinstance(context.emitter, SessionLoopEmitter):
+            return None
+        bound = copy.copy(context)
+        if context.loop is blocked_loop:
+            bound.emitter = BaseChainlitEmitter(context.session)
+        else:
+            bound.emitter = SessionLoopEmitter(context.emitter, context.loop)
+        return context_var.set(bound)
+
+    def run(self, coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None):
+        """Run a coroutine to completion and return its result
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait for the result, no limit by default
+        """
+        caller_loop = _running_loop()
+        if caller_loop is not None:
+            # Called from inside a loop: it cannot be re-entered, so block on
+            # the background loop (this still blocks the caller's loop)
+            loop = self._background()
+            token = self._bind_chainlit_context(loop, caller_loop)
+            try:
+                # run_coroutine_threadsafe copies the calling thread's context
+                future = asyncio.run_coroutine_threadsafe(coro, loop)
+            finally:
+                if token is not None:
+                    context_var.reset(token)
+            return future.result(timeout)
+
+        loop = self._thread_loop()
+        token = self._bind_chainlit_context(loop)
+        try:
+            # The task created here copies the current (bound) context
+            return loop.run_until_complete(asyncio.wait_for(coro, timeout))
+        finally:
+            if token is not None:
+                context_var.reset(token)
+
+    def close(self):
+        """Stop the background loop and the calling thread's loop"""
+        with self.lock:
+            if self.background_loop is not None and not self.background_loop.is_closed():
+                self.background_loop.call_soon_threadsafe(self.background_loop.stop)
+                self.background_thread.join(timeout=5)
+                self.background_loop.close()
+            self.background_loop = None
+            self.background_thread = None
+        loop = getattr(self.local, "loop", None)
+        if loop is not None and not loop.is_closed():
+            loop.close()
+        self.local.loop = None
+
+
+# Shared by all agents in the process
+tool_runtime = ToolRuntime()
+
+
+def run_tool(coro: Coroutine[Any, Any, Any]):
+    """Run a tool coroutine on the shared tool runtime"""
+    return tool_runtime.run(coro)
+
+
+def read_only(func):
+    """Mark a tool as free of side effects
+
+    Consecutive read-only tool calls from the same assistant message may be
+    executed concurrently by SwarmClient.
+    """
+    func.read_only = True
+    return func
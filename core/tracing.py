@@ -0,0 +1,300 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+# Trace of the turn being run and the innermost open span. Both are copied
+# into worker threads along with the rest of the context.
+_current_trace: contextvars.ContextVar = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        """A timed operation within a turn
+
+        Args:
+            name: Kind of operation, e.g. "llm" or "tool"
+            parent_id: ID of the enclosing span
+            attributes: Token counts, payload sizes, tool names...
+        """
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        # Trace a span from `start_span` is added to when it ends
+        self.trace: Optional["Trace"] = None
+
+    def set(self, **attributes):
+        """Add attributes to the span"""
+        self.attributes.update(attributes)
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    def __init__(self, session_id: str, sampled: bool):
+        """Spans recorded during one turn of a session"""
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+    def add(self, span: Span):
+        # Tool spans may be recorded from several pool threads at once
+        with self.lock:
+            self.spans.append(span)
+
+
+def current_span() -> Optional[Span]:
+    """Get the innermost open span, if any"""
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Record a span in the current turn's trace
+
+    Does nothing (and yields None) outside of a traced turn.
+
+    Args:
+        name: Kind of operation, e.g. "llm", "tool", "handoff" or "ui_send"
+        attributes: Initial attributes of the span
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+        trace.add(current)
+
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """Start a span that ends with `end_span`, e.g. once a stream is consumed
+
+    Unlike `span`, it does not become the parent of the spans opened
+    meanwhile. Returns None outside of a traced turn.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, attributes)
+    current.trace = trace
+    return current
+
+
+def end_span(current: Optional[Span]):
+    """End a span from `start_span` and add it to its trace, once"""
+    if current is None or current.duration_ms is not None:
+        return
+    current.end()
+    current.trace.add(current)
+
+
+def payload_size(payload: Any) -> int:
+    """Approximate size in bytes of a JSON payload"""
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    return len(json.dumps(payload, default=str).encode("utf-8"))
+
+
+def _otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otel(trace: Trace) -> Dict[str, Any]:
+    """Convert a trace to an OTLP/JSON `resourceSpans` document"""
+    spans = []
+    for item in trace.spans:
+        start = int(item.start * 1e9)
+        spans.append(
+            {
+                "traceId": trace.trace_id,
+                "spanId": item.span_id,
+                "parentSpanId": item.parent_id or "",
+                "name": item.name,
+                "kind": 1,
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(start + int((item.duration_ms or 0) * 1e6)),
+                "attributes": [
+                    {"key": key, "value": _otel_value(value)}
+                    for key, value in item.attributes.items()
+                ],
+            }
+        )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": "chainlit-swarm"}},
+                        {"key": "session.id", "value": {"stringValue": trace.session_id}},
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "core.tracing"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class Tracer:
+    def __init__(
+        self,
+        export: Optional[str] = None,
+        path: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+    ):
+        """Trace turns into spans, export them and keep per-session summaries
+
+        Summaries cover every turn. Sampling only decides which turns are
+        written to the export file, one JSON document per line.
+
+        Args:
+            export: "off", "jsonl" (plain spans) or "otlp" (OTLP/JSON lines).
+                Defaults to TRACE_EXPORT, or "off".
+            path: Export file. Defaults to TRACE_PATH, or traces.jsonl.
+            sample_rate: Fraction of turns exported. Defaults to
+                TRACE_SAMPLE_RATE, or 1.
+        """
+        self.export = (export or os.environ.get("TRACE_EXPORT", "off")).lower()
+        if self.export not in ("off", "jsonl", "otlp"):
+            raise ValueError(f"Unknown trace export: {self.export}")
+        self.path = path or os.environ.get("TRACE_PATH", "traces.jsonl")
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("TRACE_SAMPLE_RATE", "1"))
+        self.sample_rate = sample_rate
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def turn(self, session_id: str, **attributes) -> Iterator[Trace]:
+        """Trace a turn of a session
+
+        Spans opened inside the block, including on worker threads the
+        context is copied to, belong to this turn.
+
+        Args:
+            session_id: Session the turn belongs to
+            attributes: Attributes of the root "turn" span
+        """
+        sampled = self.export != "off" and random.random() < self.sample_rate
+        trace = Trace(session_id, sampled)
+        token = _current_trace.set(trace)
+        try:
+            with span("turn", **attributes):
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            self._summarize(trace)
+            if trace.sampled:
+                self._export(trace)
+
+    def _summarize(self, trace: Trace):
+        with self.lock:
+            summary = self.summaries.setdefault(
+                trace.session_id,
+                {"turns": 0, "prompt_tokens": 0, "completion_tokens": 0, "spans": {}},
+            )
+            summary["turns"] += 1
+            for item in trace.spans:
+                stats = summary["spans"].setdefault(
+                    item.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+                )
+                stats["count"] += 1
+                stats["total_ms"] += item.duration_ms or 0
+                stats["max_ms"] = max(stats["max_ms"], item.duration_ms or 0)
+                # None when the provider reported no usage
+                summary["prompt_tokens"] += item.attributes.get("prompt_tokens") or 0
+                summary["completion_tokens"] += (
+                    item.attributes.get("completion_tokens") or 0
+                )
+            summary["last_turn"] = [item.to_dict() for item in trace.spans]
+
+    def _export(self, trace: Trace):
+        if self.export == "otlp":
+            document = to_otel(trace)
+        else:
+            document = {
+                "trace_id": trace.trace_id,
+                "session_id": trace.session_id,
+                "spans": [item.to_dict() for item in trace.spans],
+            }
+        line = json.dumps(document, default=str)
+        try:
+            with self.lock, open(self.path, "a") as file:
+                file.write(line + "\n")
+        except OSError as e:
+            logging.error(f"Error exporting trace to {self.path}: {e}")
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the span totals of a session's turns, or None"""
+        with self.lock:
+            summary = self.summaries.get(session_id)
+            return json.loads(json.dumps(summary)) if summary else None
+
+    def format_summary(self, session_id: str) -> str:
+        """Render a session's summary as a markdown table"""
+        summary = self.summary(session_id)
+        if summary is None:
+            return "No traced turns in this session yet."
+        lines = [
+            f"**{summary['turns']} turns**, {summary['prompt_tokens']} prompt tokens, "
+            f"{summary['completion_tokens']} completion tokens",
+            "",
+            "| span | count | total ms | avg ms | max ms |",
+            "|---|---:|---:|---:|---:|",
+        ]
+        for name, stats in summary["spans"].items():
+            lines.append(
+                f"| {name} | {stats['count']} | {stats['total_ms']:.1f} | "
+                f"{stats['total_ms'] / stats['count']:.1f} | {stats['max_ms']:.1f} |"
+            )
+        return "\n".join(lines)
+
+    def forget(self, session_id: str):
+        """Drop the summary of a finished session"""
+        with self.lock:
+            self.summaries.pop(session_id, None)
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import contextvars
+import functools
+import os
+
+
+class TurnExecutor:
+    def __init__(self, max_workers: Optional[int] = None):
+        """Run blocking Swarm turns off the event loop
+
+        Turns execute on a bounded thread pool so one session's LLM and tool
+        round trip never stalls the Chainlit event loop. Turns belonging to
+        the same session are serialized in arrival order.
+
+        Args:
+            max_workers: Maximum number of turns running at once. Defaults to
+                the SWARM_MAX_CONCURRENT_TURNS environment variable, or 4.
+        """
+        if max_workers is None:
+            max_workers = int(os.environ.get("SWARM_MAX_CONCURRENT_TURNS", "4"))
+        self.max_workers = max(1, max_workers)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="swarm-turn"
+        )
+        self.session_locks: Dict[str, asyncio.Lock] = {}
+
+    def _get_lock(self, session_id: str) -> asyncio.Lock:
+        """Get the lock that orders turns for a session"""
+        if session_id not in self.session_locks:
+            self.session_locks[session_id] = asyncio.Lock()
+        return self.session_locks[session_id]
+
+    async def run(self, session_id: str, func: Callable[..., Any], *args, **kwargs):
+        """Run a blocking callable for a session on the worker pool
+
+        The caller's context variables (including the Chainlit session
+        context) are copied into the worker thread so steps and messages
+        emitted by tools still reach the right session.
+
+        Args:
+            session_id: Session the turn belongs to
+            func: Blocking callable, e.g. `client.run`
+        """
+        async with self._get_lock(session_id):
+            loop = asyncio.get_running_loop()
+            ctx = contextvars.copy_context()
+            call = functools.partial(ctx.run, func, *args, **kwargs)
+            return await loop.run_in_executor(self.executor, call)
+
+    def busy(self, session_id: str) -> bool:
+        """Whether a turn of the session is running or waiting to run"""
+        lock = self.session_locks.get(session_id)
+        return lock is not None and lock.locked()
+
+    def forget(self, session_id: str):
+        """Drop ordering state for a finished session"""
+        self.session_locks.pop(session_id, None)
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting turns and release the worker threads"""
+        self.executor.shutdown(wait=wait)
@@ -1,17 +1,53 @@
 import chainlit as cl
-from swarm import Swarm
 from agents.orchestrator_agent import OrchestratorAgent
 from agents.developer_agent import DeveloperAgent
 from agents.test_agent import TestAgent
+from core.swarm_client import SwarmClient
+from core.turn_executor import TurnExecutor
+from core.streaming import StreamRenderer, stream_turn
+from core.context_manager import ContextManager
+from core.session_store import SessionStore
+from core.query_executor import query_executor
+from core.state_backend import create_state_backend
+from core.tool_cache import tool_cache_stats
+from core.tracing import Tracer, span
 import os
 import logging
 
 # Initialize Swarm client
-client = Swarm()
+client = SwarmClient()
 
-# Store conversation history and agents
-conversation_history = {}
-agent_instances = {}
+# Run turns off the event loop so sessions don't block each other
+turn_executor = TurnExecutor()
+
+# Stream tokens and tool steps to the UI while the turn runs
+STREAMING = os.environ.get("SWARM_STREAMING", "true").lower() == "true"
+
+# Swarm debug output and full response dumps, costly on long sessions
+DEBUG = os.environ.get("SWARM_DEBUG", "false").lower() == "true"
+
+# Per-turn spans (LLM, tools, handoffs, UI sends), summarized per session
+tracer = Tracer()
+
+# Keep the history sent to the model within a token budget
+context_manager = ContextManager()
+
+# Shared history and current agent, so any worker can resume a session
+state_backend = create_state_backend()
+
+
+def forget_session(session_id: str):
+    """Release everything held for a session that ended or was evicted"""
+    turn_executor.forget(session_id)
+    context_manager.forget(session_id)
+    # Queries run on database threads: cancel them on the server
+    query_executor.cancel_session(session_id)
+    state_backend.release(session_id)
+    tracer.forget(session_id)
+
+
+# Store conversation history and agents, evicting idle sessions between turns
+session_store = SessionStore(on_evict=forget_session, is_busy=turn_executor.busy)
 
 
 def setup_agents():
@@ -24,30 +60,54 @@ def setup_agents():
     # Set orchestrator reference in test agent
     test_agent.orchestrator_agent = orchestrator_agent
 
+    # Keep objects owning resources (WebDriver) so they can be closed
+    resources = [test_agent]
+
     # Create the actual agents
     test_agent = test_agent.create_agent()
     dev_agent = dev_agent.create_agent()
     orchestrator_agent = orchestrator_agent.create_agent()
 
-    return orchestrator_agent, dev_agent, test_agent
+    return orchestrator_agent, dev_agent, test_agent, resources
 
 
-@cl.on_chat_start
-async def on_chat_start():
-    # Setup agents for this session
-    session_id = cl.user_session.get("id")
-    orchestrator_agent, dev_agent, test_agent = setup_agents()
+def create_session(session_id: str):
+    """Set up agents and an empty history for a session"""
+    orchestrator_agent, dev_agent, test_agent, resources = setup_agents()
 
     # Store all agents for this session
-    agent_instances[session_id] = {
+    agents = {
         "orchestrator": orchestrator_agent,
         "developer": dev_agent,
         "tester": test_agent,
         "current": orchestrator_agent,  # Start with orchestrator
     }
+    session = session_store.create(session_id, agents=agents, resources=resources)
+    session["version"] = 0
+    return session
+
 
-    # Initialize conversation history
-    conversation_history[session_id] = []
+def load_session(session_id: str):
+    """Get a session, resuming it from the state backend if it changed"""
+    session = session_store.get(session_id)
+    if session is None:
+        session = create_session(session_id)
+
+    version = state_backend.get_version(session_id)
+    if session["version"] != version:
+        # New on this worker, or another worker ran a turn since
+        session_store.set_history(session_id, state_backend.load_history(session_id))
+        agent_key = state_backend.get_current_agent(session_id) or "orchestrator"
+        session["agents"]["current"] = session["agents"][agent_key]
+        session["version"] = version
+    return session
+
+
+@cl.on_chat_start
+async def on_chat_start():
+    # Setup agents and history for this session
+    session_id = cl.user_session.get("id")
+    create_session(session_id)
 
     # Send welcome message
     await cl.Message(
@@ -55,75 +115,117 @@ async def on_chat_start():
     ).send()
 
 
-@cl.on_message
-async def main(message: cl.Message):
-    session_id = cl.user_session.get("id")
-    messages = conversation_history[session_id]
-    current_agent_name = agent_instances[session_id]["current"].name
-    messages.append(
-        {"role": "user", "content": f"{message.content}\nYou're {current_agent_name}"}
-    )
+# Agent transfer tools, the agent they switch to and the message shown
+TRANSFERS = {
+    "_transfer_to_dev_agent": ("developer", "🔄 Transferring to Developer Agent..."),
+    "_transfer_to_test_agent": ("tester", "🔄 Transferring to Testing Agent..."),
+    "_transfer_to_orchestrator": (
+        "orchestrator",
+        "🔄 Transferring back to Orchestrator...",
+    ),
+}
+
+
+async def handle_transfer(session_id: str, name: str):
+    """Switch the current agent if the tool call is a transfer"""
+    if name not in TRANSFERS:
+        return
+    agent_key, notice = TRANSFERS[name]
+    with span("handoff", tool=name, agent=agent_key):
+        session = session_store.get(session_id)
+        session["agents"]["current"] = session["agents"][agent_key]
+        session["version"] = state_backend.set_current_agent(session_id, agent_key)
+        await cl.Message(content=notice).send()
 
-    try:
-        # Get current agent
-        current_agent = agent_instances[session_id]["current"]
 
-        # Run the agent
-        response = client.run(
-            agent=current_agent, messages=messages, debug=True  # Enable debug logging
+async def run_streaming(session_id: str, current_agent, messages):
+    """Run a turn and stream tokens, tool steps and handoffs as they happen"""
+
+    async def on_handoff(name: str):
+        await handle_transfer(session_id, name)
+
+    renderer = StreamRenderer(handoff_tools=set(TRANSFERS), on_handoff=on_handoff)
+    response = None
+    try:
+        response = await stream_turn(
+            turn_executor,
+            session_id,
+            client,
+            renderer.handle,
+            agent=current_agent,
+            messages=messages,
+            debug=DEBUG,
         )
+    finally:
+        await renderer.finish(response)
+
+    if not renderer.sent_content:
+        await cl.Message(content="No response received").send()
+    return response
+
+
+async def run_blocking(session_id: str, current_agent, messages):
+    """Run a turn and send the resulting messages once it has finished"""
+    response = await turn_executor.run(
+        session_id,
+        client.run,
+        agent=current_agent,
+        messages=messages,
+        debug=DEBUG,
+    )
 
-        logging.warning(f"Full response object: {response}")
-        logging.warning(f"Response messages: {response.messages}")
-
-        # Check if agent wants to transfer control
-        last_tool_calls = None
-        for msg in response.messages:
-            if msg.get("tool_calls"):
-                last_tool_calls = msg["tool_calls"]
-                logging.warning(f"Found tool calls: {last_tool_calls}")
-
-        # Handle agent transfers
-        if last_tool_calls:
-            for tool_call in last_tool_calls:
-                name = tool_call["function"]["name"]
-                logging.warning(f"Processing tool call: {name}")
-
-                if name == "_transfer_to_dev_agent":
-                    agent_instances[session_id]["current"] = agent_instances[
-                        session_id
-                    ]["developer"]
-                    await cl.Message(
-                        content="🔄 Transferring to Developer Agent..."
-                    ).send()
-
-                elif name == "_transfer_to_test_agent":
-                    agent_instances[session_id]["current"] = agent_instances[
-                        session_id
-                    ]["tester"]
-                    await cl.Message(
-                        content="🔄 Transferring to Testing Agent..."
-                    ).send()
-
-                elif name == "_transfer_to_orchestrator":
-                    agent_instances[session_id]["current"] = agent_instances[
-                        session_id
-                    ]["orchestrator"]
-                    await cl.Message(
-                        content="🔄 Transferring back to Orchestrator..."
-                    ).send()
-
-        # Update conversation history
-        messages.extend(response.messages)
-        conversation_history[session_id] = messages
-
-        # Send all response messages
+    if DEBUG:
+        logging.debug(f"Full response object: {response}")
+
+    # Check if agent wants to transfer control
+    last_tool_calls = None
+    for msg in response.messages:
+        if msg.get("tool_calls"):
+            last_tool_calls = msg["tool_calls"]
+
+    # Handle agent transfers
+    if last_tool_calls:
+        for tool_call in last_tool_calls:
+            name = tool_call["function"]["name"]
+            if DEBUG:
+                logging.debug(f"Processing tool call: {name}")
+            await handle_transfer(session_id, name)
+
+    # Send all response messages
+    with span("ui_send", messages=len(response.messages)):
         if response.messages:
             for message in response.messages:
                 if message.get("content"):
                     await cl.Message(content=message["content"]).send()
         else:
             await cl.Message(content="No response received").send()
+    return response
+
+
+@cl.on_message
+async def main(message: cl.Message):
+    session_id = cl.user_session.get("id")
+    if message.content.strip() == "/trace":
+        # Where the time went in this session's turns
+        await cl.Message(content=tracer.format_summary(session_id)).send()
+        return
+
+    session = load_session(session_id)
+    messages = session["history"]
+    current_agent_name = session["agents"]["current"].name
+    user_message = {
+        "role": "user",
+        "content": f"{message.content}\nYou're {current_agent_name}",
+    }
+    messages.append(user_message)
+
+    try:
+        # Get current agent
+        current_agent = session["agents"]["current"]
+        with tracer.turn(session_id, agent=current_agent.name, streaming=STREAMING):
+            await run_turn(session_id, session, current_agent, messages, user_message)
+        logging.info(f"Session store: {session_store.gauges()}")
+        logging.info(f"Tool cache: {tool_cache_stats()}")
 
     except Exception as e:
         error_msg = f"An error occurred: {str(e)}"
@@ -131,12 +233,42 @@ async def main(message: cl.Message):
         await cl.Message(content=error_msg).send()
 
 
+async def run_turn(session_id: str, session, current_agent, messages, user_message):
+    """Compact the history, run the agent and persist the new messages"""
+    # Compact old tool results so the history fits the model's budget
+    with span("compact", messages=len(messages)):
+        messages = context_manager.compact(messages, current_agent.model, session_id)
+    session_store.set_history(session_id, messages)
+    stats = context_manager.last_stats[session_id]
+    if stats["stubbed"] or stats["dropped"]:
+        session["version"] = state_backend.replace_history(session_id, messages)
+    else:
+        session["version"] = state_backend.append_history(session_id, [user_message])
+
+    # Run the agent
+    if STREAMING:
+        response = await run_streaming(session_id, current_agent, messages)
+    else:
+        response = await run_blocking(session_id, current_agent, messages)
+
+    # Update conversation history
+    messages.extend(response.messages)
+    session_store.set_history(session_id, messages)
+    session["version"] = state_backend.append_history(session_id, response.messages)
+
+
 @cl.on_stop
 def on_stop():
     # Cleanup for the session
     session_id = cl.user_session.get("id")
-    if session_id in agent_instances:
-        # Close any resources if needed
-        del agent_instances[session_id]
-    if session_id in conversation_history:
-        del conversation_history[session_id]
+    session_store.remove(session_id)
+    forget_session(session_id)
+    state_backend.delete(session_id)
+
+
+@cl.on_chat_end
+def on_chat_end():
+    # Browser disconnected: release local resources, keep the shared state
+    session_id = cl.user_session.get("id")
+    session_store.remove(session_id)
+    forget_session(session_id)
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from core.bulk_rows import load_rows, quote_name
+
+
+def test_json_rows_use_the_union_of_keys():
+    columns, values = load_rows(json.dumps([{"a": 1, "b": "x"}, {"b": "y", "c": None}]))
+    assert columns == ["a", "b", "c"]
+    assert list(values) == [(1, "x", None), (None, "y", None)]
+
+
+def test_csv_file_is_read_lazily_with_empty_fields_as_null(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_text("name,email\nann,ann@example.com\nbob,\n", encoding="utf-8")
+
+    columns, values = load_rows("", str(path))
+    assert columns == ["name", "email"]
+    assert next(values) == ("ann", "ann@example.com")
+    assert list(values) == [("bob", None)]
+
+
+def test_json_file_and_invalid_rows(tmp_path):
+    path = tmp_path / "rows.json"
+    path.write_text(json.dumps([{"id": 1}]), encoding="utf-8")
+    columns, values = load_rows("", str(path))
+    assert (columns, list(values)) == (["id"], [(1,)])
+
+    with pytest.raises(ValueError):
+        load_rows("[1, 2]")
+    with pytest.raises(ValueError):
+        load_rows("not json")
+
+
+def test_quote_name():
+    assert quote_name("order") == "[order]"
+    assert quote_name("a]b") == "[a]]b]"
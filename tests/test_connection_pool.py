@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+
+import pytest
+
+from core.connection_pool import ConnectionPool
+
+
+class CountingConnect:
+    """Open SQLite connections, recording every statement executed"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connections = []
+        self.statements = []
+
+    def __call__(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.set_trace_callback(self.statements.append)
+        self.connections.append(conn)
+        return conn
+
+
+def test_init_query_runs_once_per_connection(tmp_path):
+    connect = CountingConnect(str(tmp_path / "db.sqlite"))
+    pool = ConnectionPool(connect, min_size=1, max_size=2, init_query="SELECT 42")
+
+    for _ in range(5):
+        with pool.connection() as conn:
+            conn.execute("SELECT 1").fetchall()
+
+    assert len(connect.connections) == 1
+    assert connect.statements.count("SELECT 42") == 1
+    assert pool.gauges()["created"] == 1
+
+
+def test_concurrent_callers_get_separate_connections(tmp_path):
+    connect = CountingConnect(str(tmp_path / "db.sqlite"))
+    pool = ConnectionPool(connect, min_size=0, max_size=3)
+    barrier = threading.Barrier(3)
+    used = []
+
+    def worker():
+        with pool.connection() as conn:
+            used.append(conn)
+            barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, used))) == 3
+    assert pool.gauges() == {
+        "open": 3, "idle": 3, "in_use": 0, "created": 3, "discarded": 0, "waits": 0
+    }
+
+
+def test_waits_for_a_free_connection_then_times_out(tmp_path):
+    pool = ConnectionPool(
+        CountingConnect(str(tmp_path / "db.sqlite")), min_size=0, max_size=1, acquire_timeout=0.1
+    )
+    conn = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.gauges()["waits"] == 1
+
+
+def test_broken_connection_is_replaced(tmp_path):
+    connect = CountingConnect(str(tmp_path / "db.sqlite"))
+    pool = ConnectionPool(connect, min_size=1, max_size=1, init_query="SELECT 42", ping_after=0)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        with pool.connection() as conn:
+            conn.close()
+            conn.execute("SELECT 1")
+
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchall() == [(1,)]
+    assert len(connect.connections) == 2
+    assert connect.statements.count("SELECT 42") == 2
+    assert pool.gauges()["discarded"] == 1
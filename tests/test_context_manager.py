@@ -0,0 +1,74 @@
+from core.context_manager import COMPACTED_MARKER, ContextManager
+
+
+def make_turn(index: int, tool_output_size: int):
+    return [
+        {"role": "user", "content": f"question {index}"},
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{index}",
+                    "type": "function",
+                    "function": {"name": "_get_page_source", "arguments": "{}"},
+                }
+            ],
+        },
+        {
+            "role": "tool",
+            "tool_call_id": f"call_{index}",
+            "tool_name": "_get_page_source",
+            "content": "x" * tool_output_size,
+        },
+        {"role": "assistant", "content": f"answer {index}"},
+    ]
+
+
+def test_history_under_budget_is_untouched():
+    manager = ContextManager(budget_tokens=10000)
+    messages = make_turn(0, 100) + make_turn(1, 100)
+    assert manager.compact(messages, "model") == messages
+
+
+def test_old_tool_results_are_stubbed_first():
+    manager = ContextManager(budget_tokens=6000, keep_recent_turns=2)
+    messages = []
+    for i in range(5):
+        messages += make_turn(i, 8000)
+
+    compacted = manager.compact(messages, "model", "session")
+    stats = manager.last_stats["session"]
+
+    assert len(compacted) == len(messages)
+    assert stats["tokens_after"] <= 6000 < stats["tokens_before"]
+    assert compacted[2]["content"].startswith(COMPACTED_MARKER)
+    assert compacted[2]["tool_call_id"] == "call_0"
+    # The recent turns stay verbatim
+    assert compacted[-2]["content"] == "x" * 8000
+    assert compacted[-6]["content"] == "x" * 8000
+
+
+def test_compaction_is_incremental():
+    manager = ContextManager(budget_tokens=6000, keep_recent_turns=2)
+    messages = []
+    for i in range(5):
+        messages += make_turn(i, 8000)
+    compacted = manager.compact(messages, "model")
+
+    again = manager.compact(compacted, "model", "session")
+    assert again == compacted
+    assert manager.last_stats["session"]["stubbed"] == 0
+
+
+def test_oldest_turns_are_dropped_when_stubs_are_not_enough():
+    manager = ContextManager(budget_tokens=40, keep_recent_turns=1)
+    messages = []
+    for i in range(6):
+        messages += make_turn(i, 10)
+
+    compacted = manager.compact(messages, "model", "session")
+
+    assert manager.last_stats["session"]["dropped"] > 0
+    assert compacted[0]["content"].startswith(COMPACTED_MARKER)
+    assert compacted[-4:] == messages[-4:]
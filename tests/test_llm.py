@@ -1,6 +1,8 @@
-from swarm import Swarm, Agent
+from swarm import Agent
+from core.swarm_client import SwarmClient
 
-client = Swarm()
+# Set LLM_CACHE=on to record completions and LLM_CACHE=replay to run offline
+client = SwarmClient()
 
 agent = Agent(
     name="Agent",
@@ -12,3 +14,5 @@ messages = [{"role": "user", "content": "Hi!"}]
 response = client.run(agent=agent, messages=messages)
 
 print(response.messages[-1]["content"])
+if client.llm_cache:
+    print(client.llm_cache.stats())
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import pytest
+
+from core.llm_cache import CacheMiss, LLMCache, fingerprint
+
+
+def test_fingerprint_is_stable_and_sensitive():
+    request = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    same = {"messages": [{"content": "hi", "role": "user"}], "model": "m"}
+    other = {"model": "m", "messages": [{"role": "user", "content": "hi!"}]}
+    assert fingerprint(request) == fingerprint(same)
+    assert fingerprint(request) != fingerprint(other)
+
+
+def test_hits_misses_and_replay():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.db")
+        cache = LLMCache(path)
+        assert cache.get("a") is None
+        cache.put("a", '{"id": "a"}')
+        assert cache.get("a") == '{"id": "a"}'
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        cache.close()
+
+        replay = LLMCache(path, replay=True)
+        assert replay.get("a") == '{"id": "a"}'
+        with pytest.raises(CacheMiss):
+            replay.get("b")
+        replay.put("b", "{}")
+        assert replay.stats()["entries"] == 1
+        replay.close()
+        # Replay only reads the recording
+        assert os.listdir(directory) == ["cache.db"]
+
+
+def test_least_recently_used_entries_are_evicted_over_size():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMCache(os.path.join(directory, "cache.db"), max_bytes=1400)
+        for key in ["a", "b", "c"]:
+            # Hex of random bytes compresses to roughly 550 bytes
+            cache.put(key, os.urandom(1000).hex()[:1000] + key)
+            cache.get("a")
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        cache.close()
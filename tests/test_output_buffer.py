@@ -0,0 +1,42 @@
+import pytest
+import re
+
+from core.output_buffer import OutputBuffer
+
+
+def fill(buffer: OutputBuffer, count: int):
+    for i in range(count):
+        buffer.append(f"line {i}")
+
+
+def test_cursor_reads_report_dropped_lines():
+    buffer = OutputBuffer(max_lines=5, max_bytes=1000)
+    fill(buffer, 3)
+    lines, missed = buffer.since(0)
+    assert [seq for seq, _ in lines] == [0, 1, 2] and missed == 0
+
+    fill(buffer, 7)  # lines 3..9 as "line 0".."line 6", 0..4 dropped
+    lines, missed = buffer.since(3)
+    assert [seq for seq, _ in lines] == [5, 6, 7, 8, 9]
+    assert missed == 2
+    assert buffer.dropped == 5
+    assert buffer.since(buffer.next_seq) == ([], 0)
+
+
+def test_memory_is_capped():
+    buffer = OutputBuffer(max_lines=1000, max_bytes=100)
+    fill(buffer, 100)
+    assert buffer.bytes <= 100
+    buffer.append("x" * 500)
+    assert len(buffer) == 1
+    assert len(buffer.last(1)[0][1]) <= 101
+
+
+def test_last_and_grep():
+    buffer = OutputBuffer(max_lines=100, max_bytes=10000)
+    fill(buffer, 20)
+    assert buffer.last(2) == [(18, "line 18"), (19, "line 19")]
+    assert buffer.last(0) == []
+    assert buffer.grep(r"line 1\d", limit=2) == [(18, "line 18"), (19, "line 19")]
+    with pytest.raises(re.error):
+        buffer.grep("(")
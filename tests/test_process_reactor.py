@@ -0,0 +1,92 @@
+import subprocess
+import sys
+import threading
+
+from core.process_reactor import ManagedProcess, ProcessReactor
+
+
+def python(code: str) -> str:
+    return f'"{sys.executable}" -c "{code}"'
+
+
+def test_output_is_captured_through_exit():
+    reactor = ProcessReactor()
+    process = reactor.start(
+        "process_0",
+        python("import sys; [print(i) for i in range(5000)]; sys.stdout.write('tail'); sys.exit(3)"),
+    )
+
+    assert process.wait(timeout=10) == 3
+    assert process.output.next_seq == 5001
+    assert process.output.dropped + len(process.output) == 5001
+    assert process.output.last(2) == [(4999, "4999"), (5000, "tail")]
+
+
+def test_one_thread_reads_all_processes():
+    reactor = ProcessReactor()
+    before = threading.active_count()
+    processes = [
+        reactor.start(f"process_{i}", python(f"print('hello {i}')")) for i in range(8)
+    ]
+
+    for i, process in enumerate(processes):
+        assert process.wait(timeout=10) == 0
+        assert process.output.last(10) == [(0, f"hello {i}")]
+    # The reactor thread plus, at most, short-lived reapers
+    assert threading.active_count() <= before + 1 + len(processes)
+
+
+def test_stop_records_exit_code():
+    reactor = ProcessReactor()
+    process = reactor.start("process_0", python("import time; print('up', flush=True); time.sleep(30)"))
+    with process.changed:
+        process.changed.wait_for(lambda: len(process.output), timeout=10)
+
+    assert process.stop() != 0
+    assert not process.running
+    assert process.output.last(10) == [(0, "up")]
+
+
+def test_wait_for_returns_on_match_exit_or_timeout():
+    import re
+    import time
+
+    reactor = ProcessReactor()
+    server = reactor.start(
+        "process_0",
+        python("import time; time.sleep(0.2); print('compiled successfully', flush=True); time.sleep(30)"),
+    )
+    started = time.monotonic()
+    assert server.wait_for(re.compile("compiled|Failed"), 0, timeout=10) == (
+        0,
+        "compiled successfully",
+    )
+    assert time.monotonic() - started < 5
+    assert server.wait_for(re.compile("never"), 1, timeout=0.2) is None
+    server.stop()
+
+    crashed = reactor.start("process_1", python("print('boom'); raise SystemExit(1)"))
+    assert crashed.wait_for(re.compile("compiled"), 0, timeout=10) is None
+    assert crashed.wait(timeout=10) == 1
+
+
+def test_a_failing_process_does_not_stop_the_reactor():
+    class BrokenProcess(ManagedProcess):
+        def _append(self, data: bytes):
+            raise RuntimeError("broken")
+
+    reactor = ProcessReactor()
+    popen = subprocess.Popen(
+        [sys.executable, "-c", "print('lost')"], stdout=subprocess.PIPE
+    )
+    broken = reactor.attach(BrokenProcess("process_0", "broken", popen))
+    # Its pipe is closed: writing fails instead of blocking on a full pipe
+    assert broken.wait(timeout=10) is not None
+    assert broken.capture_error == "broken"
+    assert "output lost: broken" in broken.exit_status()
+
+    # Other processes are still read by the same thread
+    process = reactor.start("process_1", python("print('hello')"))
+    assert process.wait(timeout=10) == 0
+    assert process.output.last(1) == [(0, "hello")]
+    assert reactor.thread.is_alive()
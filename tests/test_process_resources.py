@@ -0,0 +1,76 @@
+import re
+import resource
+import sys
+
+from core.process_reactor import ProcessReactor
+from core.process_resources import ResourceMonitor, sample_tree, spawn_limits
+
+
+def python(code: str) -> str:
+    return f'"{sys.executable}" -c "{code}"'
+
+
+def test_sample_tree_counts_descendants_memory():
+    reactor = ProcessReactor()
+    # The shell runs python as a child: the allocation is in a descendant
+    process = reactor.start(
+        "process_0",
+        python("import time; data = bytearray(64 * 1024**2); print('ready', flush=True); time.sleep(30)")
+        + "; true",
+    )
+    try:
+        assert process.wait_for(re.compile("ready"), 0, timeout=10)
+        sample = sample_tree(process.popen.pid)
+        assert sample["pids"] >= 2
+        assert sample["rss_bytes"] > 64 * 1024**2
+        assert sample["fds"] > 0
+    finally:
+        process.stop()
+
+
+def test_process_over_rss_limit_is_killed():
+    reactor = ProcessReactor()
+    monitor = ResourceMonitor(interval=0.1, max_rss_mb=32)
+    process = reactor.start(
+        "process_0",
+        python("import time; data = bytearray(128 * 1024**2); time.sleep(30)"),
+    )
+    monitor.watch(process)
+
+    assert process.wait(timeout=10) is not None
+    assert "RSS" in process.killed_reason
+    assert process.exit_status().startswith("Process killed: RSS")
+    assert monitor.gauges()["kills"] == 1
+
+
+def test_spawn_limits_from_env(monkeypatch):
+    monkeypatch.delenv("PROCESS_RLIMIT_AS_MB", raising=False)
+    monkeypatch.delenv("PROCESS_RLIMIT_CPU_SECONDS", raising=False)
+    monkeypatch.delenv("PROCESS_RLIMIT_NOFILE", raising=False)
+    assert spawn_limits() is None
+
+    monkeypatch.setenv("PROCESS_RLIMIT_NOFILE", "64")
+    process = ProcessReactor().start(
+        "process_0",
+        python("import resource; print(resource.getrlimit(resource.RLIMIT_NOFILE)[0])"),
+        preexec_fn=spawn_limits(),
+    )
+    assert process.wait(timeout=10) == 0
+    assert process.output.last(1)[0][1] == "64"
+    # The parent keeps its own limit
+    assert resource.getrlimit(resource.RLIMIT_NOFILE)[0] != 64
+
+
+def test_process_joins_its_cgroup_before_the_command_runs(tmp_path):
+    # A plain directory stands in for the cgroup v2 hierarchy
+    monitor = ResourceMonitor(cgroup=str(tmp_path), max_rss_mb=64)
+    with monitor.spawn_limits() as preexec_fn:
+        # The group is ready before the process starts
+        [group] = tmp_path.iterdir()
+        assert (group / "memory.max").read_text() == str(64 * 1024**2)
+        process = ProcessReactor().start(
+            "process_0", python("print('done')"), preexec_fn=preexec_fn
+        )
+    assert process.wait(timeout=10) == 0
+    assert (group / "cgroup.procs").read_text() == "0"
+    assert str(group) in monitor.stale_cgroups
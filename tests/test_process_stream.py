@@ -0,0 +1,58 @@
+import asyncio
+import sys
+
+from core.process_reactor import ProcessReactor
+from core.process_stream import format_batch, stream_process_output
+
+
+class FakeStep:
+    def __init__(self):
+        self.output = ""
+        self.end = None
+        self.batches = []
+        self.updates = 0
+
+    async def stream_token(self, token: str):
+        self.batches.append(token)
+        self.output += token
+
+    async def update(self):
+        self.updates += 1
+
+
+def test_format_batch_keeps_newest_lines_within_cap():
+    assert format_batch(["a", "b"], 0, 100) == "a\nb\n"
+    assert format_batch(["aaaa", "bbbb", "cccc"], 2, 10) == "[… 3 lines skipped]\nbbbb\ncccc\n"
+    assert format_batch([], 0, 10) == ""
+
+
+def test_output_is_batched_until_exit():
+    reactor = ProcessReactor()
+    process = reactor.start(
+        "process_0",
+        f'"{sys.executable}" -u -c "import time\nfor i in range(50): print(i); time.sleep(0.01)"',
+    )
+    step = FakeStep()
+    asyncio.run(stream_process_output(process, step, interval=0.1, max_chars=1000))
+
+    # Far fewer websocket sends than lines
+    assert 1 <= len(step.batches) < 20
+    assert step.output.endswith("49\n[Process exited with code 0]")
+    assert step.end is not None
+
+
+def test_detaching_cancels_the_stream():
+    reactor = ProcessReactor()
+    process = reactor.start("process_0", f'"{sys.executable}" -c "import time; time.sleep(30)"')
+    step = FakeStep()
+
+    async def detach():
+        task = asyncio.ensure_future(stream_process_output(process, step, interval=0.05))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(detach())
+    process.stop()
+    assert step.output.endswith("[Detached]")
+    assert step.updates == 1
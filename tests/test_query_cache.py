@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from core.query_cache import QueryCache, create_query_cache, normalize_sql, statement_kind
+
+
+def test_normalize_ignores_case_spacing_and_comments_but_not_literals():
+    assert normalize_sql("SELECT *\n  FROM Orders -- all\nWHERE name = 'Ann';") == (
+        "select * from orders where name = 'Ann'"
+    )
+    assert normalize_sql("select 'A'") != normalize_sql("select 'a'")
+
+
+def test_statement_kind():
+    assert statement_kind("SELECT id FROM orders") == "read"
+    assert statement_kind("WITH t AS (SELECT 1 AS x) SELECT x FROM t") == "read"
+    assert statement_kind("SELECT GETDATE()") == "uncached"
+    assert statement_kind("SELECT * FROM #tmp") == "uncached"
+    assert statement_kind("SELECT * FROM orders WITH (UPDLOCK)") == "uncached"
+    assert statement_kind("SELECT 1; DELETE FROM orders") == "write"
+    assert statement_kind("UPDATE orders SET total = 0") == "write"
+    assert statement_kind("SELECT * INTO copy FROM orders") == "opaque"
+    assert statement_kind("EXEC refresh_orders") == "opaque"
+    # Keywords inside literals and comments do not count
+    assert statement_kind("SELECT 'delete' AS word -- drop") == "read"
+
+
+def test_hit_miss_and_invalidation_by_table():
+    cache = QueryCache(ttl_seconds=60, max_entries=10, max_bytes=1000)
+    cache.put("SELECT * FROM orders", "orders page")
+    cache.put("SELECT * FROM [Customers]", "customers page")
+
+    assert cache.get("select *  from ORDERS") == "orders page"
+    assert cache.get("SELECT * FROM products") is None
+
+    cache.invalidate({"Orders"})
+    assert cache.get("SELECT * FROM orders") is None
+    assert cache.get("SELECT * FROM [Customers]") == "customers page"
+    gauges = cache.gauges()
+    assert (gauges["hits"], gauges["misses"], gauges["invalidations"]) == (2, 2, 1)
+
+
+def test_results_of_queries_overlapping_a_write_are_not_cached():
+    cache = QueryCache(ttl_seconds=60, max_entries=10, max_bytes=1000)
+    generation = cache.generation
+    cache.invalidate({"orders"})
+    cache.put("SELECT * FROM orders", "stale page", generation=generation)
+    assert cache.get("SELECT * FROM orders") is None
+
+
+def test_expiry_and_size_limits():
+    cache = QueryCache(ttl_seconds=0.01, max_entries=2, max_bytes=10)
+    cache.put("SELECT 1 AS a", "x" * 11)
+    assert cache.gauges()["entries"] == 0
+
+    cache.put("SELECT 1 AS a", "aaaa")
+    cache.put("SELECT 1 AS b", "bbbb")
+    cache.put("SELECT 1 AS c", "cccc")
+    assert cache.gauges()["entries"] == 2
+    assert cache.gauges()["evictions"] == 1
+    assert cache.get("SELECT 1 AS a") is None
+
+    time.sleep(0.02)
+    assert cache.get("SELECT 1 AS c") is None
+
+
+def test_create_query_cache(monkeypatch):
+    monkeypatch.delenv("SQL_QUERY_CACHE", raising=False)
+    assert create_query_cache() is None
+    monkeypatch.setenv("SQL_QUERY_CACHE", "on")
+    assert isinstance(create_query_cache(), QueryCache)
+    monkeypatch.setenv("SQL_QUERY_CACHE", "maybe")
+    with pytest.raises(ValueError):
+        create_query_cache()
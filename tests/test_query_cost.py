@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core.query_cost import (
+    LIMITED_MARKER,
+    QueryCostGuard,
+    QueryRefused,
+    ShowplanReset,
+    add_top,
+    parse_showplan,
+)
+
+PLAN = """<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan">
+<BatchSequence><Batch><Statements>
+<StmtSimple StatementEstRows="{rows}" StatementSubTreeCost="{cost}">
+<QueryPlan><RelOp PhysicalOp="Nested Loops" EstimateRows="{rows}">
+<Warnings NoJoinPredicate="true" />
+<RelOp PhysicalOp="Table Scan" EstimateRows="50000">
+<TableScan><Object Schema="[dbo]" Table="[orders]" /></TableScan></RelOp>
+<RelOp PhysicalOp="Clustered Index Scan" EstimateRows="200">
+<IndexScan><Object Schema="[dbo]" Table="[customers]" /></IndexScan></RelOp>
+</RelOp></QueryPlan></StmtSimple>
+</Statements></Batch></BatchSequence></ShowPlanXML>"""
+
+
+class FakeShowplanCursor:
+    """Returns the plan of each query from plans while SHOWPLAN_XML is on"""
+
+    def __init__(self, plans):
+        self.plans = plans
+        self.showplan = False
+        self.estimated = []
+        self.description = None
+        self.rows = []
+
+    def execute(self, sql):
+        if sql.startswith("SET SHOWPLAN_XML"):
+            self.showplan = sql.endswith("ON")
+            self.description = None
+            return self
+        assert self.showplan
+        self.estimated.append(sql)
+        rows, cost = self.plans[sql]
+        self.description = [("plan",)]
+        self.rows = [(PLAN.format(rows=rows, cost=cost),)]
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+    def nextset(self):
+        return False
+
+
+def test_parse_showplan():
+    estimate = parse_showplan([PLAN.format(rows=10000000, cost=812.5)])
+    assert (estimate.rows, estimate.cost) == (10000000, 812.5)
+    assert estimate.scans == [
+        "Table Scan [dbo].[orders] (~50000 rows)",
+        "Clustered Index Scan [dbo].[customers] (~200 rows)",
+    ]
+    assert estimate.warnings == ["no join predicate"]
+
+
+def test_add_top():
+    assert add_top("SELECT DISTINCT a FROM t ORDER BY a", 10) == (
+        "SELECT DISTINCT TOP (10) a FROM t ORDER BY a"
+    )
+    assert add_top("-- all\nselect * from t", 5) == "-- all\nselect TOP (5) * from t"
+    assert add_top("SELECT TOP 3 * FROM t", 5) is None
+    assert add_top("SELECT a FROM t UNION SELECT a FROM u", 5) is None
+    assert add_top("WITH x AS (SELECT 1 AS a) SELECT a FROM x", 5) is None
+
+
+def test_refuse_mode_reports_the_plan_and_caches_estimates():
+    sql = "SELECT * FROM orders, customers"
+    cursor = FakeShowplanCursor({sql: (10000000, 812.5)})
+    guard = QueryCostGuard("refuse", max_cost=100, max_rows=1000000, ttl_seconds=60)
+
+    with pytest.raises(QueryRefused) as refused:
+        guard.check(cursor, sql)
+    message = str(refused.value)
+    assert "estimated cost 812.5 > 100" in message
+    assert "Table Scan [dbo].[orders]" in message
+    assert "warning: no join predicate" in message
+    assert not cursor.showplan
+
+    with pytest.raises(QueryRefused):
+        guard.check(cursor, "select *  from orders, customers")
+    assert cursor.estimated == [sql]
+    assert guard.gauges()["refused"] == 2
+
+
+def test_top_mode_limits_large_selects_when_that_is_cheap_enough():
+    sql = "SELECT * FROM orders"
+    limited = "SELECT TOP (1000) * FROM orders"
+    cursor = FakeShowplanCursor({sql: (5000000, 40), limited: (1000, 0.5)})
+    guard = QueryCostGuard("top", max_cost=100, max_rows=1000000, top_rows=1000)
+
+    checked, note = guard.check(cursor, sql)
+    assert checked == limited
+    assert "estimated rows 5000000 > 1000000" in note
+    assert LIMITED_MARKER in note
+    # Exports keep all rows
+    assert guard.check(cursor, sql, check_rows=False) == (sql, "")
+
+
+def test_unguarded_and_unestimable_statements_run_unchanged():
+    guard = QueryCostGuard("refuse", max_cost=1, max_rows=1)
+    cursor = FakeShowplanCursor({})
+    assert guard.check(cursor, "EXEC refresh_orders") == ("EXEC refresh_orders", "")
+    # Estimating fails (here: unknown query), execution reports the error
+    assert guard.check(cursor, "SELECT * FROM missing") == ("SELECT * FROM missing", "")
+    assert not cursor.showplan
+    assert guard.gauges()["errors"] == 1
+
+
+def test_failing_to_leave_showplan_mode_is_not_ignored():
+    class StuckCursor(FakeShowplanCursor):
+        def execute(self, sql):
+            if sql == "SET SHOWPLAN_XML OFF":
+                raise RuntimeError("communication link failure")
+            return super().execute(sql)
+
+    sql = "SELECT * FROM orders"
+    cursor = StuckCursor({sql: (10, 0.1)})
+    closed = []
+    cursor.connection = SimpleNamespace(close=lambda: closed.append(True))
+    guard = QueryCostGuard("refuse", max_cost=100, max_rows=1000)
+
+    with pytest.raises(ShowplanReset, match="run the query again"):
+        guard.check(cursor, sql)
+    assert closed == [True]
@@ -0,0 +1,113 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from core.connection_pool import ConnectionPool
+from core.query_executor import QueryExecutor
+from core.tool_runtime import run_tool
+from core.turn_executor import TurnExecutor
+
+# Counts for a long time unless interrupted
+SLOW_QUERY = """
+    WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n)
+    SELECT count(*) FROM n
+"""
+
+
+def make_pool(tmp_path) -> ConnectionPool:
+    path = str(tmp_path / "db.sqlite")
+    return ConnectionPool(
+        lambda: sqlite3.connect(path, check_same_thread=False), min_size=0, max_size=4
+    )
+
+
+def test_query_runs_off_the_event_loop(tmp_path):
+    executor = QueryExecutor(max_workers=2, timeout=0)
+    pool = make_pool(tmp_path)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        def slow_work(cursor):
+            cursor.execute("SELECT 1").fetchall()
+            time.sleep(0.3)
+            return 42
+
+        task = asyncio.create_task(ticker())
+        result = await executor.run(pool, slow_work)
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(scenario())
+    assert result == 42
+    assert ticks > 10
+    gauges = executor.gauges()
+    assert gauges["queries"] == 1 and gauges["running"] == 0
+    assert gauges["execution_seconds"] >= 0.3
+
+
+def test_timeout_cancels_the_query_on_the_server(tmp_path):
+    executor = QueryExecutor(max_workers=2, timeout=0.3)
+    pool = make_pool(tmp_path)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(executor.run(pool, lambda cursor: cursor.execute(SLOW_QUERY).fetchall()))
+
+    executor.shutdown(wait=True)
+    assert executor.gauges()["timeouts"] == 1
+    # The interrupted connection went back to the pool and still works
+    assert pool.gauges()["in_use"] == 0
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchall() == [(1,)]
+
+
+def test_cancel_session_stops_its_queries(tmp_path):
+    executor = QueryExecutor(max_workers=2, timeout=0)
+    pool = make_pool(tmp_path)
+
+    async def scenario():
+        task = asyncio.create_task(
+            executor.run(pool, lambda cursor: cursor.execute(SLOW_QUERY).fetchall(), "session-1")
+        )
+        await asyncio.sleep(0.3)
+        assert executor.cancel_session("session-2") == 0
+        assert executor.cancel_session("session-1") == 1
+        return await asyncio.wait_for(task, timeout=5)
+
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        asyncio.run(scenario())
+    assert executor.gauges()["running"] == 0
+
+
+def test_stop_cancels_a_query_run_by_a_turn_thread(tmp_path):
+    # Turns run on TurnExecutor threads and call tools through run_tool, so
+    # cancelling the turn's task never reaches the statement: on_stop does
+    executor = QueryExecutor(max_workers=2, timeout=0)
+    turns = TurnExecutor(max_workers=2)
+    pool = make_pool(tmp_path)
+
+    def turn():
+        return run_tool(
+            executor.run(pool, lambda cursor: cursor.execute(SLOW_QUERY).fetchall(), "session-1")
+        )
+
+    async def scenario():
+        task = asyncio.create_task(turns.run("session-1", turn))
+        while not executor.gauges()["running"]:
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.2)
+        assert executor.cancel_session("session-1") == 1
+        return await asyncio.wait_for(task, timeout=5)
+
+    with pytest.raises(sqlite3.OperationalError, match="interrupted"):
+        asyncio.run(scenario())
+    turns.shutdown()
+    assert executor.gauges()["running"] == 0
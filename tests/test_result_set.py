@@ -0,0 +1,82 @@
+import csv
+import sqlite3
+
+from core.connection_pool import ConnectionPool
+from core.result_set import ResultSet, ResultSetRegistry, format_value
+
+
+def make_pool(tmp_path, rows: int = 25) -> ConnectionPool:
+    path = str(tmp_path / "db.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER, label TEXT)")
+    conn.executemany(
+        "INSERT INTO items VALUES (?, ?)", [(i, f"item {i}") for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+    return ConnectionPool(
+        lambda: sqlite3.connect(path, check_same_thread=False), min_size=0, max_size=2
+    )
+
+
+def open_result(pool: ConnectionPool, query: str, batch_size: int = 10) -> ResultSet:
+    conn = pool.acquire()
+    cursor = conn.cursor()
+    cursor.execute(query)
+    return ResultSet(pool, conn, cursor, batch_size=batch_size)
+
+
+def test_pages_are_row_and_size_budgeted(tmp_path):
+    pool = make_pool(tmp_path)
+    result = open_result(pool, "SELECT id, label FROM items ORDER BY id")
+
+    first = result.page(max_rows=4, max_bytes=10000).splitlines()
+    assert first[:3] == ["| id | label |", "| --- | --- |", "| 0 | item 0 |"]
+    assert first[-1] == "Rows 1-4, more available"
+    assert len(result.pending) == 6
+
+    # Only a couple of rows fit in 30 characters
+    second = result.page(max_rows=100, max_bytes=30).splitlines()
+    assert second[2:-1] == ["| 4 | item 4 |", "| 5 | item 5 |"]
+
+    last = result.page(max_rows=100, max_bytes=10000).splitlines()
+    assert last[-1] == "Rows 7-25 of 25"
+    assert result.done
+    result.close()
+    assert pool.gauges()["in_use"] == 0
+
+
+def test_export_writes_remaining_rows(tmp_path):
+    pool = make_pool(tmp_path)
+    result = open_result(pool, "SELECT id, label FROM items ORDER BY id")
+    result.page(max_rows=5, max_bytes=10000)
+
+    path = tmp_path / "items.csv"
+    assert result.export(str(path)) == 20
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ["id", "label"]
+    assert rows[1] == ["5", "item 5"] and len(rows) == 21
+
+
+def test_registry_closes_least_recently_used_result(tmp_path):
+    pool = make_pool(tmp_path)
+    registry = ResultSetRegistry(max_open=1, ttl_seconds=60)
+    first = open_result(pool, "SELECT id FROM items")
+    handle = registry.add(first)
+    second_handle = registry.add(open_result(pool, "SELECT label FROM items"))
+
+    assert first.closed
+    assert registry.take(handle) is None
+    second = registry.take(second_handle)
+    second.page(max_rows=100, max_bytes=10000)
+    registry.put(second_handle, second)
+    assert second.closed and registry.results == {}
+    assert pool.gauges()["in_use"] == 0
+
+
+def test_format_value_keeps_cells_on_one_line():
+    assert format_value(None, 10) == "NULL"
+    assert format_value("a|b\nc", 10) == "a\\|b c"
+    assert format_value("x" * 20, 5) == "xxxxx…"
+    assert format_value(b"\x01\xff", 10) == "0x01ff"
@@ -0,0 +1,87 @@
+from core.schema_catalog import SchemaCatalog
+
+
+class FakeCatalogCursor:
+    """Answer the catalog queries from in-memory rows"""
+
+    def __init__(self):
+        self.tables = {
+            1: ("dbo", "customers", "2024-01-01T00:00:00"),
+            2: ("dbo", "orders", "2024-01-01T00:00:00"),
+            4: ("dbo", "legacy", "2024-01-01T00:00:00"),
+        }
+        self.columns = {
+            1: [("id", "int", 0, 1), ("name", "nvarchar", 1, 0)],
+            2: [("id", "int", 0, 1), ("customer_id", "int", 0, 0)],
+        }
+        self.primary_keys = {1: ["id"], 2: ["id"]}
+        self.foreign_keys = {2: [("customer_id", "dbo", "customers", "id")]}
+        self.queries = []
+        self.rows = []
+
+    def execute(self, query, params=()):
+        ids = set(params) or set(self.tables)
+        self.queries.append((query.split("FROM")[1].split()[0], len(params)))
+        if "sys.foreign_keys" in query:
+            self.rows = [(i, *fk) for i in sorted(ids) for fk in self.foreign_keys.get(i, [])]
+        elif "sys.indexes" in query:
+            self.rows = [(i, pk) for i in sorted(ids) for pk in self.primary_keys.get(i, [])]
+        elif "sys.columns" in query:
+            self.rows = [(i, *col) for i in sorted(ids) for col in self.columns.get(i, [])]
+        else:
+            self.rows = [(i, *table) for i, table in self.tables.items()]
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_whole_schema_is_loaded_in_four_queries():
+    cursor = FakeCatalogCursor()
+    catalog = SchemaCatalog(ttl_seconds=60)
+
+    assert catalog.refresh(cursor)
+    assert len(cursor.queries) == 4
+    assert catalog.table_names() == ["customers", "legacy", "orders"]
+    assert catalog.schema("orders") == {
+        "table_name": "orders",
+        "columns": [
+            {"name": "id", "type": "int", "nullable": False, "is_identity": True},
+            {"name": "customer_id", "type": "int", "nullable": False, "is_identity": False},
+        ],
+        "primary_keys": ["id"],
+        "foreign_keys": [
+            {"column": "customer_id", "references": {"table": "customers", "column": "id"}}
+        ],
+    }
+    assert catalog.find("[dbo].[Customers]")["name"] == "customers"
+    assert not catalog.refresh_if_due(cursor)
+
+
+def test_refresh_introspects_only_changed_tables(tmp_path):
+    cursor = FakeCatalogCursor()
+    path = str(tmp_path / "catalog.json")
+    SchemaCatalog(path, ttl_seconds=60).refresh(cursor)
+
+    # A new process starts from the snapshot
+    cursor.tables[2] = ("dbo", "orders", "2024-02-01T00:00:00")
+    cursor.columns[2].append(("total", "decimal", 1, 0))
+    cursor.tables[3] = ("sales", "invoices", "2024-02-01T00:00:00")
+    del cursor.tables[4]
+    cursor.queries = []
+    catalog = SchemaCatalog(path, ttl_seconds=60)
+    assert catalog.find("legacy") is not None
+
+    assert catalog.refresh(cursor)
+    # Listing, then columns/keys of the two changed tables only
+    assert cursor.queries[0] == ("sys.tables", 0)
+    assert all(count == 2 for _, count in cursor.queries[1:])
+    assert catalog.find("legacy") is None
+    assert catalog.find("customers")["columns"][1]["name"] == "name"
+    assert [col["name"] for col in catalog.find("orders")["columns"]][-1] == "total"
+    assert catalog.find("sales.invoices")["schema"] == "sales"
+
+    cursor.queries = []
+    catalog.mark_stale()
+    assert not catalog.refresh_if_due(cursor)
+    assert len(cursor.queries) == 1
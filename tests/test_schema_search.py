@@ -0,0 +1,75 @@
+from core.schema_catalog import SchemaCatalog
+from core.schema_search import SchemaSearch, compact_schema, tokenize
+
+
+def table(name, columns, primary_keys=(), foreign_keys=(), schema="dbo"):
+    return {
+        "schema": schema,
+        "name": name,
+        "modify_date": "2024-01-01T00:00:00",
+        "columns": [
+            {"name": column, "type": "int", "nullable": False, "is_identity": False}
+            for column in columns
+        ],
+        "primary_keys": list(primary_keys),
+        "foreign_keys": [
+            {"column": column, "references": {"schema": "dbo", "table": target, "column": "id"}}
+            for column, target in foreign_keys
+        ],
+    }
+
+
+def make_catalog() -> SchemaCatalog:
+    catalog = SchemaCatalog(ttl_seconds=60)
+    catalog.tables = {
+        1: table("Customers", ["id", "FullName", "Email"], ["id"]),
+        2: table("SalesOrders", ["id", "CustomerId", "OrderDate"], ["id"], [("CustomerId", "Customers")]),
+        3: table("OrderLines", ["id", "OrderId", "ProductId", "Quantity"], ["id"],
+                 [("OrderId", "SalesOrders"), ("ProductId", "Products")]),
+        4: table("Products", ["id", "Name", "UnitPrice"], ["id"]),
+        5: table("AuditLog", ["id", "Message", "CreatedAt"], ["id"]),
+    }
+    catalog._reindex()
+    return catalog
+
+
+def test_tokenize_splits_identifiers_and_plurals():
+    assert tokenize("OrderLines.customer_id HTTPStatus") == ["order", "line", "customer", "id", "http", "status"]
+
+
+def test_search_ranks_tables_by_question_terms():
+    search = SchemaSearch(make_catalog())
+
+    names = [t["name"] for t, _ in search.search("What quantity of each product was sold?")]
+    assert names[:2] == ["OrderLines", "Products"]
+
+    names = [t["name"] for t, _ in search.search("emails of customers")]
+    assert names[0] == "Customers"
+    assert "AuditLog" not in names
+
+
+def test_search_tolerates_typos_and_uses_foreign_keys():
+    search = SchemaSearch(make_catalog())
+
+    assert search.search("custmers")[0][0]["name"] == "Customers"
+    # SalesOrders has no "customer" column word beyond its FK, yet ranks
+    # above unrelated tables thanks to its link to Customers
+    names = [t["name"] for t, _ in search.search("customer")]
+    assert names[:2] == ["Customers", "SalesOrders"]
+    assert search.search("how many are there") == []
+
+
+def test_index_follows_catalog_changes():
+    catalog = make_catalog()
+    search = SchemaSearch(catalog)
+    assert search.search("invoice") == []
+
+    catalog.tables = {**catalog.tables, 6: table("Invoices", ["id", "Total"], ["id"])}
+    catalog._reindex()
+    assert search.search("invoice")[0][0]["name"] == "Invoices"
+
+
+def test_compact_schema():
+    assert compact_schema(make_catalog().tables[2]) == (
+        "dbo.SalesOrders(id int PK, CustomerId int -> Customers.id, OrderDate int)"
+    )
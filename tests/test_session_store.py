@@ -0,0 +1,84 @@
+import time
+
+from core.session_store import SessionStore
+
+
+class Resource:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_history(size: int):
+    return [{"role": "tool", "content": "x" * size}]
+
+
+def test_idle_sessions_expire_and_close_resources():
+    evicted = []
+    store = SessionStore(ttl_seconds=0.05, max_bytes=10**9, on_evict=evicted.append)
+    resource = Resource()
+    store.create("old", resources=[resource])
+    time.sleep(0.1)
+    store.create("new")
+
+    assert store.get("old") is None
+    assert resource.closed
+    assert evicted == ["old"]
+    assert store.gauges()["live_sessions"] == 1
+
+
+def test_least_recently_used_sessions_are_evicted_over_cap():
+    store = SessionStore(ttl_seconds=3600, max_bytes=2500)
+    for session_id in ["a", "b", "c"]:
+        store.create(session_id)
+        store.set_history(session_id, make_history(1000))
+        # "a" stays the most recently used session apart from the newest
+        store.get("a")
+
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert store.get("c") is not None
+    assert store.gauges()["bytes_held"] <= 2500
+
+
+def test_bytes_are_tracked_per_session():
+    store = SessionStore(ttl_seconds=3600, max_bytes=10**9)
+    store.create("a")
+    store.set_history("a", make_history(1000))
+    held = store.gauges()["bytes_held"]
+    assert held >= 1000
+
+    store.set_history("a", make_history(10))
+    assert store.gauges()["bytes_held"] < held
+
+    store.remove("a")
+    assert store.gauges() == {"live_sessions": 0, "bytes_held": 0, "evictions": 0}
+
+
+def test_idle_sessions_are_swept_without_traffic():
+    evicted = []
+    store = SessionStore(
+        ttl_seconds=0.05, max_bytes=10**9, on_evict=evicted.append, sweep_interval=0.05
+    )
+    store.create("idle")
+    time.sleep(0.3)
+
+    assert evicted == ["idle"]
+    assert store.gauges()["live_sessions"] == 0
+    store.close()
+
+
+def test_busy_sessions_are_not_evicted():
+    busy = {"running"}
+    store = SessionStore(ttl_seconds=0.05, max_bytes=2500, is_busy=busy.__contains__)
+    store.create("running")
+    store.set_history("running", make_history(3000))
+    time.sleep(0.1)
+    store.create("new")
+
+    assert "running" in store.sessions
+    busy.clear()
+    store.sweep()
+    assert store.get("running") is None
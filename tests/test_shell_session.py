@@ -0,0 +1,43 @@
+import os
+
+from core.shell_session import ShellSession
+
+
+def run(shell: ShellSession, command: str, timeout: float = 10):
+    return shell.wait_result(shell.submit(command), timeout)
+
+
+def test_state_carries_over_between_commands(tmp_path):
+    shell = ShellSession(cwd=str(tmp_path))
+    os.mkdir(tmp_path / "sub")
+
+    assert run(shell, "cd sub && export GREETING=hello").exit_code == 0
+    result = run(shell, "echo $GREETING; printf 'no newline'")
+    shell.close()
+
+    assert result.lines == ["hello", "no newline"]
+    assert result.cwd == str(tmp_path / "sub")
+
+
+def test_exit_codes_and_stdin():
+    shell = ShellSession()
+    assert run(shell, "ls /nonexistent").exit_code != 0
+    # Commands cannot read the following commands as their input
+    assert run(shell, "cat").lines == []
+    assert run(shell, "echo next").lines == ["next"]
+    shell.close()
+
+
+def test_interrupted_command_keeps_the_shell():
+    shell = ShellSession()
+    run(shell, "export KEPT=1")
+    cursor = shell.submit("for i in 1 2; do echo $i; done; sleep 30")
+    assert shell.wait_result(cursor, 0.3) is None
+
+    shell.interrupt()
+    result = shell.wait_result(cursor, 5)
+    assert result.lines == ["1", "2"]
+    assert result.exit_code == 130
+    assert run(shell, "echo $KEPT").lines == ["1"]
+    shell.close()
+    assert not shell.alive
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+
+import pytest
+
+from core.state_backend import (
+    MemoryStateBackend,
+    SQLiteStateBackend,
+    StateBackend,
+    decode_message,
+    encode_message,
+)
+
+
+def test_encoding_round_trips_and_drops_empty_fields():
+    message = {"role": "assistant", "content": "hi " * 500, "function_call": None}
+    decoded = decode_message(encode_message(message))
+    assert decoded == {"role": "assistant", "content": "hi " * 500}
+    assert len(encode_message(message)) < len(message["content"])
+
+
+def check_backend(backend):
+    assert backend.get_version("s") == 0
+    assert backend.load_history("s") == []
+
+    first = backend.append_history("s", [{"role": "user", "content": "hi"}])
+    second = backend.append_history("s", [{"role": "assistant", "content": "hello"}])
+    assert second > first
+    assert [m["content"] for m in backend.load_history("s")] == ["hi", "hello"]
+
+    backend.set_current_agent("s", "developer")
+    assert backend.get_current_agent("s") == "developer"
+
+    backend.replace_history("s", [{"role": "user", "content": "compacted"}])
+    backend.append_history("s", [{"role": "assistant", "content": "next"}])
+    assert [m["content"] for m in backend.load_history("s")] == ["compacted", "next"]
+    assert backend.get_version("s") > second
+
+    backend.delete("s")
+    assert backend.get_version("s") == 0
+    assert backend.load_history("s") == []
+
+
+def test_backend_must_implement_every_operation():
+    class PartialBackend(StateBackend):
+        def get_version(self, session_id: str) -> int:
+            return 0
+
+    with pytest.raises(TypeError):
+        PartialBackend()
+
+
+def test_memory_backend():
+    check_backend(MemoryStateBackend())
+
+
+def test_sqlite_backend():
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SQLiteStateBackend(os.path.join(directory, "state.db"))
+        check_backend(backend)
+        backend.close()
+
+
+def test_sqlite_session_resumes_on_another_worker():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.db")
+        worker_a = SQLiteStateBackend(path)
+        worker_b = SQLiteStateBackend(path)
+
+        worker_a.append_history("s", [{"role": "user", "content": "hi"}])
+        worker_a.set_current_agent("s", "tester")
+
+        assert worker_b.get_version("s") == worker_a.get_version("s")
+        assert worker_b.load_history("s") == [{"role": "user", "content": "hi"}]
+        assert worker_b.get_current_agent("s") == "tester"
+        worker_a.close()
+        worker_b.close()
+
+
+def test_sqlite_concurrent_appends_from_two_workers():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "state.db")
+        workers = [SQLiteStateBackend(path), SQLiteStateBackend(path)]
+        start = threading.Barrier(len(workers))
+
+        def append(worker, name):
+            start.wait()
+            for i in range(50):
+                worker.append_history("s", [{"role": "user", "content": f"{name}{i}"}])
+
+        threads = [
+            threading.Thread(target=append, args=(worker, name))
+            for worker, name in zip(workers, "ab")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        history = workers[0].load_history("s")
+        assert len(history) == 100
+        assert [m["content"] for m in history if m["content"][0] == "a"] == [
+            f"a{i}" for i in range(50)
+        ]
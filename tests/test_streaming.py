@@ -0,0 +1,202 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core import streaming
+from core.streaming import StreamRenderer, stream_turn
+from core.turn_executor import TurnExecutor
+
+
+class FakeMessage:
+    def __init__(self, content: str = ""):
+        self.content = content
+        self.tokens = []
+        self.sent = False
+
+    async def stream_token(self, token: str):
+        self.tokens.append(token)
+        self.content += token
+
+    async def send(self):
+        self.sent = True
+
+
+class FakeStep:
+    def __init__(self, name: str, type: str):
+        self.name = name
+        self.start = None
+        self.end = None
+        self.input = ""
+        self.output = ""
+
+    async def send(self):
+        pass
+
+    async def update(self):
+        pass
+
+
+@pytest.fixture
+def ui(monkeypatch):
+    messages, steps = [], []
+
+    def message(content=""):
+        messages.append(FakeMessage(content))
+        return messages[-1]
+
+    def step(name, type):
+        steps.append(FakeStep(name, type))
+        return steps[-1]
+
+    monkeypatch.setattr(streaming, "cl", SimpleNamespace(Message=message, Step=step))
+    return SimpleNamespace(messages=messages, steps=steps)
+
+
+class ScriptedClient:
+    """Yields chunks from a script; threading.Event items block until set"""
+
+    def __init__(self, script):
+        self.script = script
+
+    def run(self, stream, **kwargs):
+        for item in self.script:
+            if isinstance(item, threading.Event):
+                item.wait(5)
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+
+
+def content(text: str):
+    return {"content": text, "role": "assistant", "tool_calls": None}
+
+
+def tool_delta(index: int, call_id: str = None, name: str = None, arguments: str = None):
+    return {
+        "content": None,
+        "tool_calls": [
+            {"index": index, "id": call_id, "function": {"name": name, "arguments": arguments}}
+        ],
+    }
+
+
+def test_queued_tokens_are_batched_and_flushed_before_other_chunks():
+    received = []
+
+    async def on_chunk(chunk):
+        received.append(chunk)
+        if len(received) == 1:
+            # The UI is busy: the next chunks queue up meanwhile
+            await asyncio.sleep(0.2)
+
+    script = [
+        {"delim": "start"},
+        content("Hel"),
+        content("lo "),
+        content("world"),
+        tool_delta(0, "call_1", "lookup", "{}"),
+        content("!"),
+        {"delim": "end"},
+        {"response": "final"},
+    ]
+    executor = TurnExecutor(max_workers=1)
+    response = asyncio.run(stream_turn(executor, "session", ScriptedClient(script), on_chunk))
+    executor.shutdown()
+
+    assert response == "final"
+    assert [chunk.get("delim") or chunk.get("content") for chunk in received] == [
+        "start",
+        "Hello world",
+        None,
+        "!",
+        "end",
+    ]
+    assert received[2]["tool_calls"][0]["id"] == "call_1"
+
+
+def test_tool_call_deltas_interleaved_with_content(ui):
+    handoffs = []
+
+    async def on_handoff(name):
+        handoffs.append(name)
+
+    renderer = StreamRenderer(handoff_tools={"transfer_to_tester"}, on_handoff=on_handoff)
+
+    async def render():
+        for chunk in [
+            {"delim": "start"},
+            content("Checking "),
+            tool_delta(0, "call_1", "read_"),
+            content("the file"),
+            tool_delta(0, arguments='{"path": '),
+            tool_delta(1, "call_2", "transfer_to_tester", "{}"),
+            tool_delta(0, name="file", arguments='"a.txt"}'),
+            {"delim": "end"},
+        ]:
+            await renderer.handle(chunk)
+        assert not handoffs
+        # Next completion: the tool calls have run
+        await renderer.handle({"delim": "start"})
+        await renderer.finish(
+            SimpleNamespace(
+                messages=[{"role": "tool", "tool_call_id": "call_1", "content": "hello"}]
+            )
+        )
+
+    asyncio.run(render())
+    assert [m.content for m in ui.messages] == ["Checking the file"]
+    assert ui.messages[0].sent
+    read, transfer = ui.steps
+    assert read.name == "read_"  # Opened on first sight of the call
+    assert read.input == '{"path": "a.txt"}'
+    assert read.output == "hello"
+    assert read.end is not None and transfer.end is not None
+    assert handoffs == ["transfer_to_tester"]
+
+
+def test_error_finalizes_the_partial_message_and_steps(ui):
+    renderer = StreamRenderer()
+    script = [content("Partial"), tool_delta(0, "call_1", "lookup"), RuntimeError("model down")]
+
+    async def turn():
+        executor = TurnExecutor(max_workers=1)
+        try:
+            await stream_turn(executor, "session", ScriptedClient(script), renderer.handle)
+        finally:
+            await renderer.finish(None)
+            executor.shutdown()
+
+    with pytest.raises(RuntimeError, match="model down"):
+        asyncio.run(turn())
+    assert ui.messages[0].content == "Partial" and ui.messages[0].sent
+    assert ui.steps[0].end is not None
+
+
+def test_cancel_finalizes_the_partial_message(ui):
+    renderer = StreamRenderer()
+    release = threading.Event()
+    executor = TurnExecutor(max_workers=1)
+
+    async def turn():
+        try:
+            await stream_turn(
+                executor, "session", ScriptedClient([content("Partial"), release]), renderer.handle
+            )
+        finally:
+            await renderer.finish(None)
+
+    async def stop():
+        task = asyncio.create_task(turn())
+        while not ui.messages:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        release.set()
+
+    asyncio.run(stop())
+    executor.shutdown()
+    assert ui.messages[0].content == "Partial" and ui.messages[0].sent
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from swarm import Agent
+from swarm.types import ChatCompletionMessageToolCall, Result
+
+from core.swarm_client import SwarmClient
+from core.tool_runtime import read_only
+
+
+def tool_call(index: int, name: str, arguments: str = "{}") -> ChatCompletionMessageToolCall:
+    return ChatCompletionMessageToolCall.model_validate(
+        {
+            "id": f"call_{index}",
+            "type": "function",
+            "function": {"name": name, "arguments": arguments},
+        }
+    )
+
+
+def make_client() -> SwarmClient:
+    # No completions are requested: only tool calls are run
+    return SwarmClient(client=object(), max_parallel_tools=4, llm_cache=None)
+
+
+def test_read_only_calls_run_in_parallel_and_keep_their_order():
+    running = []
+    peak = 0
+    lock = threading.Lock()
+
+    @read_only
+    def lookup(name: str) -> str:
+        nonlocal peak
+        with lock:
+            running.append(name)
+            peak = max(peak, len(running))
+        # Later calls finish first
+        time.sleep(0.3 - 0.1 * int(name))
+        with lock:
+            running.remove(name)
+        return f"result {name}"
+
+    calls = [tool_call(i, "lookup", f'{{"name": "{i}"}}') for i in range(3)]
+    start = time.perf_counter()
+    response = make_client().handle_tool_calls(calls, [lookup], {}, False)
+    elapsed = time.perf_counter() - start
+
+    assert peak == 3
+    assert elapsed < 0.5
+    assert [m["tool_call_id"] for m in response.messages] == ["call_0", "call_1", "call_2"]
+    assert [m["content"] for m in response.messages] == ["result 0", "result 1", "result 2"]
+
+
+def test_calls_with_side_effects_run_alone_in_order():
+    order = []
+
+    @read_only
+    def read(path: str) -> str:
+        time.sleep(0.05)
+        order.append(f"read {path}")
+        return "content"
+
+    def write(path: str) -> str:
+        order.append(f"write {path}")
+        return "ok"
+
+    calls = [
+        tool_call(0, "read", '{"path": "a"}'),
+        tool_call(1, "write", '{"path": "a"}'),
+        tool_call(2, "read", '{"path": "a"}'),
+    ]
+    response = make_client().handle_tool_calls(calls, [read, write], {}, False)
+    assert order == ["read a", "write a", "read a"]
+    assert [m["tool_name"] for m in response.messages] == ["read", "write", "read"]
+
+
+def test_handoffs_and_context_variables_merge_in_call_order():
+    first, second = Agent(name="First"), Agent(name="Second")
+
+    def transfer_to_first():
+        return first
+
+    def transfer_to_second():
+        return second
+
+    @read_only
+    def remember(key: str) -> Result:
+        time.sleep(0.1 if key == "a" else 0)
+        return Result(value="ok", context_variables={"last": key})
+
+    calls = [
+        tool_call(0, "remember", '{"key": "a"}'),
+        tool_call(1, "remember", '{"key": "b"}'),
+        tool_call(2, "transfer_to_second"),
+        tool_call(3, "transfer_to_first"),
+    ]
+    for _ in range(3):
+        response = make_client().handle_tool_calls(
+            calls, [remember, transfer_to_first, transfer_to_second], {}, False
+        )
+        assert response.agent is first
+        assert response.context_variables == {"last": "b"}
+        assert len(response.messages) == 4
+
+
+def test_a_failing_call_does_not_stop_the_others():
+    @read_only
+    def ok() -> str:
+        return "fine"
+
+    @read_only
+    def broken() -> str:
+        raise RuntimeError("disk on fire")
+
+    calls = [tool_call(0, "ok"), tool_call(1, "broken"), tool_call(2, "ok")]
+    response = make_client().handle_tool_calls(calls, [ok, broken], {}, False)
+    contents = [m["content"] for m in response.messages]
+    assert contents[0] == contents[2] == "fine"
+    assert contents[1] == "Error running broken: disk on fire"
+    assert response.messages[1]["tool_call_id"] == "call_1"
+
+
+def test_streamed_completions_are_recorded_and_replayed(tmp_path):
+    from types import SimpleNamespace
+
+    import pytest
+    from openai.types.chat import ChatCompletionChunk
+
+    from core.llm_cache import CacheMiss, LLMCache
+
+    def chunk(choices, usage=None):
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": "c1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "mock",
+                "choices": choices,
+                "usage": usage,
+            }
+        )
+
+    requests = []
+
+    def create(**params):
+        requests.append(params)
+        yield chunk([{"index": 0, "delta": {"role": "assistant", "content": "Let me "}}])
+        yield chunk([{"index": 0, "delta": {"content": "look"}}])
+        parts = [
+            {"id": "call_0", "type": "function", "function": {"name": "lookup"}},
+            {"function": {"arguments": '{"name": "a"}'}},
+        ]
+        for part in parts:
+            yield chunk([{"index": 0, "delta": {"tool_calls": [{"index": 0, **part}]}}])
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "tool_calls"}])
+        yield chunk([], {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17})
+
+    @read_only
+    def lookup(name: str) -> str:
+        return name
+
+    openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    agent = Agent(functions=[lookup])
+    messages = [{"role": "user", "content": "hi"}]
+    path = str(tmp_path / "cache.db")
+
+    def run(cache):
+        client = SwarmClient(client=openai, llm_cache=cache)
+        chunks = list(client.run(agent, messages, stream=True, max_turns=1))
+        cache.close()
+        return chunks[-1]["response"].messages[0]
+
+    recorded = run(LLMCache(path))
+    replayed = run(LLMCache(path, replay=True))
+    assert len(requests) == 1
+    assert replayed["content"] == recorded["content"] == "Let me look"
+    assert replayed["tool_calls"] == recorded["tool_calls"]
+    assert recorded["tool_calls"][0]["function"]["arguments"] == '{"name": "a"}'
+
+    # An unrecorded streamed request fails instead of reaching the API
+    messages.append({"role": "user", "content": "again"})
+    with pytest.raises(CacheMiss):
+        run(LLMCache(path, replay=True))
+    assert len(requests) == 1
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import time
+
+from core.tool_cache import cached, file_tag, invalidates, tool_cache_stats
+
+
+class Tools:
+    def __init__(self):
+        self.calls = 0
+
+    @cached(file=lambda self, args: args["path"])
+    def read(self, path: str) -> str:
+        self.calls += 1
+        with open(path) as file:
+            return file.read()
+
+    @invalidates(tags=lambda self, args: {file_tag(args["path"])})
+    def write(self, path: str, content: str) -> str:
+        with open(path, "w") as file:
+            file.write(content)
+        return "ok"
+
+    @cached(ttl=0.05, tags=lambda self, args: {"catalog"})
+    def tables(self, unused: str = None) -> list:
+        self.calls += 1
+        return ["users"]
+
+    @invalidates(tags=lambda self, args: {"catalog"})
+    def create_table(self, name: str) -> str:
+        return "ok"
+
+    @cached()
+    def failing(self) -> str:
+        self.calls += 1
+        return "Error: nope"
+
+
+def test_file_results_are_invalidated_by_writes_and_mtime():
+    tools = Tools()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "component.tsx")
+        with open(path, "w") as file:
+            file.write("v1")
+
+        assert tools.read(path) == "v1"
+        assert tools.read(path=path) == "v1"
+        assert tools.calls == 1
+
+        tools.write(path, "v2")
+        assert tools.read(path) == "v2"
+        assert tools.calls == 2
+
+        # Changed behind the tools' back
+        with open(path, "w") as file:
+            file.write("version 3")
+        assert tools.read(path) == "version 3"
+        assert tools.calls == 3
+
+
+def test_ttl_and_tag_invalidation():
+    tools = Tools()
+    tools.tables()
+    tools.tables()
+    assert tools.calls == 1
+
+    tools.create_table("orders")
+    tools.tables()
+    assert tools.calls == 2
+
+    time.sleep(0.06)
+    tools.tables()
+    assert tools.calls == 3
+
+
+def test_errors_are_not_cached_and_stats_are_reported():
+    tools = Tools()
+    tools.failing()
+    tools.failing()
+    assert tools.calls == 2
+
+    stats = tool_cache_stats()
+    assert stats["failing"]["hits"] == 0
+    assert 0 < stats["tables"]["hit_ratio"] < 1
+
+
+def test_wrappers_keep_name_and_signature():
+    import inspect
+
+    assert Tools.read.__name__ == "read"
+    assert list(inspect.signature(Tools().read).parameters) == ["path"]
+
+
+def test_relative_file_is_resolved_against_the_current_directory(monkeypatch, tmp_path):
+    tools = Tools()
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "README.md").write_text(f"project {name}")
+
+    monkeypatch.chdir(tmp_path / "a")
+    assert tools.read("README.md") == "project a"
+    monkeypatch.chdir(tmp_path / "b")
+    assert tools.read("README.md") == "project b"
+    assert tools.calls == 2
@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import threading
+
+from core.tool_runtime import ToolRuntime
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+async def read_context():
+    await asyncio.sleep(0)
+    return request_id.get(), threading.current_thread().name
+
+
+def test_worker_thread_reuses_its_loop():
+    runtime = ToolRuntime()
+
+    def run_twice():
+        runtime.run(read_context())
+        first = runtime.local.loop
+        runtime.run(read_context())
+        return first is runtime.local.loop
+
+    with ThreadPoolExecutor(max_workers=1) as worker:
+        assert worker.submit(run_twice).result()
+
+
+def test_context_is_propagated_from_worker_thread():
+    runtime = ToolRuntime()
+
+    def call():
+        request_id.set("session-1")
+        return runtime.run(read_context())
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker") as worker:
+        value, thread_name = worker.submit(call).result()
+    assert value == "session-1"
+    assert thread_name.startswith("worker")
+
+
+def test_call_from_running_loop_uses_background_loop():
+    runtime = ToolRuntime()
+
+    async def handler():
+        request_id.set("session-2")
+        return runtime.run(read_context())
+
+    value, thread_name = asyncio.run(handler())
+    runtime.close()
+    assert value == "session-2"
+    assert thread_name == "tool-runtime"
+
+
+def test_call_blocking_the_session_loop_does_not_emit():
+    from chainlit.context import ChainlitContext, context_var
+    from chainlit.emitter import BaseChainlitEmitter
+
+    runtime = ToolRuntime()
+    emitted = []
+
+    class RecordingEmitter(BaseChainlitEmitter):
+        async def emit(self, event, data):
+            emitted.append(event)
+
+    async def emit_step():
+        await context_var.get().emitter.emit("new_message", {})
+        return "closed"
+
+    async def on_chat_end():
+        context = ChainlitContext.__new__(ChainlitContext)
+        context.loop = asyncio.get_running_loop()
+        context.session = None
+        context.emitter = RecordingEmitter(None)
+        context_var.set(context)
+        # Forwarding the emit to this (blocked) loop would never complete
+        return runtime.run(emit_step(), timeout=5)
+
+    assert asyncio.run(on_chat_end()) == "closed"
+    runtime.close()
+    assert emitted == []
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import json
+
+from core.tracing import Tracer, span
+
+
+def test_spans_outside_a_turn_are_ignored():
+    with span("llm") as current:
+        assert current is None
+
+
+def test_summary_counts_missing_usage_as_zero():
+    tracer = Tracer()
+    with tracer.turn("session-1"):
+        with span("llm", prompt_tokens=None, completion_tokens=None):
+            pass
+        with span("llm", prompt_tokens=10, completion_tokens=2):
+            pass
+    summary = tracer.summary("session-1")
+    assert (summary["prompt_tokens"], summary["completion_tokens"]) == (10, 2)
+
+
+def test_spans_nest_and_follow_the_context_into_workers(tmp_path):
+    tracer = Tracer(export="jsonl", path=str(tmp_path / "traces.jsonl"))
+
+    def tool_call():
+        with span("tool", tool="_read_readme") as current:
+            current.set(result_bytes=42)
+
+    with tracer.turn("session-1", agent="Orchestrator") as trace:
+        with span("llm", prompt_tokens=100, completion_tokens=20):
+            pass
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(contextvars.copy_context().run, tool_call).result()
+
+    spans = {item.name: item for item in trace.spans}
+    assert set(spans) == {"turn", "llm", "tool"}
+    assert spans["tool"].parent_id == spans["turn"].span_id
+    assert spans["tool"].attributes == {"tool": "_read_readme", "result_bytes": 42}
+    assert all(item.duration_ms is not None for item in trace.spans)
+
+    exported = [json.loads(line) for line in open(tmp_path / "traces.jsonl")]
+    assert len(exported) == 1
+    assert exported[0]["session_id"] == "session-1"
+    assert len(exported[0]["spans"]) == 3
+
+    summary = tracer.summary("session-1")
+    assert summary["turns"] == 1
+    assert summary["prompt_tokens"] == 100
+    assert summary["spans"]["tool"]["count"] == 1
+    assert "| llm | 1 |" in tracer.format_summary("session-1")
+
+
+def test_sampling_only_limits_the_export(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(export="otlp", path=str(path), sample_rate=0)
+    with tracer.turn("session-1"):
+        with span("llm"):
+            pass
+
+    assert not path.exists()
+    assert tracer.summary("session-1")["spans"]["llm"]["count"] == 1
+    tracer.forget("session-1")
+    assert tracer.summary("session-1") is None
+
+
+def test_otlp_export(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(export="otlp", path=str(path))
+    with tracer.turn("session-1"):
+        with span("tool", tool="_get_cwd", result_bytes=5):
+            pass
+
+    document = json.loads(path.read_text())
+    spans = document["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    tool = next(item for item in spans if item["name"] == "tool")
+    assert {"key": "result_bytes", "value": {"intValue": "5"}} in tool["attributes"]
+    assert int(tool["endTimeUnixNano"]) >= int(tool["startTimeUnixNano"])
+
+
+def test_streamed_completion_is_traced_until_consumed():
+    import time
+    from types import SimpleNamespace
+
+    from openai.types.chat import ChatCompletionChunk
+    from swarm import Agent
+
+    from core.swarm_client import SwarmClient
+
+    def chunk(choices, usage=None):
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": "c1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "mock",
+                "choices": choices,
+                "usage": usage,
+            }
+        )
+
+    def create(**params):
+        assert params["stream_options"] == {"include_usage": True}
+        for token in ("Hello", " world"):
+            time.sleep(0.05)
+            yield chunk([{"index": 0, "delta": {"content": token}}])
+        yield chunk([], {"prompt_tokens": 12, "completion_tokens": 2, "total_tokens": 14})
+
+    openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    client = SwarmClient(client=openai, llm_cache=None)
+    tracer = Tracer()
+    with tracer.turn("session-1") as trace:
+        completion = client.get_chat_completion(Agent(), [], {}, None, True, False)
+        contents = [c.choices[0].delta.content for c in completion]
+
+    assert contents == ["Hello", " world"]
+    llm = next(item for item in trace.spans if item.name == "llm")
+    assert llm.duration_ms >= 100
+    assert llm.attributes["prompt_tokens"] == 12
+    assert llm.attributes["completion_tokens"] == 2
+    assert llm.attributes["response_bytes"] > 0
+    assert tracer.summary("session-1")["completion_tokens"] == 2
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+from core.turn_executor import TurnExecutor
+
+
+def test_sessions_run_in_parallel():
+    executor = TurnExecutor(max_workers=4)
+
+    async def run_all():
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[executor.run(f"session_{i}", time.sleep, 0.2) for i in range(4)]
+        )
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run_all())
+    executor.shutdown()
+    assert elapsed < 0.6
+
+
+def test_turns_in_a_session_keep_order():
+    executor = TurnExecutor(max_workers=4)
+    order = []
+    lock = threading.Lock()
+
+    def turn(index: int, delay: float):
+        time.sleep(delay)
+        with lock:
+            order.append(index)
+
+    async def run_all():
+        await asyncio.gather(
+            executor.run("session", turn, 0, 0.2),
+            executor.run("session", turn, 1, 0.0),
+            executor.run("session", turn, 2, 0.1),
+        )
+
+    asyncio.run(run_all())
+    executor.shutdown()
+    assert order == [0, 1, 2]
+
+
+def test_event_loop_stays_responsive():
+    executor = TurnExecutor(max_workers=1)
+    ticks = []
+
+    async def heartbeat():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run_all():
+        await asyncio.gather(executor.run("session", time.sleep, 0.3), heartbeat())
+
+    asyncio.run(run_all())
+    executor.shutdown()
+    assert len(ticks) == 5
+    assert ticks[-1] - ticks[0] < 0.25
+
+
+def test_session_is_busy_while_a_turn_runs():
+    executor = TurnExecutor(max_workers=2)
+    seen = []
+
+    async def scenario():
+        turn = asyncio.create_task(executor.run("session_0", time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        seen.append((executor.busy("session_0"), executor.busy("session_1")))
+        await turn
+        seen.append(executor.busy("session_0"))
+
+    asyncio.run(scenario())
+    executor.shutdown()
+    assert seen == [(True, False), False]